@@ -0,0 +1,144 @@
+"""Adaptive simulation: simulate in batches until the estimates are precise.
+
+Per-simulation contributions to ``CVTT``, ``WVTT``, ``WVBT`` and ``Psuc`` (see
+``variance.metric_samples``) are folded into streaming accumulators after
+each batch, so no batch is kept. The run stops once the standard error of
+every watched metric is below the tolerance, or when the path or time budget
+is spent. Batches can draw under a variance-reduction ``scheme``
+(``variance.unit_samples``); under ``'control'`` each batch fits its own
+coefficients.
+
+Metrics are named as in the dashboard statistics, e.g. ``FexCVTT`` or
+``FpPsuc``.
+"""
+import time
+
+import numpy as np
+
+from .analytic import norm_ppf
+from .engine import DEFAULT_CHUNK_SIZE, simulate_effective_prices
+from .inputs import MARKET_INPUTS
+from .valuation import COLLAR_PREFIXES
+from .variance import METRICS, SCHEMES, sampling_scheme, unit_samples
+
+DEFAULT_METRICS = ('FexCVTT', 'FexPsuc')
+MAX_PATHS = 10000000
+MIN_BATCHES = 2 # A single batch can show zero variance for rare events
+
+
+class RunningMoments:
+    """Count, mean and sum of squared deviations of a stream of batches."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        # Chan et al. pairwise merge of the batch moments into the totals
+        n_b = len(values)
+        if n_b == 0:
+            return
+        mean_b = values.mean()
+        m2_b = np.sum(np.square(values - mean_b))
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.n = n
+
+    @property
+    def stderr(self):
+        if self.n < 2:
+            return np.inf
+        return np.sqrt(self.m2 / (self.n - 1) / self.n)
+
+
+def _split(metric):
+    for collar_type, prefix in COLLAR_PREFIXES.items():
+        if metric.startswith(prefix) and metric[len(prefix):] in METRICS:
+            return collar_type, metric[len(prefix):]
+    raise ValueError("Unknown metric: %s" % metric)
+
+
+def snapshot(accumulators, confidence=0.95):
+    """Estimates with standard errors and confidence intervals."""
+    z = float(norm_ppf(0.5 + confidence / 2))
+    result = {}
+    for metric, moments in accumulators.items():
+        se = moments.stderr
+        result[metric] = {
+            'estimate': moments.mean,
+            'stderr': se,
+            'ci_low': moments.mean - z * se,
+            'ci_high': moments.mean + z * se,
+        }
+    return result
+
+
+def adaptive_batches(inputs, collar_types=('FEX', 'FP'), batch_size=DEFAULT_CHUNK_SIZE,
+                     max_paths=MAX_PATHS, seed=None, method='path', confidence=0.95, scheme='plain'):
+    """Yield ``(paths, estimates)`` after each simulated batch.
+
+    ``estimates`` holds every metric of every collar type in
+    ``collar_types``. The caller decides when to stop iterating.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError("Unknown variance-reduction scheme: %s" % scheme)
+    rng = np.random.default_rng(seed)
+    market = [inputs[name] for name in MARKET_INPUTS]
+    accumulators = {}
+    for collar_type in collar_types:
+        for metric in METRICS:
+            accumulators[COLLAR_PREFIXES[collar_type] + metric] = RunningMoments()
+
+    paths = 0
+    while paths < max_paths:
+        n = min(batch_size, max_paths - paths)
+        SBTeff_array = simulate_effective_prices(*market, n, rng=rng, method=method, scheme=sampling_scheme(scheme))
+        for collar_type in collar_types:
+            samples = unit_samples(SBTeff_array, inputs, collar_type, scheme)
+            for metric in METRICS:
+                accumulators[COLLAR_PREFIXES[collar_type] + metric].update(samples[metric])
+        paths += n
+        yield paths, snapshot(accumulators, confidence)
+
+
+def adaptive_valuation(inputs, metrics=DEFAULT_METRICS, tolerance=0.01, batch_size=DEFAULT_CHUNK_SIZE,
+                       max_paths=MAX_PATHS, max_seconds=None, seed=None, method='path', confidence=0.95,
+                       scheme='plain'):
+    """Simulate until the watched ``metrics`` reach ``tolerance``.
+
+    ``tolerance`` is the target standard error, either one number or a dict
+    per metric. Returns the estimates of every metric of the watched collar
+    types together with the paths used, the elapsed time and why the run
+    stopped (``'tolerance'``, ``'paths'`` or ``'time'``).
+    """
+    watched = [_split(metric) for metric in metrics]
+    collar_types = tuple(sorted(set(collar_type for collar_type, _ in watched)))
+    if not isinstance(tolerance, dict):
+        tolerance = {metric: tolerance for metric in metrics}
+
+    started = time.perf_counter()
+    stopped_by = 'paths'
+    batches = 0
+    paths, estimates = 0, {}
+
+    for paths, estimates in adaptive_batches(inputs, collar_types, batch_size, max_paths, seed, method, confidence,
+                                             scheme):
+        batches += 1
+        if batches >= MIN_BATCHES and all(estimates[m]['stderr'] <= tolerance[m] for m in metrics):
+            stopped_by = 'tolerance'
+            break
+        if max_seconds is not None and time.perf_counter() - started > max_seconds:
+            stopped_by = 'time'
+            break
+
+    return {
+        'paths': paths,
+        'elapsed': time.perf_counter() - started,
+        'converged': stopped_by == 'tolerance',
+        'stopped_by': stopped_by,
+        'confidence': confidence,
+        'estimates': estimates,
+    }
@@ -1,3 +1,23 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Calibration, ValuationJob, ValuationRun
+
+
+@admin.register(ValuationJob)
+class ValuationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'bidder_name', 'target_name', 'collar_type', 'paths_done', 'created')
+    list_filter = ('status', 'collar_type')
+
+
+@admin.register(ValuationRun)
+class ValuationRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created', 'bidder_name', 'target_name', 'collar_type', 'simulations', 'CVTT', 'Psuc')
+    list_filter = ('collar_type', 'engine')
+    exclude = ('distribution',)
+
+
+@admin.register(Calibration)
+class CalibrationAdmin(admin.ModelAdmin):
+    list_display = ('ticker', 'until', 'estimator', 'as_of', 'RetB', 'StdB', 'observations', 'created')
+    list_filter = ('estimator',)
+    search_fields = ('ticker',)
@@ -0,0 +1,103 @@
+"""Closed-form valuation of FEX and FP collars and walkaway options.
+
+The effective price is Gaussian (see ``engine.effective_price_moments``), so
+every expectation the dashboard estimates by Monte Carlo reduces to normal
+CDFs and PDFs evaluated at the collar bounds. No random numbers are drawn.
+"""
+import math
+
+import numpy as np
+
+from .collars import fex_segments, fp_segments, value_segments
+from .engine import effective_price_moments
+
+SQRT2PI = math.sqrt(2 * math.pi)
+
+_erf = np.vectorize(math.erf, otypes=[float])
+
+
+def norm_cdf(z):
+    return 0.5 * (1 + _erf(np.asarray(z) / math.sqrt(2)))
+
+
+def norm_pdf(z):
+    return np.exp(-0.5 * np.square(z)) / SQRT2PI
+
+
+# Coefficients of Acklam's rational approximation of the normal quantile
+_PPF_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+          1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_PPF_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+          6.680131188771972e+01, -1.328068155288572e+01)
+_PPF_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+          -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_PPF_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+          3.754408661907416e+00)
+
+
+def norm_ppf(u):
+    """Inverse of ``norm_cdf`` for ``0 < u < 1`` (relative error < 1.2e-9)."""
+    a, b, c, d = _PPF_A, _PPF_B, _PPF_C, _PPF_D
+    u = np.asarray(u, dtype=float)
+    z = np.empty_like(u)
+
+    low = u < 0.02425
+    high = u > 1 - 0.02425
+    mid = ~(low | high)
+
+    q = u[mid] - 0.5
+    r = q * q
+    z[mid] = (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5]) * q / \
+             (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
+
+    for tail, sign, p in ((low, 1, u[low]), (high, -1, 1 - u[high])):
+        q = np.sqrt(-2 * np.log(p))
+        z[tail] = sign * (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
+                  ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+
+    return z
+
+
+class GaussianDistribution:
+    """Normal distribution exposing the interface of ``value_segments``.
+
+    Interval bounds may be arrays. A zero ``std`` is treated as a point mass.
+    """
+
+    def __init__(self, mean, std):
+        self.mean = mean
+        self.std = std
+
+    def prob(self, lo, hi):
+        if self.std == 0:
+            return np.asarray((lo <= self.mean) & (self.mean < hi), dtype=float)
+        return norm_cdf((hi - self.mean) / self.std) - norm_cdf((lo - self.mean) / self.std)
+
+    def partial_mean(self, lo, hi):
+        # E[X; lo < X < hi] = mu * P + sigma * (pdf(alpha) - pdf(beta))
+        prob = self.prob(lo, hi)
+        if self.std == 0:
+            return self.mean * prob
+        alpha = (lo - self.mean) / self.std
+        beta = (hi - self.mean) / self.std
+        return self.mean * prob + self.std * (norm_pdf(alpha) - norm_pdf(beta))
+
+
+def analytic_valuation(SB0, RetB, StdB, T, avgper, ST0, DP, RP, BaseER,
+                       FexLB, FexUB, BaseP, LR, UR):
+    """Value both collar types in closed form.
+
+    Returns the no-collar payoff and, for ``'FEX'`` and ``'FP'``, the
+    expected payoff ``PTTmean``, ``CVTT``, ``WVTT``, ``WVBT``, ``NetWV``,
+    ``Psuc`` and the mean payoff in successful deals.
+    """
+    mean, std = effective_price_moments(SB0, RetB, StdB, T, avgper)
+    dist = GaussianDistribution(mean, std)
+
+    return {
+        'SBTeff_mean': mean,
+        'SBTeff_std': std,
+        'NocPTTmean': mean * BaseER,
+        'FEX': value_segments(dist, fex_segments(FexLB, FexUB, BaseER), ST0, DP, RP, BaseER),
+        'FP': value_segments(dist, fp_segments(BaseP, LR, UR), ST0, DP, RP, BaseER),
+    }
@@ -0,0 +1,151 @@
+"""Batch valuation of many deals read from CSV or JSONL.
+
+Deals use the form fields of ``index.html`` (``bidderPriceBefore``,
+``fexLB``, ...), plus the optional ``bidderName`` and ``targetName``. They are
+read and valued in windows of ``WINDOW`` deals: within a window, deals with
+identical market inputs share one simulation, and results are written out
+in input order before the next window is read. Memory use therefore depends
+on the window, not on the length of the file. Simulations also go through
+the pipeline cache, so a market that reappears in a later window is reused
+as well. A row that cannot be read or valued gets a result with its
+``error`` and the batch goes on.
+"""
+import csv
+import io
+import itertools
+import json
+
+import numpy as np
+
+from .engine import DEFAULT_SIMULATIONS
+from .inputs import DEFAULT_INPUTS, MARKET_INPUTS, InputError, parse_inputs
+from .pipeline import ValuationPipeline
+from .valuation import value_deal
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+WINDOW = 100 # Deals read and valued together
+ROW_COLUMNS = ('row', 'bidderName', 'targetName', 'error')
+
+
+def detect_format(filename, default='csv'):
+    for fmt in FORMATS:
+        if filename and filename.lower().endswith('.' + fmt):
+            return fmt
+    if filename and filename.lower().endswith('.ndjson'):
+        return 'jsonl'
+    return default
+
+
+def _text_lines(lines):
+    for line in lines:
+        yield line.decode('utf-8') if isinstance(line, bytes) else line
+
+
+def read_deals(lines, fmt='csv'):
+    """Yield each deal of a CSV or JSONL stream as a dict of form fields.
+
+    A JSONL line that is not valid JSON yields an ``InputError`` in its
+    place; so does a broken CSV file, which ends the stream.
+    """
+    if fmt not in FORMATS:
+        raise ValueError("Unknown batch format: %s" % fmt)
+    lines = _text_lines(lines)
+    if fmt == 'csv':
+        try:
+            for row in csv.DictReader(lines):
+                yield row
+        except (csv.Error, UnicodeDecodeError) as exc:
+            yield InputError("Unreadable CSV: %s" % exc)
+        return
+    for line in lines:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield InputError("Invalid JSON: %s" % exc)
+
+
+def stat_columns():
+    """Names of the statistics of a valued deal, in output order."""
+    # A two-point distribution inside both collars gives every statistic
+    SBTeff_array = np.full(2, DEFAULT_INPUTS['SB0'])
+    stats, _ = value_deal(SBTeff_array, DEFAULT_INPUTS)
+    return list(stats)
+
+
+def _value_window(window, simulations, seed, engine):
+    results = [None] * len(window)
+    groups = {}
+    for i, (row, data) in enumerate(window):
+        if isinstance(data, InputError) or not isinstance(data, dict):
+            error = data if isinstance(data, InputError) else "A deal must be an object of form fields"
+            results[i] = {'row': row, 'bidderName': '', 'targetName': '', 'error': str(error)}
+            continue
+        result = {
+            'row': row,
+            'bidderName': data.get('bidderName', ''),
+            'targetName': data.get('targetName', ''),
+        }
+        try:
+            inputs = parse_inputs(data)
+        except InputError as exc:
+            results[i] = dict(result, error=str(exc))
+            continue
+        market = tuple(inputs[name] for name in MARKET_INPUTS)
+        groups.setdefault(market, []).append((i, result, inputs))
+
+    # One simulation per distinct market, dropped once its deals are valued
+    for deals in groups.values():
+        try:
+            SBTeff_array = ValuationPipeline(deals[0][2], 'FEX', simulations, seed, engine).effective_prices()
+        except (ArithmeticError, ValueError) as exc:
+            for i, result, _ in deals:
+                results[i] = dict(result, error="Simulation failed: %s" % exc)
+            continue
+        for i, result, inputs in deals:
+            try:
+                stats, _ = value_deal(SBTeff_array, inputs)
+            except (ArithmeticError, ValueError) as exc:
+                results[i] = dict(result, error="Valuation failed: %s" % exc)
+                continue
+            results[i] = dict(result, error='', **stats)
+    return results
+
+
+def value_deals(deals, simulations=DEFAULT_SIMULATIONS, seed=None, engine='path', window=WINDOW):
+    """Yield one result dict per deal, in input order.
+
+    Each result has ``row`` (1-based), the deal names, ``error`` (empty when
+    the deal was valued) and the statistics of ``valuation.value_deal``.
+    """
+    deals = enumerate(deals, 1)
+    while True:
+        chunk = list(itertools.islice(deals, window))
+        if not chunk:
+            return
+        for result in _value_window(chunk, simulations, seed, engine):
+            yield result
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def write_results(results, fmt='csv'):
+    """Yield the results as lines of CSV (with a header) or JSONL."""
+    if fmt == 'jsonl':
+        for result in results:
+            yield json.dumps({key: _plain(value) for key, value in result.items()}) + '\n'
+        return
+
+    columns = list(ROW_COLUMNS) + stat_columns()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, columns, restval='')
+    writer.writeheader()
+    for result in itertools.chain([None], results):
+        if result is not None:
+            writer.writerow(result)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,259 @@
+"""Stage timings of the valuation with a history file, and an engine check.
+
+``benchmark`` times each stage of a dashboard valuation for every case of a
+matrix of ``simulations``, ``T`` (``daysBetween``) and ``avgper`` values,
+the other inputs being ``DEFAULT_INPUTS``. Stages are timed separately, on
+the output of the previous one, and each reports the best of ``repeat``
+runs:
+
+- ``paths``: the path engine. Averaging is fused into its loop (only the
+  trailing window of each path is materialized), so path generation and
+  effective-price averaging are timed together;
+- ``exact``: sampling the effective price from its closed-form moments;
+- ``no_collar``, ``fex_payoff``, ``fp_payoff``: the payoff math;
+- ``walkaway``: the walkaway math of both collars;
+- ``histogram``: the dashboard histograms of prices and payoffs;
+- ``charts``: the Bokeh grid, up to ``components(grid)``.
+
+Results are appended to a JSON history file. A stage regresses when it is
+slower than the median of its last ``BASELINE_RUNS`` recorded timings on
+the same host by more than the threshold (relative) and ``MIN_REGRESSION``
+seconds (absolute, so the fastest stages do not flag noise).
+
+``check_engines`` values the deal with the reference engine (path, one
+worker, float64) and with each faster variant. Engines drawing their own
+prices are flagged when they differ from the reference by more than
+``CHECK_Z`` standard errors; the multi-process and float32 engines reuse the
+reference draws and must match it exactly, or to float32 precision.
+"""
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import time
+
+import numpy as np
+
+from .analytic import analytic_valuation
+from .chart_data import histogram
+from .engine import simulate_effective_prices
+from .inputs import COLLAR_TYPES, DEFAULT_INPUTS, MARKET_INPUTS
+from .parallel import simulate_parallel
+from .pipeline import ValuationPipeline
+from .sketch import simulate_sketch, sketch_statistics
+from .valuation import COLLAR_PREFIXES, collar_payoff, no_collar, value_deal, walkaway
+from .variance import METRICS, metric_samples
+
+STAGES = ('paths', 'exact', 'no_collar', 'fex_payoff', 'fp_payoff', 'walkaway', 'histogram', 'charts')
+SIMULATIONS = (10000, 100000)
+DAYS = (60, 183)
+AVGPER = (5, 15)
+REPEAT = 3
+THRESHOLD = 0.25 # Relative slowdown that counts as a regression
+MIN_REGRESSION = 0.005 # Seconds a stage must lose on top of the threshold
+BASELINE_RUNS = 5 # Recorded runs the baseline is the median of
+CHECK_Z = 4.0 # Standard errors an engine may differ from the reference by
+CHECK_ATOL = 1e-6 # Floor of the tolerance, for metrics without sampling noise
+FLOAT32_PATHS = 10 # Paths whose float32 price may round across a collar or walkaway bound
+ENGINES = ('exact', 'workers', 'float32', 'sketch', 'analytic')
+
+
+def case_key(simulations, T, avgper):
+    return '%d/%d/%d' % (simulations, T, avgper)
+
+
+def _best(function, repeat):
+    # Best of repeat timings, and the last result
+    best = np.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def time_case(simulations, T, avgper, stages=STAGES, repeat=REPEAT, seed=0):
+    """Seconds spent in each of ``stages`` for one case of the matrix."""
+    inputs = dict(DEFAULT_INPUTS, T=T, avgper=avgper)
+    market = [inputs[name] for name in MARKET_INPUTS]
+    timings = {}
+
+    def simulate(method):
+        return simulate_effective_prices(*market, simulations, rng=np.random.default_rng(seed), method=method)
+
+    seconds, SBTeff_array = _best(lambda: simulate('path'), repeat)
+    if 'paths' in stages:
+        timings['paths'] = seconds
+    if 'exact' in stages:
+        timings['exact'], _ = _best(lambda: simulate('exact'), repeat)
+    SBTeff_array.sort()
+
+    seconds, (noc_stats, NocPTT) = _best(lambda: no_collar(SBTeff_array, inputs['BaseER']), repeat)
+    if 'no_collar' in stages:
+        timings['no_collar'] = seconds
+
+    payoffs = {}
+    for collar_type in COLLAR_TYPES:
+        seconds, payoffs[collar_type] = _best(
+            lambda: collar_payoff(collar_type, SBTeff_array, inputs, noc_stats['NocPTTmean']), repeat)
+        if collar_type.lower() + '_payoff' in stages:
+            timings[collar_type.lower() + '_payoff'] = seconds
+
+    def walkaways():
+        for _, arrays in payoffs.values():
+            walkaway(arrays['PTT'], arrays['OUT'], inputs['NT0'], inputs['ST0'], inputs['DP'], inputs['RP'])
+    if 'walkaway' in stages:
+        timings['walkaway'], _ = _best(walkaways, repeat)
+
+    def histograms():
+        histogram(SBTeff_array, simulations)
+        histogram(NocPTT, simulations)
+        for _, arrays in payoffs.values():
+            histogram(arrays['PTT'], simulations)
+    if 'histogram' in stages:
+        timings['histogram'], _ = _best(histograms, repeat)
+
+    if 'charts' in stages:
+        from .charts import dashboard_charts # Bokeh is only imported when charts are timed
+
+        def charts():
+            pipeline = ValuationPipeline.from_prices(inputs, 'FEX', SBTeff_array, seed)
+            return dashboard_charts(pipeline)
+        timings['charts'], _ = _best(charts, repeat)
+
+    return timings
+
+
+def benchmark(simulations=SIMULATIONS, days=DAYS, avgper=AVGPER, stages=STAGES, repeat=REPEAT, seed=0):
+    """``{case_key: {stage: seconds}}`` over the whole matrix.
+
+    Cases whose averaging period exceeds the horizon are skipped.
+    """
+    results = {}
+    for n in simulations:
+        for T in days:
+            for window in avgper:
+                if window <= T:
+                    results[case_key(n, T, window)] = time_case(n, T, window, stages, repeat, seed)
+    return results
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=1, sort_keys=True)
+
+
+def history_entry(results):
+    return {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'results': results,
+    }
+
+
+def regressions(results, history, host=None, threshold=THRESHOLD, min_regression=MIN_REGRESSION,
+                baseline_runs=BASELINE_RUNS):
+    """Stages slower than their baseline, as dicts with the timings and the slowdown.
+
+    The baseline of a stage is the median of its last ``baseline_runs``
+    timings in ``history`` from ``host`` (this machine by default).
+    """
+    host = platform.node() if host is None else host
+    runs = [entry for entry in history if entry.get('host') == host]
+    found = []
+    for case, timings in results.items():
+        for stage, seconds in timings.items():
+            past = [entry['results'][case][stage] for entry in runs
+                    if stage in entry['results'].get(case, {})][-baseline_runs:]
+            if not past:
+                continue
+            baseline = float(np.median(past))
+            if seconds > baseline * (1 + threshold) and seconds - baseline > min_regression:
+                found.append({
+                    'case': case,
+                    'stage': stage,
+                    'seconds': seconds,
+                    'baseline': baseline,
+                    'slowdown': seconds / baseline - 1,
+                })
+    return found
+
+
+def _engine_stats(engine, inputs, simulations, seed, workers):
+    market = [inputs[name] for name in MARKET_INPUTS]
+    if engine == 'analytic':
+        values = analytic_valuation(**{name: inputs[name] for name in MARKET_INPUTS + (
+            'ST0', 'DP', 'RP', 'BaseER', 'FexLB', 'FexUB', 'BaseP', 'LR', 'UR')})
+        return {COLLAR_PREFIXES[collar_type] + metric: values[collar_type][metric]
+                for collar_type in COLLAR_TYPES for metric in METRICS}
+    if engine == 'sketch':
+        return sketch_statistics(simulate_sketch(*market, simulations, seed=seed), inputs)
+    if engine == 'exact':
+        SBTeff_array = simulate_parallel(*market, simulations, seed=seed, method='exact')
+    elif engine == 'workers':
+        SBTeff_array = simulate_parallel(*market, simulations, seed=seed, workers=workers)
+    elif engine == 'float32':
+        SBTeff_array = simulate_parallel(*market, simulations, seed=seed).astype(np.float32)
+    else:
+        raise ValueError("Unknown engine: %s" % engine)
+    stats, _ = value_deal(SBTeff_array, inputs)
+    return stats
+
+
+def check_engines(inputs=DEFAULT_INPUTS, simulations=100000, seed=0, engines=ENGINES, workers=2, z=CHECK_Z):
+    """Compare each engine's ``METRICS`` with the reference path engine.
+
+    The reference standard error comes from its per-path samples. An
+    engine drawing its own paths adds its own error, taken as equal, so the
+    tolerance is ``z * sqrt(2)`` reference standard errors, and never below
+    ``CHECK_ATOL``. The ``'workers'`` engine draws the same prices as the
+    reference and must give the same statistics. The ``'float32'`` engine
+    rounds them, so it may differ by float32 precision at the price scale
+    plus ``FLOAT32_PATHS`` paths changing sides of a bound. Returns one row
+    per engine and metric with ``ok`` set when the difference is within the
+    tolerance.
+    """
+    SBTeff_array = simulate_parallel(*[inputs[name] for name in MARKET_INPUTS], simulations, seed=seed)
+    seeded, _ = value_deal(SBTeff_array, inputs) # What the engines reusing the reference draws must give
+    reference = {}
+    for collar_type in COLLAR_TYPES:
+        samples, _ = metric_samples(SBTeff_array, inputs, collar_type)
+        for metric in METRICS:
+            values = samples[metric]
+            stderr = np.std(values, ddof=1) / np.sqrt(len(values))
+            reference[COLLAR_PREFIXES[collar_type] + metric] = (float(np.mean(values)), float(stderr))
+
+    rows = []
+    for engine in engines:
+        stats = _engine_stats(engine, inputs, simulations, seed, workers)
+        for name, (expected, stderr) in reference.items():
+            value = float(stats[name])
+            if engine == 'workers':
+                expected, tolerance = float(seeded[name]), 0.0
+            elif engine == 'float32':
+                expected = float(seeded[name])
+                tolerance = (np.finfo(np.float32).eps * max(abs(expected), abs(inputs['SB0']))
+                             + FLOAT32_PATHS / simulations)
+            else:
+                tolerance = max(z * np.sqrt(2) * stderr, CHECK_ATOL)
+            rows.append({
+                'engine': engine,
+                'metric': name,
+                'value': value,
+                'reference': expected,
+                'stderr': stderr,
+                'ok': bool(abs(value - expected) <= tolerance),
+            })
+    return rows
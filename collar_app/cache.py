@@ -0,0 +1,80 @@
+"""Content-addressed cache of valuation results.
+
+Results are stored in the Django cache named by ``settings.VALUATION_CACHE``
+under a SHA-256 of every numeric input together with the collar type, the
+number of simulations, the seed and the engine. Which backend holds them is
+plain Django configuration (see ``CACHES`` in the project settings): an
+in-process LRU (``LocMemCache``) or a database table shared by all gunicorn
+workers (``DatabaseCache``).
+
+A run without a seed is cached like any other: the stored result is one valid
+Monte Carlo draw, and returning it again is what makes repeat submissions
+cheap.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_VERSION = 1 # Bump when the cached payload changes shape
+
+HITS_KEY = 'valuation:hits'
+MISSES_KEY = 'valuation:misses'
+
+
+def valuation_key(inputs, collar_type, simulations, seed, engine, **extra):
+    payload = {
+        'version': KEY_VERSION,
+        'inputs': inputs,
+        'collar_type': collar_type,
+        'simulations': simulations,
+        'seed': None if seed in (None, '') else int(seed),
+        'engine': engine,
+        'extra': extra,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return 'valuation:' + hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _cache():
+    return caches[settings.VALUATION_CACHE]
+
+
+def _count(key):
+    cache = _cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError: # Evicted between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+def cache_get(key, field=None):
+    """The entry under ``key``, or None.
+
+    With ``field``, an entry without it is not served and counts as a miss:
+    the hit rate only counts work the cache actually saved.
+    """
+    value = _cache().get(key)
+    if value is not None and field is not None and field not in value:
+        value = None
+    _count(MISSES_KEY if value is None else HITS_KEY)
+    return value
+
+
+def cache_set(key, value):
+    _cache().set(key, value)
+
+
+def cache_stats():
+    cache = _cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'backend': settings.CACHES[settings.VALUATION_CACHE]['BACKEND'],
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / lookups if lookups else None,
+    }
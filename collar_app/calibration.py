@@ -0,0 +1,254 @@
+"""Calibrate ``RetB`` and ``StdB`` from a bidder's price history.
+
+Histories are CSV files, optionally gzipped, or NumPy ``.npy`` files.
+A CSV file has a header naming a date or timestamp column and a price
+column. Its rows are trades, bars or days in time order. A ``.npy`` file
+holds a structured array with a ``time`` field (``datetime64``) and a
+``price`` field.
+
+Multi-gigabyte intraday files are never loaded whole. CSV files are read
+in blocks of about ``CSV_CHUNK_BYTES``. ``.npy`` files are memory-mapped
+and scanned in blocks of ``NPY_CHUNK_ROWS`` rows. Only the last price of
+each day is kept. For CSV, only the date prefix of every row is compared,
+and only the rows that close a day are parsed.
+
+The daily simple returns of the closes in ``[since, until]`` give ``RetB``
+and ``StdB``, the daily drift and volatility of the path model, with one
+of three estimators:
+
+- ``'sample'``: mean and standard deviation of every return in the window;
+- ``'ewma'``: RiskMetrics-style exponentially weighted mean and variance
+  with ``decay`` per day, the latest day weighing most;
+- ``'rolling'``: sample estimates over the last ``window`` returns.
+
+Results are stored as ``Calibration`` rows indexed by ticker and end date.
+``calibrate`` returns the stored row for the same ticker, window and
+estimator without opening the history again. A history uploaded with the
+dashboard form is always read, and its calibration becomes the stored one.
+"""
+from datetime import date
+import gzip
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+import numpy as np
+
+from .models import Calibration
+
+DATE_COLUMNS = ('date', 'datetime', 'timestamp', 'time')
+PRICE_COLUMNS = ('adj_close', 'adj close', 'close', 'price', 'last') # Adjusted closes first
+CSV_CHUNK_BYTES = 64 * 2**20 # Bytes of rows read at once
+NPY_CHUNK_ROWS = 2**22 # Rows of a memory-mapped history scanned at once
+ESTIMATORS = tuple(name for name, _ in Calibration.ESTIMATORS)
+DECAY = 0.94 # RiskMetrics daily decay
+WINDOW = 60 # Returns in the rolling window
+
+
+class CalibrationError(ValueError):
+    pass
+
+
+def _column(header, names, kind):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    raise CalibrationError("No %s column in the header, expected one of: %s" % (kind, ', '.join(names)))
+
+
+def _day_ends(keys):
+    # Rows that close a day, except the last row; keys are the days of the rows
+    if np.any(keys[1:] < keys[:-1]):
+        raise CalibrationError("The price history must be in time order")
+    return np.flatnonzero(keys[1:] != keys[:-1])
+
+
+def _csv_closes(f):
+    header = [name.strip().strip('"').lower() for name in f.readline().decode('utf-8-sig').split(',')]
+    date_index = _column(header, DATE_COLUMNS, 'date')
+    price_index = _column(header, PRICE_COLUMNS, 'price')
+
+    def day(row):
+        return row.split(b',', date_index + 1)[date_index].strip().strip(b'"')[:10] # YYYY-MM-DD prefix
+
+    def price(row):
+        try:
+            return float(row.split(b',')[price_index].strip().strip(b'"'))
+        except (IndexError, ValueError):
+            raise CalibrationError("Invalid price in row: %r" % row[:80])
+
+    days = []
+    closes = []
+    last_row = None # Last row read so far; it closes its day unless the next row has the same day
+    while True:
+        rows = [row for row in f.readlines(CSV_CHUNK_BYTES) if row.strip()]
+        if not rows:
+            break
+        if last_row is not None:
+            rows.insert(0, last_row)
+        keys = np.array([day(row) for row in rows])
+        for i in _day_ends(keys):
+            days.append(keys[i].decode())
+            closes.append(price(rows[i]))
+        last_row = rows[-1]
+    if last_row is not None:
+        days.append(day(last_row).decode())
+        closes.append(price(last_row))
+
+    try:
+        return np.array(days, dtype='datetime64[D]'), np.array(closes)
+    except ValueError as exc:
+        raise CalibrationError("Invalid date in the price history: %s" % exc)
+
+
+def _npy_closes(source):
+    # Memory-mapped when on disk; uploads held in memory are small enough to load
+    data = np.load(source, mmap_mode='r' if isinstance(source, str) else None)
+    if data.dtype.names is None or not {'time', 'price'} <= set(data.dtype.names):
+        raise CalibrationError("A .npy history must be a structured array with time and price fields")
+
+    days = []
+    closes = []
+    last_day = last_price = None # Last row scanned so far
+    for lo in range(0, len(data), NPY_CHUNK_ROWS):
+        block = data[lo:lo + NPY_CHUNK_ROWS]
+        keys = block['time'].astype('datetime64[D]')
+        prices = np.asarray(block['price'], dtype=float)
+        if last_day is not None:
+            keys = np.concatenate(([last_day], keys))
+            prices = np.concatenate(([last_price], prices))
+        ends = _day_ends(keys)
+        days.append(keys[ends])
+        closes.append(prices[ends])
+        last_day, last_price = keys[-1], prices[-1]
+    if last_day is not None:
+        days.append(np.array([last_day]))
+        closes.append(np.array([last_price]))
+
+    if not days:
+        return np.array([], dtype='datetime64[D]'), np.array([])
+    return np.concatenate(days), np.concatenate(closes)
+
+
+def read_closes(source, name=None):
+    """Days (``datetime64[D]``) and closing prices of a history.
+
+    ``source`` is a path or an open binary file; ``name`` (the path by
+    default) decides the format from its extension.
+    """
+    name = name or source
+    try:
+        if name.endswith('.npy'):
+            return _npy_closes(source)
+        if isinstance(source, str):
+            with (gzip.open if name.endswith('.gz') else open)(source, 'rb') as f:
+                return _csv_closes(f)
+        return _csv_closes(gzip.GzipFile(fileobj=source) if name.endswith('.gz') else source)
+    except CalibrationError:
+        raise
+    except (EOFError, TypeError, ValueError) as exc: # A malformed .npy, or a header that is not UTF-8
+        raise CalibrationError("Unreadable price history %s: %s" % (name, exc))
+
+
+def estimate(closes, estimator=Calibration.SAMPLE, decay=DECAY, window=WINDOW):
+    """``(RetB, StdB, returns used)`` from daily closes."""
+    returns = closes[1:] / closes[:-1] - 1
+    if estimator == Calibration.ROLLING:
+        returns = returns[-window:]
+    if len(returns) < 2:
+        raise CalibrationError("At least two daily returns are needed, got %d" % len(returns))
+
+    if estimator == Calibration.EWMA:
+        weights = decay ** np.arange(len(returns) - 1, -1, -1.0) # The latest return weighs 1
+        weights /= weights.sum()
+        RetB = weights @ returns
+        StdB = np.sqrt(weights @ np.square(returns - RetB))
+    else:
+        RetB = returns.mean()
+        StdB = returns.std(ddof=1)
+    return float(RetB), float(StdB), len(returns)
+
+
+def parse_day(value):
+    if value in (None, '') or isinstance(value, date):
+        return value or None
+    try:
+        day = parse_date(str(value))
+    except ValueError: # Well formed but not a real date
+        day = None
+    if day is None:
+        raise CalibrationError("Invalid date: %s" % value)
+    return day
+
+
+def calibrate(ticker, source=None, name=None, since=None, until=None, estimator=Calibration.SAMPLE,
+              decay=DECAY, window=WINDOW, refresh=False):
+    """Stored or new ``Calibration`` of ``ticker`` over ``[since, until]``.
+
+    ``until`` defaults to today. Unless ``refresh`` is set, a stored
+    calibration with the same ticker, dates and estimator is returned
+    without reading ``source``, which is only needed when there is none.
+    """
+    if estimator not in ESTIMATORS:
+        raise CalibrationError("Unknown estimator: %s" % estimator)
+    if estimator == Calibration.EWMA and not 0 < decay < 1:
+        raise CalibrationError("The EWMA decay must be between 0 and 1")
+    if estimator == Calibration.ROLLING and window < 2:
+        raise CalibrationError("The rolling window must hold at least 2 returns")
+
+    key = {
+        'ticker': ticker.strip().upper(),
+        'since': parse_day(since),
+        'until': parse_day(until) or timezone.localdate(),
+        'estimator': estimator,
+        'decay': decay if estimator == Calibration.EWMA else 0.0,
+        'window': window if estimator == Calibration.ROLLING else 0,
+    }
+    if not key['ticker']:
+        raise CalibrationError("A ticker is needed to store the calibration")
+    if not refresh:
+        stored = Calibration.objects.filter(**key).first()
+        if stored is not None:
+            return stored
+    if source is None:
+        raise CalibrationError("No stored calibration of %s for these dates, upload its price history"
+                               % key['ticker'])
+
+    days, closes = read_closes(source, name)
+    inside = days <= np.datetime64(key['until'])
+    if key['since'] is not None:
+        inside &= days >= np.datetime64(key['since'])
+    days, closes = days[inside], closes[inside]
+    RetB, StdB, observations = estimate(closes, estimator, decay, window)
+
+    return Calibration.objects.create(
+        as_of=days[-1].item(),
+        observations=observations,
+        RetB=RetB,
+        StdB=StdB,
+        last_close=float(closes[-1]),
+        source=str(name or source)[:255],
+        **key
+    )
+
+
+def calibrate_form(data, upload=None):
+    """Calibration from the dashboard form's optional price-history fields.
+
+    An ``upload`` is always calibrated, even when a calibration of the same
+    ticker and dates is stored; without one the stored calibration is used.
+    """
+    if upload is None:
+        source, name = None, None
+    elif hasattr(upload, 'temporary_file_path'): # Large uploads are on disk and can be memory-mapped
+        source, name = upload.temporary_file_path(), upload.name
+    else:
+        source, name = upload.file, upload.name
+    try:
+        decay = float(data.get("calibrationDecay") or DECAY)
+        window = int(data.get("calibrationWindow") or WINDOW)
+    except ValueError:
+        raise CalibrationError("Invalid EWMA decay or rolling window")
+    return calibrate(data.get("calibrationTicker") or str(data.get("bidderName", "")), source, name,
+                     since=data.get("calibrationSince"), until=data.get("calibrationUntil"),
+                     estimator=data.get("calibrationEstimator") or Calibration.SAMPLE,
+                     decay=decay, window=window, refresh=upload is not None)
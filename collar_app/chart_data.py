@@ -0,0 +1,70 @@
+"""Chart-ready data: compact curves and histograms for the dashboard grid.
+
+Bokeh serializes every point handed to a glyph into the page, so charts 4 and
+5 used to embed four 100,000-point curves. The curves are monotone in the
+sorted effective price and piecewise smooth with kinks at the collar bounds,
+so they are reduced with Largest-Triangle-Three-Buckets separately on each
+side of the bounds: the samples adjacent to each kink are always kept.
+"""
+import numpy as np
+
+CURVE_POINTS = 600 # Target points per downsampled curve
+MAX_BINS = 100 # Upper limit on histogram bins
+
+
+def lttb(x, y, n_out):
+    """Indices of the ``n_out`` points picked by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int) # n_out - 2 buckets over the interior
+    picked = np.empty(n_out, dtype=int)
+    picked[0] = 0
+    picked[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        # Twice the area of the triangle (point a, candidate, next bucket average)
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def downsample_curve(x, y, breakpoints=(), n_out=CURVE_POINTS):
+    """Reduce a curve over sorted ``x`` to about ``n_out`` points.
+
+    The curve is split at ``breakpoints`` (the collar bounds) and each piece
+    is reduced on its own, with a budget proportional to its length, so the
+    kinks stay where they are.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(x)
+    if n <= n_out:
+        return x, y
+
+    cuts = [0] + sorted(int(i) for i in np.searchsorted(x, breakpoints)) + [n]
+    picked = []
+    for lo, hi in zip(cuts[:-1], cuts[1:]):
+        if hi <= lo:
+            continue
+        budget = max(2, int(round(n_out * (hi - lo) / n)))
+        picked.append(lo + lttb(x[lo:hi], y[lo:hi], budget))
+    picked = np.concatenate(picked)
+    return x[picked], y[picked]
+
+
+def histogram(values, simulations):
+    """Density histogram with ``sqrt(simulations)`` bins, capped at ``MAX_BINS``."""
+    nbins = max(1, min(int(np.sqrt(simulations)), MAX_BINS))
+    return np.histogram(values, density=True, bins=nbins)
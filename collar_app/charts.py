@@ -0,0 +1,231 @@
+"""Bokeh charts of the dashboard.
+
+Importing Bokeh is a large part of a worker's start-up time and memory, so
+this module is only imported by the views that render charts.
+"""
+from django.conf import settings
+from bokeh.plotting import figure
+from bokeh.layouts import gridplot
+from bokeh.embed import components
+from bokeh.models import Span, BoxAnnotation, LinearAxis, Range1d
+from bokeh.palettes import Paired12
+import numpy as np
+
+from .chart_data import downsample_curve, histogram
+from .metrics import stage_timer
+from .valuation import COLLAR_PREFIXES
+
+
+def dashboard_charts(pipeline, reduce=None):
+
+    # With reduce (settings.CHART_REDUCTION by default), curves are downsampled,
+    # histograms get at most chart_data.MAX_BINS bins and chart 1 shows paths
+    # of the main simulation
+    if reduce is None:
+        reduce = settings.CHART_REDUCTION
+
+    inputs = pipeline.inputs
+    collar_type = pipeline.collar_type
+    simulations = pipeline.simulations
+    SB0 = inputs['SB0'] # Bidder price 1 day prior to announcement
+    RetB = inputs['RetB'] # Daily return of bidder during the bid period
+    StdB = inputs['StdB'] # Daily std of bidder's return during the bid period
+    T = inputs['T'] # Days between merger agreement and deal closing
+    dt = 1 # Always 1, as we use daily intervals
+    GBMsteps = round(T/dt) # Number of discrete intervals of GBM
+    avgper = inputs['avgper'] # Averaging period, according to collar agreement
+
+    rng = np.random.default_rng(pipeline.seed) # Sample paths for chart 1
+    t = np.linspace(0, T, GBMsteps)
+
+    SBTeff_array = pipeline.effective_prices()
+    stats, arrays = pipeline.value()
+    NocPTT = arrays['NOC']['PTT']
+    NocPTTmean = stats['NocPTTmean']
+
+    """DATA SELECTION"""
+    prefix = COLLAR_PREFIXES[collar_type]
+    LB = stats[prefix + 'LB']
+    UB = stats[prefix + 'UB']
+    CollarPTT = arrays[collar_type]['PTT']
+    CollarPTTmean = stats[prefix + 'PTTmean']
+    CollarER = arrays[collar_type]['ER']
+    CollarStakeOfTarget = arrays[collar_type]['StakeOfTarget']
+    CollarEmission = arrays[collar_type]['Emission']
+    CollarWPPTT_Suc = arrays[collar_type]['WPPTT_Suc']
+    CollarWPPTT_Suc_mean = stats[prefix + 'WPPTT_Suc_mean']
+    
+    """CHARTS CONTROLS"""
+    red = '#c20430'
+    green = '#00833f'
+    blue = '#0071ce'
+    orange = '#f98e2b'
+    nbins = int(np.sqrt(simulations))
+
+    def hist(values):
+        if reduce:
+            return histogram(values, simulations)
+        return np.histogram(values, density=True, bins=nbins)
+
+    def curve(values):
+        if reduce:
+            return downsample_curve(SBTeff_array, values, (LB, UB))
+        return SBTeff_array, values
+
+    """CHART 1"""
+    chart1 = figure()
+    sample_paths = pipeline.sample_paths() if reduce else None
+
+    for z in range(11):
+
+        if sample_paths is not None and z < len(sample_paths):
+            SB_path_test = sample_paths[z]
+        else:
+            t_test = np.linspace(0, T, GBMsteps)
+            N_test = rng.standard_normal(size = GBMsteps)
+            R_test = (t_test != 0) * (RetB * dt * t_test + StdB * np.cumsum(N_test) * np.sqrt(dt))
+            SB_path_test = SB0 * (1 + R_test)
+        chart1.line(t, SB_path_test, line_width=1, line_color=Paired12[z])
+
+    chart1_start_price_line = Span(location=SB0,
+                                   dimension='width', line_color='grey',
+                                   line_dash='dashed', line_width=3)
+    chart1.add_layout(chart1_start_price_line)
+
+    chart1_upper_price_line = Span(location=UB,
+                                   dimension='width', line_color=blue, line_width=3)
+    chart1.add_layout(chart1_upper_price_line)
+
+    chart1_lower_price_line = Span(location=LB,
+                                   dimension='width', line_color=blue, line_width=3)
+    chart1.add_layout(chart1_lower_price_line)
+
+    chart1_interval_span = BoxAnnotation(bottom=LB, top=UB, fill_alpha=0.1, fill_color=blue)
+    chart1.add_layout(chart1_interval_span)
+
+    chart1_avgper_span = BoxAnnotation(left=T-avgper, right=T, fill_alpha=0.1, fill_color=red)
+    chart1.add_layout(chart1_avgper_span)
+
+    chart1.title.text = "1. Simulation modeling of bidder stock price"
+    chart1.xaxis.axis_label = 'Days after signing merger agreement'
+    chart1.yaxis.axis_label = 'Price, $'
+    chart1.xgrid.grid_line_color = None
+    chart1.ygrid.grid_line_color = None
+    
+    """CHART 2"""
+    chart2 = figure()
+
+    chart2_hist, chart2_edges = hist(SBTeff_array)
+    chart2.quad(top=chart2_hist, bottom=0, left=chart2_edges[:-1], right=chart2_edges[1:],
+                fill_color=red, line_color=red)
+
+    chart2_span = BoxAnnotation(left=LB, right=UB, fill_alpha=0.1, fill_color=blue)
+    chart2.add_layout(chart2_span)
+
+    chart2_upper_price_line = Span(location=UB,
+                                   dimension='height', line_color=blue, line_width=3)
+    chart2.add_layout(chart2_upper_price_line)
+
+    chart2_lower_price_line = Span(location=LB,
+                                   dimension='height', line_color=blue, line_width=3)
+    chart2.add_layout(chart2_lower_price_line)
+
+    chart2.title.text = "2. Effective price distibution"
+    chart2.xaxis.axis_label = 'Effective price'
+    chart2.yaxis.axis_label = 'Probability'
+    chart2.xgrid.grid_line_color = None
+    chart2.ygrid.grid_line_color = None
+    chart2.y_range.start = 0
+
+    """CHART 3"""
+    chart3 = figure(y_range=(0,0.2))
+    
+    chart3_hist_noc, chart3_edges_noc = hist(NocPTT)
+    chart3.quad(top=chart3_hist_noc, bottom=0, left=chart3_edges_noc[:-1], right=chart3_edges_noc[1:],
+                fill_color=red, line_color=red, legend_label="No collar")
+
+    chart3_hist_collar, chart3_edges_collar = hist(CollarPTT)
+    chart3.quad(top=chart3_hist_collar, bottom=0, left=chart3_edges_collar[:-1], right=chart3_edges_collar[1:],
+                fill_color=green, line_color=green, legend_label="With collar")
+
+    chart3_nocpttmean_line = Span(location=NocPTTmean, line_dash='dashed',
+                                  dimension='height', line_color=red, line_width=3)
+    chart3.add_layout(chart3_nocpttmean_line)
+
+    chart3_collarpttmean_line = Span(location=CollarPTTmean, line_dash='dashed',
+                                  dimension='height', line_color=green, line_width=3)
+    chart3.add_layout(chart3_collarpttmean_line)
+
+    chart3.title.text = "3. Collar's effect on payoff"
+    chart3.xaxis.axis_label = 'Payoff to target, $'
+    chart3.yaxis.axis_label = 'Probability'
+    chart3.xgrid.grid_line_color = None
+    chart3.ygrid.grid_line_color = None
+
+    """CHART 4"""
+    chart4 = figure()
+    chart4.y_range = Range1d(45, 59)
+    chart4.line(*curve(CollarPTT), color = red, line_width=3)
+
+    chart4.extra_y_ranges = {"right": Range1d(start=0.2, end=1)}
+    chart4.add_layout(LinearAxis(y_range_name="right", axis_label='Exchange ratio', axis_label_text_color = green), 'right')
+
+    chart4.line(*curve(CollarER), color = green, line_width=3, y_range_name="right")
+
+    chart4.add_layout(chart2_span)
+    chart4.add_layout(chart2_lower_price_line)
+    chart4.add_layout(chart2_upper_price_line)
+
+    chart4.title.text = "4. Payoff to target and exchange ratio"
+    chart4.xaxis.axis_label = 'Effective price'
+    chart4.yaxis[0].axis_label = 'Payoff to target, $'
+    chart4.yaxis[0].axis_label_text_color = red
+
+    """CHART 5"""
+    chart5 = figure()
+    chart5.y_range = Range1d(0.2, 0.5)
+    chart5.line(*curve(CollarStakeOfTarget), color = red, line_width=3)
+
+    chart5.extra_y_ranges = {"right": Range1d(start=400, end=800)}
+    chart5.add_layout(LinearAxis(y_range_name="right", axis_label='Emission volume'), 'right')
+
+    chart5.line(*curve(CollarEmission / 1000000), y_range_name="right", alpha = 0)
+
+    chart5.add_layout(chart2_span)
+    chart5.add_layout(chart2_lower_price_line)
+    chart5.add_layout(chart2_upper_price_line)
+
+    chart5.title.text = "5. Consolidated company equity"
+    chart5.xaxis.axis_label = 'Effective price'
+    chart5.yaxis[0].axis_label = "Target's stake"
+
+    """CHART 6"""
+    chart6 = figure(y_range=(0,0.2))
+
+    chart6_hist_nowa, chart6_edges_nowa = hist(CollarPTT)
+    chart6.quad(top=chart6_hist_nowa, bottom=0, left=chart6_edges_nowa[:-1], right=chart6_edges_nowa[1:],
+                fill_color=red, line_color=red, legend_label="No WP")
+
+    if len(CollarWPPTT_Suc): # Nothing to show when no deal closes
+        chart6_hist_wa, chart6_edges_wa = hist(CollarWPPTT_Suc)
+        chart6.quad(top=chart6_hist_wa, bottom=0, left=chart6_edges_wa[:-1], right=chart6_edges_wa[1:],
+                    fill_color=green, line_color=green, legend_label="With WP")
+
+    chart6_collarpttmean_line = Span(location=CollarPTTmean, line_dash='dashed',
+                                     dimension='height', line_color=red, line_width=3)
+    chart6.add_layout(chart6_collarpttmean_line)
+
+    if len(CollarWPPTT_Suc):
+        chart6_wapttmean_line = Span(location=CollarWPPTT_Suc_mean, line_dash='dashed',
+                                         dimension='height', line_color=green, line_width=3)
+        chart6.add_layout(chart6_wapttmean_line)
+
+    chart6.title.text = "6. Walkaway's effect on payoff"
+    chart6.xaxis.axis_label = 'Payoff to target, $'
+    chart6.yaxis.axis_label = 'Probability'
+    chart6.xgrid.grid_line_color = None
+    chart6.ygrid.grid_line_color = None
+
+    grid = gridplot([[chart1, chart2, chart3], [chart4, chart5, chart6]], plot_width=420, plot_height=300)
+    with stage_timer('embed'): # Serializing the Bokeh models
+        return components(grid)
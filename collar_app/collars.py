@@ -0,0 +1,113 @@
+"""Collar payoffs as piecewise-linear functions of the effective price.
+
+Every collar in the dashboard pays the target ``a + b * SBTeff`` per share on
+each of three price segments: below the lower bound, inside the bounds and
+above the upper bound. Expressing the payoff as segments lets the same
+valuation code run on any distribution of ``SBTeff`` that can report the
+probability and the partial mean of an interval.
+
+Bounds may be NumPy arrays: everything broadcasts, so a whole grid of collar
+terms is valued in one call.
+"""
+import numpy as np
+
+INF = np.inf
+
+
+def fex_segments(FexLB, FexUB, BaseER):
+    # (lower price, upper price, intercept, slope, inside the collar)
+    return [
+        (-INF, FexLB, FexLB * BaseER, 0.0, False),
+        (FexLB, FexUB, 0.0, BaseER, True),
+        (FexUB, INF, FexUB * BaseER, 0.0, False),
+    ]
+
+
+def fp_segments(BaseP, LR, UR):
+    FpLB = BaseP / UR
+    FpUB = BaseP / LR
+    return [
+        (-INF, FpLB, 0.0, UR, False),
+        (FpLB, FpUB, BaseP, 0.0, True),
+        (FpUB, INF, 0.0, LR, False),
+    ]
+
+
+def payoff_range(lo, hi, a, b, y_lo, y_hi):
+    """Sub-interval of ``[lo, hi]`` where ``y_lo <= a + b * x <= y_hi``.
+
+    An empty sub-interval is returned with ``lo == hi``.
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    y_lo, y_hi = np.asarray(y_lo, dtype=float), np.asarray(y_hi, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'): # Flat segments (b == 0) are replaced below
+        x1 = (y_lo - a) / b
+        x2 = (y_hi - a) / b
+    x1, x2 = np.where(b < 0, x2, x1), np.where(b < 0, x1, x2)
+
+    # A flat payoff is either in range everywhere or nowhere
+    flat_ok = (y_lo <= a) & (a <= y_hi)
+    x1 = np.where(b == 0, np.where(flat_ok, -INF, INF), x1)
+    x2 = np.where(b == 0, np.where(flat_ok, INF, -INF), x2)
+
+    lo = np.maximum(lo, x1)
+    hi = np.maximum(lo, np.minimum(hi, x2))
+    return lo, hi
+
+
+def scalar(value):
+    # Turns 0-d arrays produced by broadcasting back into NumPy scalars
+    return value[()] if isinstance(value, np.ndarray) and value.ndim == 0 else value
+
+
+def value_segments(dist, segments, ST0, DP, RP, BaseER):
+    """Expected collar and walkaway payoffs under ``dist``.
+
+    ``dist`` must provide ``mean``, ``prob(lo, hi)`` and
+    ``partial_mean(lo, hi)`` (the expectation of ``SBTeff`` restricted to the
+    interval). The walkaway options only live outside the collar, so their
+    payoffs are integrated over the part of each outer segment where they are
+    in the money.
+    """
+    KT = ST0 * (1 + DP) # Target walks away below this payoff
+    KB = ST0 * (1 + RP) # Bidder walks away above this payoff
+
+    PTTmean = 0.0
+    WVTT = 0.0
+    WVBT = 0.0
+    Psuc = 0.0
+    SucPTT = 0.0 # Payoff integrated over successful deals
+
+    for lo, hi, a, b, inside in segments:
+        PTTmean = PTTmean + a * dist.prob(lo, hi) + b * dist.partial_mean(lo, hi)
+
+        if inside:
+            success = (lo, hi)
+        else:
+            # Target's option: E[(KT - a - b*SBTeff)+] on the segment
+            itm = payoff_range(lo, hi, a, b, -INF, KT)
+            WVTT = WVTT + (KT - a) * dist.prob(*itm) - b * dist.partial_mean(*itm)
+
+            # Bidder's option: E[(a + b*SBTeff - KB)+] on the segment
+            itm = payoff_range(lo, hi, a, b, KB, INF)
+            WVBT = WVBT + (a - KB) * dist.prob(*itm) + b * dist.partial_mean(*itm)
+
+            success = payoff_range(lo, hi, a, b, KT, KB)
+
+        Psuc = Psuc + dist.prob(*success)
+        SucPTT = SucPTT + a * dist.prob(*success) + b * dist.partial_mean(*success)
+
+    NocPTTmean = dist.mean * BaseER
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        WPPTT_Suc_mean = np.where(Psuc > 0, SucPTT / Psuc, np.nan)
+
+    return {
+        'PTTmean': scalar(PTTmean),
+        'CVTT': scalar(PTTmean - NocPTTmean),
+        'WVTT': scalar(WVTT),
+        'WVBT': scalar(WVBT),
+        'NetWV': scalar(WVTT - WVBT),
+        'Psuc': scalar(Psuc),
+        'WPPTT_Suc_mean': scalar(WPPTT_Suc_mean),
+    }
@@ -0,0 +1,131 @@
+"""Side-by-side comparison of deal structures on one effective-price array.
+
+The deal without a collar, the FEX and FP collars of the form and any number
+of extra variants (the same collar types with other terms) are all valued
+on the same simulated prices. Pricing a structure is one vectorized payoff
+pass, and the differences between structures carry no Monte Carlo noise
+from different draws. ``CVTT_stderr`` is the standard error of the collar
+value itself, from its per-path difference to the no-collar payoff.
+"""
+import json
+
+import numpy as np
+
+from .inputs import FIELDS, InputError
+from .valuation import collar_payoff, no_collar, walkaway
+
+# Terms a variant may change, by collar type; market inputs stay shared
+TERMS = {
+    'FEX': ('FexLB', 'FexUB'),
+    'FP': ('BaseP', 'LR', 'UR'),
+}
+FIELD_NAMES = {field: (name, cast) for name, field, cast in FIELDS}
+
+
+def _check_terms(i, collar_type, deal):
+    # Terms a variant leaves out are the form's; only the ones known can be checked
+    if collar_type == 'FEX':
+        if 'FexLB' in deal and 'FexUB' in deal and deal['FexLB'] > deal['FexUB']:
+            raise InputError("fexLB exceeds fexUB in variant %d" % i)
+        return
+    for name in ('LR', 'UR'):
+        if name in deal and not deal[name] > 0:
+            raise InputError("%s must be positive in variant %d" % (name, i))
+    if 'LR' in deal and 'UR' in deal and deal['LR'] > deal['UR']:
+        raise InputError("LR exceeds UR in variant %d" % i)
+
+
+def parse_variants(raw, inputs=None):
+    """Read extra structures from JSON.
+
+    ``raw`` is a list of objects with ``name``, ``collarType`` and any of the
+    collar's form fields (``fexLB``, ``fexUB`` or ``baseP``, ``LR``, ``UR``).
+    Their bounds are checked together with the terms of ``inputs`` that a
+    variant leaves unchanged. Returns ``(name, collar_type, terms)`` tuples.
+    """
+    try:
+        items = json.loads(raw) if raw else []
+    except ValueError:
+        raise InputError("variants must be a JSON list")
+    if not isinstance(items, list):
+        raise InputError("variants must be a JSON list")
+
+    variants = []
+    for i, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            raise InputError("Variant %d must be a JSON object" % i)
+        collar_type = item.get('collarType')
+        if collar_type not in TERMS:
+            raise InputError("Unknown collar type in variant %d: %s" % (i, collar_type))
+        terms = {}
+        for field, value in item.items():
+            if field in ('name', 'collarType'):
+                continue
+            name, cast = FIELD_NAMES.get(field, (None, None))
+            if name not in TERMS[collar_type]:
+                raise InputError("Variant %d cannot change %s" % (i, field))
+            try:
+                terms[name] = cast(value)
+            except (TypeError, ValueError):
+                raise InputError("Invalid value for %s in variant %d: %r" % (field, i, value))
+        _check_terms(i, collar_type, dict(inputs or {}, **terms))
+        variants.append((str(item.get('name', '%s variant %d' % (collar_type, i))), collar_type, terms))
+    return variants
+
+
+def _stake_stats(StakeOfTarget):
+    return {
+        'StakeOfTarget_mean': np.mean(StakeOfTarget),
+        'StakeOfTarget_min': np.min(StakeOfTarget),
+        'StakeOfTarget_max': np.max(StakeOfTarget),
+    }
+
+
+def compare_structures(SBTeff_array, inputs, variants=()):
+    """One row of values, success probability and dilution per structure."""
+    noc_stats, NocPTT = no_collar(SBTeff_array, inputs['BaseER'])
+    NocPTTmean = noc_stats['NocPTTmean']
+    n = len(SBTeff_array)
+
+    NocEmission = np.round(inputs['NT0'] * inputs['BaseER'])
+    rows = [dict({
+        'name': 'No collar',
+        'collar_type': None,
+        'LB': None,
+        'UB': None,
+        'PTTmean': NocPTTmean,
+        'CVTT': 0.0,
+        'CVTT_stderr': 0.0,
+        'CVTTTotal': 0.0,
+        'CVTTRel': 0.0,
+        'WVTT': 0.0,
+        'WVBT': 0.0,
+        'NetWV': 0.0,
+        'Psuc': 1.0, # No collar, no walkaway provision
+    }, **_stake_stats(np.array([NocEmission / (inputs['NB0'] + NocEmission)])))]
+
+    structures = [('FEX', 'FEX', {}), ('FP', 'FP', {})] + list(variants)
+    for name, collar_type, terms in structures:
+        deal = dict(inputs, **terms)
+        stats, arrays = collar_payoff(collar_type, SBTeff_array, deal, NocPTTmean)
+        walkaway_stats, _ = walkaway(arrays['PTT'], arrays['OUT'], deal['NT0'], deal['ST0'], deal['DP'], deal['RP'])
+        difference = np.subtract(arrays['PTT'], NocPTT)
+        row = {
+            'name': name,
+            'collar_type': collar_type,
+            'LB': stats['LB'],
+            'UB': stats['UB'],
+            'PTTmean': stats['PTTmean'],
+            'CVTT': stats['CVTT'],
+            'CVTT_stderr': np.std(difference, ddof=1) / np.sqrt(n) if n > 1 else np.inf,
+            'CVTTTotal': stats['CVTTTotal'],
+            'CVTTRel': stats['CVTTRel'],
+            'WVTT': walkaway_stats['WVTT'],
+            'WVBT': walkaway_stats['WVBT'],
+            'NetWV': walkaway_stats['NetWV'],
+            'Psuc': walkaway_stats['Psuc'],
+        }
+        row.update(_stake_stats(arrays['StakeOfTarget']))
+        rows.append(row)
+        del arrays, difference
+    return rows
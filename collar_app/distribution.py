@@ -0,0 +1,134 @@
+"""Prefix-sum index over a sorted sample of effective prices.
+
+Building the index costs one sort and two cumulative sums. After that, the
+count, sum and sum of squares of the sample on any price interval come from
+two ``searchsorted`` lookups, so collar and walkaway statistics for any set of
+bounds cost O(log n) instead of a pass over the whole sample. Intervals are
+half-open, ``[lo, hi)``; a sample lying exactly on a bound has probability
+zero for a continuous engine.
+"""
+import numpy as np
+
+from .collars import INF, fex_segments, fp_segments, payoff_range, scalar, value_segments
+
+
+class DistributionIndex:
+
+    def __init__(self, SBTeff_array, is_sorted=False):
+        x = np.asarray(SBTeff_array, dtype=float)
+        self.x = x if is_sorted else np.sort(x)
+        self.n = len(self.x)
+        self.cum1 = np.concatenate(([0.0], np.cumsum(self.x)))
+        self.cum2 = np.concatenate(([0.0], np.cumsum(self.x * self.x)))
+        self.mean = self.cum1[-1] / self.n
+        self.std = np.sqrt(max(self.cum2[-1] / self.n - self.mean**2, 0.0))
+
+    def span(self, lo, hi):
+        # Positions of the first sample >= lo and the first sample >= hi
+        i = np.searchsorted(self.x, lo, side='left')
+        j = np.searchsorted(self.x, hi, side='left')
+        return i, np.maximum(i, j)
+
+    def prob(self, lo, hi):
+        i, j = self.span(lo, hi)
+        return (j - i) / self.n
+
+    def partial_mean(self, lo, hi):
+        i, j = self.span(lo, hi)
+        return (self.cum1[j] - self.cum1[i]) / self.n
+
+    def partial_square(self, lo, hi):
+        i, j = self.span(lo, hi)
+        return (self.cum2[j] - self.cum2[i]) / self.n
+
+    def linear_stats(self, pieces):
+        """Mean, std, min and max of a payoff ``c + d * SBTeff``.
+
+        ``pieces`` is a list of ``(lo, hi, c, d)``; the payoff is zero for
+        samples not covered by any piece.
+        """
+        mean = 0.0
+        square = 0.0
+        covered = 0.0
+        low = INF
+        high = -INF
+
+        for lo, hi, c, d in pieces:
+            i, j = self.span(lo, hi)
+            p = (j - i) / self.n
+            m1 = (self.cum1[j] - self.cum1[i]) / self.n
+            m2 = (self.cum2[j] - self.cum2[i]) / self.n
+            mean = mean + c * p + d * m1
+            square = square + c * c * p + 2 * c * d * m1 + d * d * m2
+            covered = covered + p
+
+            # A linear payoff peaks at the ends of the covered run of samples
+            nonempty = j > i
+            first = c + d * self.x[np.minimum(i, self.n - 1)]
+            last = c + d * self.x[np.maximum(j - 1, 0)]
+            low = np.where(nonempty, np.minimum(low, np.minimum(first, last)), low)
+            high = np.where(nonempty, np.maximum(high, np.maximum(first, last)), high)
+
+        uncovered = covered < 1
+        low = np.where(uncovered, np.minimum(low, 0.0), low)
+        high = np.where(uncovered, np.maximum(high, 0.0), high)
+        std = np.sqrt(np.maximum(square - mean * mean, 0.0))
+
+        return scalar(mean), scalar(std), scalar(low), scalar(high)
+
+
+def collar_statistics(index, segments, ST0, DP, RP, BaseER):
+    """Everything ``value_segments`` returns plus payoff dispersion.
+
+    Adds the mean, std, min and max of the collar payoff (``PTT``) and of both
+    walkaway payoffs (``WPTT`` to target, ``WPBT`` to bidder).
+    """
+    KT = ST0 * (1 + DP)
+    KB = ST0 * (1 + RP)
+
+    PTT = []
+    WPTT = []
+    WPBT = []
+    for lo, hi, a, b, inside in segments:
+        PTT.append((lo, hi, a, b))
+        if not inside:
+            WPTT.append(payoff_range(lo, hi, a, b, -INF, KT) + (KT - a, -b))
+            WPBT.append(payoff_range(lo, hi, a, b, KB, INF) + (a - KB, b))
+
+    stats = value_segments(index, segments, ST0, DP, RP, BaseER)
+    for name, pieces in (('PTT', PTT), ('WPTT', WPTT), ('WPBT', WPBT)):
+        mean, std, low, high = index.linear_stats(pieces)
+        stats[name + 'mean'] = mean
+        stats[name + 'std'] = std
+        stats[name + 'min'] = low
+        stats[name + 'max'] = high
+
+    return stats
+
+
+def _mask_invalid(stats, invalid):
+    for key, value in stats.items():
+        stats[key] = np.where(invalid, np.nan, value)
+    return stats
+
+
+def fex_grid(index, LB_values, UB_values, ST0, DP, RP, BaseER):
+    """Price every FEX collar on the mesh ``LB_values x UB_values``.
+
+    Returns ``collar_statistics`` as 2-D arrays indexed ``[lb, ub]``; cells
+    with ``LB > UB`` are NaN.
+    """
+    LB, UB = np.meshgrid(np.asarray(LB_values, dtype=float), np.asarray(UB_values, dtype=float), indexing='ij')
+    stats = collar_statistics(index, fex_segments(LB, UB, BaseER), ST0, DP, RP, BaseER)
+    return _mask_invalid(stats, LB > UB)
+
+
+def fp_grid(index, LR_values, UR_values, BaseP, ST0, DP, RP, BaseER):
+    """Price every FP collar on the mesh ``LR_values x UR_values``.
+
+    Returns ``collar_statistics`` as 2-D arrays indexed ``[lr, ur]``; cells
+    with ``LR > UR`` are NaN.
+    """
+    LR, UR = np.meshgrid(np.asarray(LR_values, dtype=float), np.asarray(UR_values, dtype=float), indexing='ij')
+    stats = collar_statistics(index, fp_segments(BaseP, LR, UR), ST0, DP, RP, BaseER)
+    return _mask_invalid(stats, LR > UR)
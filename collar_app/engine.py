@@ -0,0 +1,195 @@
+"""Simulation engine for the bidder's effective price.
+
+The path model is the one the dashboard has always used:
+
+    SB_path = SB0 * (1 + RetB * t + StdB * cumsum(N))
+
+with ``t = linspace(0, T, T)``, the first point pinned at ``SB0`` and the
+effective price taken as the mean of the last ``avgper`` points of the path.
+
+Because the path is linear in the cumulative sum of i.i.d. normals, the
+effective price is exactly Gaussian. The ``'exact'`` method samples it
+directly from its closed-form moments; ``'path'`` simulates the paths.
+
+Either method can draw under a variance-reduction ``scheme`` (see
+``collar_app.variance`` for their estimators):
+
+- ``'plain'``: independent draws;
+- ``'antithetic'``: every normal draw is reused negated;
+- ``'moment'``: moment matching, the prices are shifted so their mean is
+  the closed-form mean. This is the no-collar payoff ``BaseER * SBTeff`` as
+  a control variate with its coefficient fixed at one; the regression
+  estimator is ``collar_app.variance``'s ``'control'``, which draws plain
+  prices;
+- ``'sobol'``: randomized quasi-Monte Carlo, exact method only.
+"""
+import numpy as np
+
+DEFAULT_SIMULATIONS = 100000 # Number of simulations in the model
+DEFAULT_CHUNK_SIZE = 10000 # Simulations generated per 2-D block
+PREFIX_BLOCK = 32 # Minimum column block used to sum the steps before the window
+METHODS = ('path', 'exact')
+SCHEMES = ('plain', 'antithetic', 'moment', 'sobol')
+
+
+def averaging_window(T, avgper):
+    """Indices of the path points that enter the effective price.
+
+    Mirrors ``SB_path[-avgper:]`` exactly, including its edge cases
+    (``avgper`` of 0 or longer than the path selects the whole path).
+    """
+    return np.arange(T)[-avgper:]
+
+
+def effective_price_moments(SB0, RetB, StdB, T, avgper):
+    """Mean and standard deviation of the effective price.
+
+    With ``C_k = N_0 + ... + N_k`` we have ``Cov(C_k, C_l) = min(k, l) + 1``,
+    so the variance of the window average is a sum over the window indices.
+    The pinned point at ``t = 0`` contributes nothing but still counts in the
+    denominator of the average.
+    """
+    if T < 1:
+        raise ValueError("daysBetween must be at least 1")
+
+    dt = 1
+    GBMsteps = round(T/dt)
+    t = np.linspace(0, T, GBMsteps)
+    window = averaging_window(GBMsteps, avgper)
+    width = len(window)
+
+    mean = SB0 * (1 + RetB * dt * t[window].mean())
+
+    k = window[window != 0] # Window indices carrying randomness, ascending
+    weights = 2 * (len(k) - np.arange(len(k))) - 1 # Times each min(k, l) is hit
+    var_cumsum = np.sum((k + 1) * weights) / width**2
+    std = abs(SB0) * StdB * np.sqrt(dt) * np.sqrt(var_cumsum)
+
+    return mean, std
+
+
+def scrambled_sobol(n, rng):
+    """First ``n`` points of a randomized one-dimensional Sobol' sequence.
+
+    A one-dimensional Sobol' sequence is the van der Corput sequence: the
+    points ``bitreverse(i) / 2**m`` are XOR-ed with one random ``m``-bit shift
+    and jittered uniformly inside their cell of width ``2**-m``, so every
+    point is uniform while the set stays stratified.
+    """
+    m = max(1, int(np.ceil(np.log2(max(n, 2)))))
+    i = np.arange(n, dtype=np.int64)
+    cells = np.zeros(n, dtype=np.int64)
+    for bit in range(m):
+        cells |= ((i >> bit) & 1) << (m - 1 - bit)
+    cells ^= rng.integers(0, 2**m)
+    return (cells + rng.random(n)) / 2**m
+
+
+def simulate_effective_prices(SB0, RetB, StdB, T, avgper, simulations,
+                              rng=None, chunk_size=DEFAULT_CHUNK_SIZE, method='path',
+                              antithetic=False, sample_paths=0, scheme='plain', progress=None):
+    """Return an (unsorted) array of ``simulations`` effective prices.
+
+    ``method='exact'`` draws one normal per simulation from the closed-form
+    moments. ``method='path'`` generates paths in blocks of ``chunk_size``
+    rows. Only the trailing averaging window is materialized: the steps
+    before it are folded into a running sum column block by column block, so
+    memory is bounded by ``chunk_size * max(avgper, PREFIX_BLOCK)`` regardless
+    of ``T``.
+
+    With ``antithetic=True``, or ``scheme='antithetic'``, every draw is used
+    twice, once negated: elements ``2i`` and ``2i + 1`` of the result form an
+    antithetic pair. The other schemes are described in the module docstring.
+
+    With ``sample_paths=k`` the full price paths of the first ``k``
+    simulations are kept as well and ``(SBTeff_array, paths)`` is returned;
+    ``paths`` is ``None`` for the exact method, which simulates no paths.
+
+    ``progress(paths_done, chunk)`` is called after each chunk of the path
+    method, and once for the exact method, with the chunk's effective prices.
+    """
+    if T < 1:
+        raise ValueError("daysBetween must be at least 1")
+    if method not in METHODS:
+        raise ValueError("Unknown engine method: %s" % method)
+    if scheme not in SCHEMES:
+        raise ValueError("Unknown variance-reduction scheme: %s" % scheme)
+    if scheme == 'sobol' and method != 'exact':
+        raise ValueError("The sobol scheme needs the exact engine")
+    if rng is None:
+        rng = np.random.default_rng()
+    antithetic = antithetic or scheme == 'antithetic'
+
+    if method == 'exact':
+        mean, std = effective_price_moments(SB0, RetB, StdB, T, avgper)
+        if scheme == 'sobol':
+            from .analytic import norm_ppf # analytic imports this module
+            SBTeff_array = mean + std * norm_ppf(scrambled_sobol(simulations, rng))
+        elif antithetic:
+            Z = rng.standard_normal(size=(simulations + 1) // 2)
+            SBTeff_array = mean + std * _with_antithetic(Z)[:simulations]
+        else:
+            SBTeff_array = mean + std * rng.standard_normal(size=simulations)
+        if scheme == 'moment' and simulations:
+            SBTeff_array += mean - SBTeff_array.mean()
+        if progress is not None:
+            progress(simulations, SBTeff_array)
+        return (SBTeff_array, None) if sample_paths else SBTeff_array
+
+    dt = 1
+    GBMsteps = round(T/dt)
+    t = np.linspace(0, T, GBMsteps)
+    window = averaging_window(GBMsteps, avgper)
+    start = window[0] # First index of the averaging window
+    width = len(window)
+    block = max(width, PREFIX_BLOCK)
+
+    drift = RetB * dt * t[window] # Deterministic part of R inside the window
+    pinned = window == 0 # R is forced to 0 at t = 0
+    chunk_size += chunk_size % 2 # Keeps antithetic pairs inside a chunk
+
+    SBTeff_array = np.empty(simulations)
+    paths = None
+
+    for lo in range(0, simulations, chunk_size):
+        n = min(chunk_size, simulations - lo)
+        rows = (n + 1) // 2 if antithetic else n
+        k = min(sample_paths, rows) if lo == 0 else 0
+        if k:
+            paths = np.empty((k, GBMsteps)) # cumsum(N) of the sampled paths, then the prices
+
+        # Sum of all steps before the window, accumulated in column blocks
+        prefix = np.zeros(rows)
+        for col in range(0, start, block):
+            B = rng.standard_normal(size=(rows, min(block, start - col)))
+            if k:
+                paths[:, col:col + B.shape[1]] = prefix[:k, None] + np.cumsum(B[:k], axis=1)
+            prefix += B.sum(axis=1)
+
+        N = rng.standard_normal(size=(rows, width))
+        cumN = np.cumsum(N, axis=1, out=N)
+        cumN += prefix[:, None]
+        if k:
+            paths[:, start:] = cumN[:k]
+            paths = SB0 * (1 + (t != 0) * (RetB * dt * t + StdB * np.sqrt(dt) * paths))
+
+        R = StdB * np.sqrt(dt) * cumN
+        if antithetic:
+            R = _with_antithetic(R)[:n]
+        R += drift
+        R[:, pinned] = 0
+        SBTeff_array[lo:lo + n] = SB0 * (1 + R.mean(axis=1))
+        if progress is not None:
+            progress(lo + n, SBTeff_array[lo:lo + n])
+
+    if scheme == 'moment' and simulations:
+        SBTeff_array += effective_price_moments(SB0, RetB, StdB, T, avgper)[0] - SBTeff_array.mean()
+    return (SBTeff_array, paths) if sample_paths else SBTeff_array
+
+
+def _with_antithetic(X):
+    # Interleaves the rows of X with their negatives: X0, -X0, X1, -X1, ...
+    out = np.empty((2 * len(X),) + X.shape[1:])
+    out[0::2] = X
+    out[1::2] = -X
+    return out
@@ -0,0 +1,75 @@
+"""Deal inputs shared by the dashboard form and the programmatic endpoints."""
+
+# (model variable, form field, type), in the order of index.html
+FIELDS = (
+    ('NB0', 'bidderSharesBefore', int), # Bidder shares before the deal
+    ('SB0', 'bidderPriceBefore', float), # Bidder price 1 day prior to announcement
+    ('RetB', 'bidderDailyReturn', float), # Daily return of bidder during the bid period
+    ('StdB', 'bidderDailyStd', float), # Daily std of bidder's return during the bid period
+    ('RP', 'readyPremium', float), # Maximum premium bidder is ready to pay
+    ('NT0', 'targetSharesBefore', int), # Target shares before the deal
+    ('ST0', 'targetPriceBefore', float), # Target price 1 day prior to announcement
+    ('DP', 'desiredPremium', float), # Minimum premium desired by target
+    ('T', 'daysBetween', int), # Days between merger agreement and deal closing
+    ('avgper', 'avgPer', int), # Averaging period, according to collar agreement
+    ('BaseER', 'baseER', float), # Base exchange ratio, no collar
+    ('FexLB', 'fexLB', float), # Lower bound of bidder price, FEX collar
+    ('FexUB', 'fexUB', float), # Upper bound of bidder price, FEX collar
+    ('BaseP', 'baseP', float), # Base price, FP collar
+    ('LR', 'LR', float), # Lower bound of exchange ratio, FP collar
+    ('UR', 'UR', float), # Upper bound of exchange ratio, FP collar
+)
+
+NAME_FIELDS = (
+    ('bidder_name', 'bidderName'),
+    ('target_name', 'targetName'),
+    ('collar_type', 'collarType'),
+)
+
+COLLAR_TYPES = ('FEX', 'FP')
+
+# Inputs that drive the effective-price simulation
+MARKET_INPUTS = ('SB0', 'RetB', 'StdB', 'T', 'avgper')
+
+# Disney/Fox defaults of index.html, for command-line tools
+DEFAULT_INPUTS = {
+    'NB0': 1490776763, 'SB0': 107.15, 'RetB': 0.0007431, 'StdB': 0.0117901, 'RP': 0.3,
+    'NT0': 1383004590, 'ST0': 43.89, 'DP': 0.0823, 'T': 183, 'avgper': 15,
+    'BaseER': 0.5, 'FexLB': 94.0, 'FexUB': 114.0, 'BaseP': 51.572626, 'LR': 0.4511, 'UR': 0.5514,
+}
+
+
+class InputError(ValueError):
+    pass
+
+
+def parse_inputs(data):
+    """Read the numeric deal inputs from a form-like mapping.
+
+    Returns a dict keyed by the model variable names used in the views
+    (``SB0``, ``RetB``, ...). Raises ``InputError`` naming the first missing
+    or malformed field.
+    """
+    inputs = {}
+    for name, field, cast in FIELDS:
+        value = data.get(field)
+        if value is None or value == '':
+            raise InputError("Missing field: %s" % field)
+        try:
+            inputs[name] = cast(value)
+        except (TypeError, ValueError):
+            raise InputError("Invalid value for %s: %r" % (field, value))
+    if inputs['T'] < 1:
+        raise InputError("daysBetween must be at least 1")
+    return inputs
+
+
+def parse_names(data):
+    names = {name: str(data.get(field, '')) for name, field in NAME_FIELDS}
+    if names['collar_type'] not in COLLAR_TYPES:
+        raise InputError("Unknown collar type: %s" % names['collar_type'])
+    return names
+
+
+def market_inputs(inputs):
+    return {name: inputs[name] for name in MARKET_INPUTS}
@@ -0,0 +1,136 @@
+"""Database-backed queue of dashboard valuations.
+
+A submission stores a ``ValuationJob`` row and returns at once. Worker
+processes (``manage.py run_jobs``) claim queued rows with a conditional
+``UPDATE``, which is atomic on both SQLite and Postgres, so no external broker
+is needed. While a job simulates, the worker records the paths done and
+running estimates of the collar metrics after every engine chunk
+(``engine.DEFAULT_CHUNK_SIZE`` paths), at most every ``PROGRESS_INTERVAL``
+seconds; with several simulation workers, after every block
+(``parallel.BLOCK_SIZE`` paths). A job served from the caches gets its
+estimates from the cached prices. Finished jobs keep their statistics and
+charts, so result links keep working without recomputing.
+"""
+import json
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .adaptive import RunningMoments, snapshot
+from .engine import DEFAULT_SIMULATIONS
+from .models import ValuationJob
+from .pipeline import ValuationPipeline
+from .valuation import COLLAR_PREFIXES
+from .variance import METRICS, metric_samples
+
+PROGRESS_INTERVAL = 1.0 # Seconds between progress writes
+POLL_INTERVAL = 1.0 # Seconds an idle worker waits between claims
+STALE_AFTER = timedelta(minutes=10) # Running jobs without progress for this long are requeued
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def submit_job(inputs, names, simulations=DEFAULT_SIMULATIONS, seed=None, engine='path'):
+    return ValuationJob.objects.create(
+        bidder_name=names['bidder_name'],
+        target_name=names['target_name'],
+        collar_type=names['collar_type'],
+        inputs=json.dumps(inputs),
+        simulations=simulations,
+        seed=None if seed in (None, '') else int(seed),
+        engine=engine,
+    )
+
+
+def claim_job(worker=None):
+    """Mark the oldest queued job as running and return it, or ``None``."""
+    while True:
+        pk = ValuationJob.objects.filter(status=ValuationJob.QUEUED).values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        claimed = ValuationJob.objects.filter(pk=pk, status=ValuationJob.QUEUED).update(
+            status=ValuationJob.RUNNING, worker=worker or worker_name(), updated=timezone.now())
+        if claimed:
+            return ValuationJob.objects.get(pk=pk)
+        # Another worker got it first
+
+
+def requeue_stale(after=STALE_AFTER):
+    """Requeue running jobs whose worker stopped reporting progress."""
+    return ValuationJob.objects.filter(status=ValuationJob.RUNNING, updated__lt=timezone.now() - after).update(
+        status=ValuationJob.QUEUED, paths_done=0, estimates='', worker='', updated=timezone.now())
+
+
+class JobProgress:
+    """Simulation progress callback that records a job's progress and estimates."""
+
+    def __init__(self, job, inputs):
+        self.job = job
+        self.inputs = inputs
+        prefix = COLLAR_PREFIXES[job.collar_type]
+        self.accumulators = {prefix + metric: RunningMoments() for metric in METRICS}
+        self.paths = 0 # Paths reported so far
+        self.saved = time.monotonic()
+
+    def __call__(self, paths, block):
+        self.paths = paths
+        samples, _ = metric_samples(block, self.inputs, self.job.collar_type)
+        prefix = COLLAR_PREFIXES[self.job.collar_type]
+        for metric in METRICS:
+            self.accumulators[prefix + metric].update(samples[metric])
+        if paths < self.job.simulations and time.monotonic() - self.saved < PROGRESS_INTERVAL:
+            return
+        ValuationJob.objects.filter(pk=self.job.pk).update(
+            paths_done=paths, estimates=json.dumps(snapshot(self.accumulators)), updated=timezone.now())
+        self.saved = time.monotonic()
+
+
+def run_job(job):
+    """Value a claimed job and store its statistics and charts."""
+    from .charts import dashboard_charts
+
+    try:
+        inputs = json.loads(job.inputs)
+        progress = JobProgress(job, inputs)
+        pipeline = ValuationPipeline(inputs, job.collar_type, job.simulations, job.seed, job.engine,
+                                     progress=progress)
+        script_grid, div_grid = pipeline.charts(dashboard_charts)
+        stats, _ = pipeline.value()
+        if not progress.paths: # Nothing was simulated: estimates from the cached prices
+            progress(job.simulations, pipeline.effective_prices())
+    except Exception as exc:
+        ValuationJob.objects.filter(pk=job.pk).update(
+            status=ValuationJob.FAILED, error=str(exc), finished=timezone.now(), updated=timezone.now())
+        raise
+
+    ValuationJob.objects.filter(pk=job.pk).update(
+        status=ValuationJob.DONE,
+        paths_done=job.simulations,
+        stats=json.dumps(stats, default=float),
+        script_grid=script_grid,
+        div_grid=div_grid,
+        finished=timezone.now(),
+        updated=timezone.now(),
+    )
+
+
+def job_status(job):
+    """JSON-ready status of a job, with the statistics once it is done."""
+    status = {
+        'id': str(job.pk),
+        'status': job.status,
+        'progress': job.progress,
+        'paths': job.paths_done,
+        'simulations': job.simulations,
+        'estimates': json.loads(job.estimates) if job.estimates else {},
+    }
+    if job.status == ValuationJob.DONE:
+        status['stats'] = json.loads(job.stats)
+    if job.status == ValuationJob.FAILED:
+        status['error'] = job.error
+    return status
@@ -0,0 +1,298 @@
+"""Load test of the dashboard endpoint under gunicorn.
+
+``run_config`` starts gunicorn on a free local port with one server
+configuration. A configuration is a worker class, a worker count, threads
+per worker, the number of simulations of each valuation and chart reduction.
+The last two are passed as ``SIMULATIONS`` and
+``CHART_REDUCTION`` in the server's environment. The server serves
+``collar_project.wsgi``, or ``collar_project.asgi`` for ASGI worker
+classes such as ``uvicorn.workers.UvicornWorker``.
+
+``concurrency`` client threads then POST a mix of dashboard forms for
+``duration`` seconds. The mix is the defaults of ``index.html`` plus a
+``random_fraction`` of randomized deals. Repeated default deals are served
+from the valuation caches, as they would be in production, and randomized
+ones are computed. Runs are not stored as ``ValuationRun`` rows
+(``RECORD_RUNS=0``) unless ``env`` says otherwise. While the load runs, the
+resident memory of every gunicorn worker, together with its simulation
+pool processes and any other descendants, is sampled from ``/proc``, which
+needs Linux.
+
+Each configuration gives one report row: throughput, p50/p95/p99 latency
+of the successful requests, mean response bytes and peak worker RSS.
+Rows of different configurations share their columns, so one CSV or JSON
+report compares them.
+"""
+import csv
+from http.cookies import SimpleCookie
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+import numpy as np
+
+from .inputs import DEFAULT_INPUTS, FIELDS
+
+DEFAULT_NAMES = {'bidderName': 'Disney', 'targetName': '20 Century Fox'}
+CONFIG_COLUMNS = ('worker_class', 'workers', 'threads', 'simulations', 'chart_reduction')
+REPORT_COLUMNS = CONFIG_COLUMNS + (
+    'concurrency', 'requests', 'errors', 'seconds', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms',
+    'mean_bytes', 'worker_rss_mb_max', 'worker_rss_mb_mean',
+)
+STARTUP_TIMEOUT = 120 # Seconds for gunicorn to answer its first request
+REQUEST_TIMEOUT = 300 # Seconds per dashboard request
+RSS_INTERVAL = 0.5 # Seconds between memory samples
+
+
+class LoadTestError(RuntimeError):
+    pass
+
+
+def random_inputs(rng):
+    """A plausible deal around the defaults: other prices, volatility, horizon and bounds."""
+    inputs = dict(DEFAULT_INPUTS)
+    inputs['SB0'] = round(inputs['SB0'] * rng.uniform(0.9, 1.1), 2)
+    inputs['StdB'] = inputs['StdB'] * rng.uniform(0.5, 1.5)
+    inputs['T'] = int(rng.integers(60, 251))
+    inputs['avgper'] = int(rng.integers(5, 21))
+    width = rng.uniform(0.05, 0.15) # Half-width of the collars
+    inputs['FexLB'] = round(inputs['SB0'] * (1 - width), 2)
+    inputs['FexUB'] = round(inputs['SB0'] * (1 + width), 2)
+    inputs['LR'] = inputs['BaseER'] * (1 - width)
+    inputs['UR'] = inputs['BaseER'] * (1 + width)
+    return inputs
+
+
+def form_mix(count, random_fraction=0.5, seed=0):
+    """``count`` urlencoded dashboard forms, alternating FEX and FP collars."""
+    rng = np.random.default_rng(seed)
+    forms = []
+    for i in range(count):
+        inputs = random_inputs(rng) if rng.random() < random_fraction else DEFAULT_INPUTS
+        form = {field: inputs[name] for name, field, _ in FIELDS}
+        form.update(DEFAULT_NAMES, collarType=('FEX', 'FP')[i % 2])
+        forms.append(urlencode(form).encode())
+    return forms
+
+
+def summarize(samples, seconds):
+    """Report columns of ``(latency, status, bytes)`` samples taken over ``seconds``."""
+    ok = [(latency, size) for latency, status, size in samples if status == 200]
+    latencies = np.array([latency for latency, _ in ok]) * 1000
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) if ok else (None, None, None)
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'seconds': seconds,
+        'throughput': len(ok) / seconds if seconds else None,
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'mean_bytes': float(np.mean([size for _, size in ok])) if ok else None,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _children():
+    # Parent -> child processes, from /proc/<pid>/stat (field 4 is the parent)
+    children = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open('/proc/%s/stat' % name) as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            children.setdefault(int(fields[1]), []).append(int(name))
+    return children
+
+
+def _descendants(pid, children):
+    found = []
+    stack = list(children.get(pid, ()))
+    while stack:
+        child = stack.pop()
+        found.append(child)
+        stack.extend(children.get(child, ()))
+    return found
+
+
+def _rss_kb(pid):
+    try:
+        with open('/proc/%d/status' % pid) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class _RssSampler(threading.Thread):
+    """Peak RSS of each gunicorn worker, its descendants included, while the load runs."""
+
+    def __init__(self, master):
+        super().__init__(daemon=True)
+        self.master = master
+        self.peaks = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        if not os.path.isdir('/proc'):
+            return
+        while not self.stopped.wait(RSS_INTERVAL):
+            children = _children()
+            for pid in children.get(self.master, ()):
+                rss = _rss_kb(pid) + sum(_rss_kb(child) for child in _descendants(pid, children))
+                self.peaks[pid] = max(self.peaks.get(pid, 0), rss)
+
+    def summary(self):
+        peaks = [kb / 1024 for kb in self.peaks.values() if kb]
+        return {
+            'worker_rss_mb_max': max(peaks) if peaks else None,
+            'worker_rss_mb_mean': sum(peaks) / len(peaks) if peaks else None,
+        }
+
+
+def _get(url, timeout=10):
+    with urlopen(url, timeout=timeout) as response:
+        response.read()
+        return response.headers
+
+
+def _csrf_headers(base_url):
+    # The dashboard form is CSRF-protected: reuse the token cookie of the index page
+    cookie = SimpleCookie()
+    for header in _get(base_url + '/').get_all('Set-Cookie') or []:
+        cookie.load(header)
+    token = cookie['csrftoken'].value if 'csrftoken' in cookie else ''
+    return {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Cookie': 'csrftoken=%s' % token,
+        'X-CSRFToken': token,
+    }
+
+
+def _post(url, body, headers):
+    started = time.perf_counter()
+    try:
+        with urlopen(Request(url, data=body, headers=headers), timeout=REQUEST_TIMEOUT) as response:
+            status, size = response.status, len(response.read())
+    except HTTPError as exc:
+        status, size = exc.code, len(exc.read())
+    except (URLError, OSError):
+        status, size = None, 0
+    return time.perf_counter() - started, status, size
+
+
+def _start_server(config, port, env):
+    asgi = 'uvicorn' in config['worker_class'].lower()
+    command = [
+        sys.executable, '-m', 'gunicorn', 'collar_project.asgi:application' if asgi else 'collar_project.wsgi',
+        '--bind', '127.0.0.1:%d' % port,
+        '--workers', str(config['workers']),
+        '--worker-class', config['worker_class'],
+        '--threads', str(config['threads']),
+        '--timeout', str(REQUEST_TIMEOUT),
+        '--log-level', 'warning',
+    ]
+    server_env = dict(os.environ)
+    server_env['SIMULATIONS'] = str(config['simulations'])
+    server_env['CHART_REDUCTION'] = '1' if config['chart_reduction'] else '0'
+    server_env['RECORD_RUNS'] = '0' # Keeps the load from filling the database
+    server_env.update(env)
+    log = tempfile.TemporaryFile()
+    server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=server_env, stdout=subprocess.DEVNULL, stderr=log)
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            log.seek(0)
+            raise LoadTestError("gunicorn exited: %s" % log.read().decode(errors='replace')[-2000:])
+        try:
+            _get('http://127.0.0.1:%d/' % port, timeout=2)
+            return server, log
+        except (URLError, OSError):
+            time.sleep(0.2)
+    server.terminate()
+    raise LoadTestError("gunicorn did not answer within %d s" % STARTUP_TIMEOUT)
+
+
+def run_config(config, forms, concurrency=4, duration=30.0, max_requests=None, warmup=2, env=None):
+    """Run the load against one server configuration; returns its report row."""
+    port = _free_port()
+    base_url = 'http://127.0.0.1:%d' % port
+    server, log = _start_server(config, port, env or {})
+    try:
+        headers = _csrf_headers(base_url)
+        url = base_url + '/dashboard'
+        for body in forms[:warmup]: # Imports Bokeh and fills caches outside the measurement
+            _post(url, body, headers)
+
+        samples = []
+        issued = itertools.count()
+        deadline = time.monotonic() + duration
+
+        def client():
+            while time.monotonic() < deadline:
+                i = next(issued)
+                if max_requests is not None and i >= max_requests:
+                    return
+                samples.append(_post(url, forms[i % len(forms)], headers))
+
+        sampler = _RssSampler(server.pid)
+        sampler.start()
+        started = time.perf_counter()
+        clients = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        seconds = time.perf_counter() - started
+        sampler.stopped.set()
+        sampler.join()
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+
+    row = {name: config[name] for name in CONFIG_COLUMNS}
+    row['concurrency'] = concurrency
+    row.update(summarize(samples, seconds))
+    row.update(sampler.summary())
+    return row
+
+
+def configurations(worker_classes, workers, threads, simulations, chart_reduction):
+    """Every combination of the server settings, as ``CONFIG_COLUMNS`` dicts."""
+    return [dict(zip(CONFIG_COLUMNS, values))
+            for values in itertools.product(worker_classes, workers, threads, simulations, chart_reduction)]
+
+
+def write_report(rows, path):
+    """Write the report rows as JSON when ``path`` ends in ``.json``, as CSV otherwise."""
+    with open(path, 'w', newline='') as f:
+        if path.endswith('.json'):
+            json.dump([{name: row.get(name) for name in REPORT_COLUMNS} for row in rows], f, indent=1, default=float)
+            return
+        writer = csv.DictWriter(f, REPORT_COLUMNS, restval='', extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,53 @@
+"""Time each stage of the valuation and flag regressions.
+
+    python manage.py benchmark --simulations 10000 100000 --days 60 183 --avgper 5 15
+
+Times every case of the matrix (see collar_app.benchmark), prints the
+timings, appends them to settings.BENCHMARK_HISTORY and fails when a stage
+is slower than its recorded baseline by more than the threshold. A run that
+regressed is not recorded, so it cannot drag the baseline along, unless
+--record is given (e.g. to accept a known slowdown).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from collar_app.benchmark import (AVGPER, DAYS, REPEAT, SIMULATIONS, STAGES, benchmark, history_entry,
+                                  load_history, regressions, save_history)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the valuation stages and compare them with the recorded history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simulations', type=int, nargs='+', default=SIMULATIONS)
+        parser.add_argument('--days', type=int, nargs='+', default=DAYS, help="daysBetween values")
+        parser.add_argument('--avgper', type=int, nargs='+', default=AVGPER)
+        parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+        parser.add_argument('--repeat', type=int, default=REPEAT)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--history', default=settings.BENCHMARK_HISTORY)
+        parser.add_argument('--threshold', type=float, default=settings.BENCHMARK_THRESHOLD,
+                            help="Relative slowdown that fails the run, e.g. 0.25")
+        record = parser.add_mutually_exclusive_group()
+        record.add_argument('--no-record', action='store_true', help="Compare without appending to the history")
+        record.add_argument('--record', action='store_true', help="Append to the history even if stages regressed")
+
+    def handle(self, *args, **options):
+        results = benchmark(options['simulations'], options['days'], options['avgper'], options['stages'],
+                            options['repeat'], options['seed'])
+        for case, timings in results.items():
+            self.stdout.write(case)
+            for stage, seconds in timings.items():
+                self.stdout.write("    %-10s %9.4f s" % (stage, seconds))
+
+        history = load_history(options['history'])
+        found = regressions(results, history, threshold=options['threshold'])
+        if not options['no_record'] and (options['record'] or not found):
+            history.append(history_entry(results))
+            save_history(options['history'], history)
+
+        for item in found:
+            self.stderr.write("%(case)s %(stage)s: %(seconds).4f s against %(baseline).4f s" % item
+                              + " (+%.0f%%)" % (100 * item['slowdown']))
+        if found:
+            raise CommandError("%d stage(s) regressed by more than %.0f%%" % (len(found), 100 * options['threshold']))
@@ -0,0 +1,40 @@
+"""Estimate bidderDailyReturn and bidderDailyStd from a price history.
+
+    python manage.py calibrate DIS dis_trades.csv.gz --since 2018-06-20 --until 2018-12-13 --estimator ewma
+
+Reads a CSV (optionally gzipped) or .npy history in chunks (see
+collar_app.calibration) and stores the result under the ticker and end
+date. Later runs for the same ticker, dates and estimator, including
+dashboard valuations, reuse it without reading the file.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from collar_app.calibration import DECAY, ESTIMATORS, WINDOW, CalibrationError, calibrate
+
+
+class Command(BaseCommand):
+    help = "Calibrate the bidder's daily return and volatility from its price history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('ticker')
+        parser.add_argument('history', nargs='?', help="CSV, CSV.gz or .npy price history")
+        parser.add_argument('--since', help="First day of the window, YYYY-MM-DD")
+        parser.add_argument('--until', help="Last day of the window, YYYY-MM-DD; today by default")
+        parser.add_argument('--estimator', choices=ESTIMATORS, default=ESTIMATORS[0])
+        parser.add_argument('--decay', type=float, default=DECAY, help="EWMA decay per day")
+        parser.add_argument('--window', type=int, default=WINDOW, help="Returns in the rolling window")
+        parser.add_argument('--refresh', action='store_true', help="Re-read the history even if stored")
+
+    def handle(self, *args, **options):
+        try:
+            calibration = calibrate(options['ticker'], options['history'], since=options['since'],
+                                    until=options['until'], estimator=options['estimator'],
+                                    decay=options['decay'], window=options['window'], refresh=options['refresh'])
+        except (CalibrationError, OSError) as exc:
+            raise CommandError(exc)
+
+        self.stdout.write("%s as of %s, %d daily returns (%s)" % (
+            calibration.ticker, calibration.as_of, calibration.observations, calibration.estimator))
+        self.stdout.write("bidderDailyReturn %.7f" % calibration.RetB)
+        self.stdout.write("bidderDailyStd    %.7f" % calibration.StdB)
+        self.stdout.write("last close        %.2f" % calibration.last_close)
@@ -0,0 +1,40 @@
+"""Report the size and render time of the dashboard charts.
+
+    python manage.py chart_payload --simulations 100000 --collar-type FEX
+
+Renders the chart grid for the default deal with and without chart reduction
+and prints the embedded script size and render time of each.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from collar_app.engine import DEFAULT_SIMULATIONS
+from collar_app.inputs import COLLAR_TYPES, DEFAULT_INPUTS
+from collar_app.pipeline import ValuationPipeline
+from collar_app.charts import dashboard_charts
+
+
+class Command(BaseCommand):
+    help = "Compare the dashboard chart payload with and without reduction"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simulations', type=int, default=DEFAULT_SIMULATIONS)
+        parser.add_argument('--collar-type', choices=COLLAR_TYPES, default='FEX')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--engine', default='path')
+
+    def handle(self, *args, **options):
+        pipeline = ValuationPipeline(DEFAULT_INPUTS, options['collar_type'], options['simulations'],
+                                     options['seed'], options['engine'])
+        pipeline.value() # Simulate once, outside the timings
+
+        sizes = {}
+        for reduce in (False, True):
+            started = time.perf_counter()
+            script_grid, div_grid = dashboard_charts(pipeline, reduce=reduce)
+            elapsed = time.perf_counter() - started
+            sizes[reduce] = len(script_grid) + len(div_grid)
+            self.stdout.write("%-8s %12d bytes %8.3f s" % ('reduced' if reduce else 'full', sizes[reduce], elapsed))
+
+        self.stdout.write("Payload ratio: %.1fx" % (sizes[False] / sizes[True]))
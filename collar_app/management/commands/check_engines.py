@@ -0,0 +1,34 @@
+"""Check that the faster engines reproduce the reference estimates.
+
+    python manage.py check_engines --simulations 200000 --seed 1
+
+Values the default deal with the path engine on one worker in float64 and
+with each faster variant (see collar_app.benchmark.check_engines), and fails
+when an estimate is further from the reference than Monte Carlo error allows.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from collar_app.benchmark import CHECK_Z, ENGINES, check_engines
+
+
+class Command(BaseCommand):
+    help = "Compare the estimates of the faster engines with the reference engine"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simulations', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--engines', nargs='+', choices=ENGINES, default=ENGINES)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--z', type=float, default=CHECK_Z, help="Tolerance in standard errors")
+
+    def handle(self, *args, **options):
+        rows = check_engines(simulations=options['simulations'], seed=options['seed'], engines=options['engines'],
+                             workers=options['workers'], z=options['z'])
+        for row in rows:
+            self.stdout.write("%-8s %-10s %12.6f %12.6f %10.6f %s" % (
+                row['engine'], row['metric'], row['value'], row['reference'], row['stderr'],
+                'ok' if row['ok'] else 'MISMATCH'))
+
+        failed = [row for row in rows if not row['ok']]
+        if failed:
+            raise CommandError("%d estimate(s) outside %.1f standard errors" % (len(failed), options['z']))
@@ -0,0 +1,72 @@
+"""Load-test the dashboard under gunicorn, one server configuration at a time.
+
+    python manage.py loadtest --worker-class sync gthread --workers 1 2 4 --threads 1 4 \
+        --simulations 20000 100000 --concurrency 8 --duration 60 --output loadtest.csv
+
+Every combination of worker class, workers, threads, simulations and chart
+reduction gets a fresh gunicorn (see collar_app.loadtest) and one row of
+the report: throughput, p50/p95/p99 latency, response bytes and peak RSS
+per worker, its simulation pool included. Runs are not recorded unless
+--env RECORD_RUNS=1 is given.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from collar_app.loadtest import LoadTestError, configurations, form_mix, run_config, write_report
+
+REDUCTION = {'on': True, 'off': False}
+
+
+class Command(BaseCommand):
+    help = "Measure dashboard throughput and latency under gunicorn for several server configurations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-class', nargs='+', default=['sync'],
+                            help="gunicorn worker classes; uvicorn ones serve collar_project.asgi")
+        parser.add_argument('--workers', type=int, nargs='+', default=[2])
+        parser.add_argument('--threads', type=int, nargs='+', default=[1])
+        parser.add_argument('--simulations', type=int, nargs='+', default=[settings.SIMULATIONS])
+        parser.add_argument('--chart-reduction', nargs='+', choices=REDUCTION, default=['on'])
+        parser.add_argument('--concurrency', type=int, default=4, help="Client threads")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds of load per configuration")
+        parser.add_argument('--max-requests', type=int, help="Stop a configuration after this many requests")
+        parser.add_argument('--random-fraction', type=float, default=0.5,
+                            help="Share of randomized deals in the mix; the rest are the form defaults")
+        parser.add_argument('--mix-size', type=int, default=200, help="Distinct forms replayed in a cycle")
+        parser.add_argument('--warmup', type=int, default=2, help="Requests sent before measuring")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                            help="Extra environment of the server, e.g. RECORD_RUNS=1")
+        parser.add_argument('--output', default='loadtest.csv', help="Report file, .csv or .json")
+
+    def handle(self, *args, **options):
+        try:
+            env = dict(item.split('=', 1) for item in options['env'])
+        except ValueError:
+            raise CommandError("--env takes KEY=VALUE")
+        forms = form_mix(options['mix_size'], options['random_fraction'], options['seed'])
+        configs = configurations(options['worker_class'], options['workers'], options['threads'],
+                                 options['simulations'], [REDUCTION[value] for value in options['chart_reduction']])
+
+        rows = []
+        for config in configs:
+            self.stderr.write("%(worker_class)s x %(workers)d, %(threads)d thread(s), %(simulations)d simulations, "
+                              "reduction %(chart_reduction)s" % config)
+            try:
+                row = run_config(config, forms, options['concurrency'], options['duration'],
+                                 options['max_requests'], options['warmup'], env)
+            except LoadTestError as exc:
+                raise CommandError(exc)
+            rows.append(row)
+            self.stdout.write("    %d requests, %d errors, %.2f req/s, p50 %s ms, p95 %s ms, p99 %s ms, "
+                              "%s bytes, worker RSS up to %s MB" % (
+                                  row['requests'], row['errors'], row['throughput'] or 0,
+                                  _number(row['p50_ms']), _number(row['p95_ms']), _number(row['p99_ms']),
+                                  _number(row['mean_bytes']), _number(row['worker_rss_mb_max'])))
+            write_report(rows, options['output']) # Rewritten after each configuration, so partial runs keep results
+
+        self.stderr.write("Report of %d configuration(s) in %s" % (len(rows), options['output']))
+
+
+def _number(value):
+    return '-' if value is None else '%.0f' % value
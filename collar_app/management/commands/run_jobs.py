@@ -0,0 +1,44 @@
+"""Background worker for queued valuations.
+
+    python manage.py run_jobs
+
+Claims queued jobs from the database one at a time and values them. Run as
+many workers as there are cores to spare; they coordinate through the
+database only.
+"""
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+
+from collar_app.jobs import POLL_INTERVAL, claim_job, requeue_stale, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = "Run queued valuation jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+        parser.add_argument('--poll', type=float, default=POLL_INTERVAL, help="Seconds between polls when idle")
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        requeued = requeue_stale()
+        if requeued:
+            self.stderr.write("Requeued %d stale jobs" % requeued)
+
+        while True:
+            job = claim_job(worker)
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll'])
+                continue
+
+            self.stdout.write("Running job %s" % job.pk)
+            try:
+                run_job(job)
+            except Exception:
+                self.stderr.write("Job %s failed:\n%s" % (job.pk, traceback.format_exc()))
+            else:
+                self.stdout.write("Finished job %s" % job.pk)
@@ -0,0 +1,49 @@
+"""Value every deal of a CSV or JSONL file.
+
+    python manage.py value_deals deals.csv --output valuations.csv --seed 1
+
+Deals use the form fields of index.html. Results are written row by row, in
+the format of the output file's extension (CSV by default).
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from collar_app.batch import FORMATS, detect_format, read_deals, value_deals, write_results
+from collar_app.engine import DEFAULT_SIMULATIONS
+
+
+class Command(BaseCommand):
+    help = "Value a file of deals and stream the statistics to a file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="CSV or JSONL file of deals, - for standard input")
+        parser.add_argument('--output', default='-', help="Output file, - for standard output")
+        parser.add_argument('--format', choices=FORMATS, help="Input format, from the extension by default")
+        parser.add_argument('--output-format', choices=FORMATS, help="Output format, from the extension by default")
+        parser.add_argument('--simulations', type=int, default=DEFAULT_SIMULATIONS)
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--engine', default='path')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['input'])
+        output = options['output_format'] or detect_format(options['output'], fmt)
+
+        source = sys.stdin if options['input'] == '-' else open(options['input'], newline='')
+        target = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        count = 0
+        try:
+            results = value_deals(read_deals(source, fmt), options['simulations'], options['seed'], options['engine'])
+            for line in write_results(results, output):
+                target.write(line)
+                count += 1
+        except ValueError as exc:
+            raise CommandError(exc)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if target is not sys.stdout:
+                target.close()
+
+        if target is not sys.stdout:
+            self.stderr.write("Valued %d deals into %s" % (count - (output == 'csv'), options['output']))
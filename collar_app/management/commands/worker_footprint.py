@@ -0,0 +1,49 @@
+"""Measure the cold start of an API-only and of a chart-rendering worker.
+
+    python manage.py worker_footprint --repeat 3
+
+Each measurement runs in a fresh interpreter that sets Django up, imports the
+URL configuration (and so the views) and, for the chart worker, the Bokeh
+charts module. Prints the import time and the peak resident set size.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+PROBE = """
+import json, resource, time
+started = time.perf_counter()
+import django
+django.setup()
+import collar_app.urls
+if %r:
+    import collar_app.charts
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+WORKERS = (('api', False), ('charts', True))
+
+
+class Command(BaseCommand):
+    help = "Compare the start-up time and memory of API-only and chart workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                     'collar_project.settings'))
+        for name, charts in WORKERS:
+            runs = []
+            for _ in range(options['repeat']):
+                output = subprocess.check_output([sys.executable, '-c', PROBE % charts], env=env,
+                                                 cwd=settings.BASE_DIR)
+                runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+            seconds = min(run['seconds'] for run in runs)
+            rss = max(run['rss_kb'] for run in runs)
+            self.stdout.write("%-7s start %6.3f s   peak RSS %8.1f MB" % (name, seconds, rss / 1024))
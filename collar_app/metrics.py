@@ -0,0 +1,222 @@
+"""Per-request stage timings and process-wide Prometheus metrics.
+
+While ``ServerTimingMiddleware`` handles a request it keeps a ``Timings``
+record in a thread-local. Hot-path code wraps its stages in
+``stage_timer(name)``, which adds the seconds spent and the growth of the
+process's peak resident memory to that record. Outside a request, or with
+``settings.INSTRUMENTATION`` off, ``stage_timer`` returns a shared no-op
+context manager, so the cost is one attribute lookup.
+
+The middleware turns the record into a ``Server-Timing`` header and a JSON
+log line on the ``collar_app.timing`` logger, and adds it to histograms of
+request and stage latency by view and engine mode. Simulations add to
+per-engine counters of paths and seconds, whose ratio is the path
+throughput. ``prometheus_text`` renders everything for ``/metrics``. The
+metrics live in the process: each gunicorn worker reports its own, and
+Prometheus sums them by instance.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # Not on Windows; memory counters then stay at 0
+    resource = None
+
+from django.conf import settings
+
+from .engine import METHODS
+
+logger = logging.getLogger('collar_app.timing')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0) # Seconds
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024 # ru_maxrss is in bytes on macOS, KiB elsewhere
+
+HISTOGRAMS = {
+    'collar_request_seconds': "Request latency by view and engine mode",
+    'collar_stage_seconds': "Latency of each valuation stage by engine mode",
+}
+COUNTERS = {
+    'collar_simulated_paths_total': "Simulated paths by engine mode",
+    'collar_simulation_seconds_total': "Seconds spent simulating by engine mode",
+}
+THROUGHPUT = 'collar_paths_per_second'
+
+_local = threading.local()
+_lock = threading.Lock()
+_histograms = {name: {} for name in HISTOGRAMS} # Labels -> [count per bucket..., sum, count]
+_counters = {name: {} for name in COUNTERS} # Labels -> value
+
+
+def _peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT if resource else 0
+
+
+class Timings:
+    """Stages of one request, in the order they first ran, and its labels."""
+
+    def __init__(self):
+        self.stages = {} # Name -> [seconds, peak memory growth in bytes]
+        self.labels = {'engine': 'none', 'dtype': 'none'}
+
+    def add(self, name, seconds, rss):
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += rss
+
+
+class _StageTimer:
+    __slots__ = ('timings', 'name', 'started', 'rss')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.rss = _peak_rss()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.name, time.perf_counter() - self.started, _peak_rss() - self.rss)
+        return False
+
+
+class _NoTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_TIMER = _NoTimer()
+
+
+def stage_timer(name):
+    """Context manager timing ``name`` in the current request, if any."""
+    timings = getattr(_local, 'timings', None)
+    return NO_TIMER if timings is None else _StageTimer(timings, name)
+
+
+def _engine_labels(engine, float32):
+    # Engines come from request data: anything unknown shares one label instead of adding series
+    return {'engine': engine if engine in METHODS else 'invalid', 'dtype': 'float32' if float32 else 'float64'}
+
+
+def set_labels(engine, float32):
+    """Engine mode of the current request, for its metrics."""
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.labels = _engine_labels(engine, float32)
+
+
+def start_request():
+    _local.timings = Timings()
+    return _local.timings
+
+
+def finish_request():
+    _local.timings = None
+
+
+def _observe(name, labels, seconds):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        row = _histograms[name].get(key)
+        if row is None:
+            row = _histograms[name][key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                row[i] += 1
+                break
+        row[-2] += seconds
+        row[-1] += 1
+
+
+def _increment(name, labels, value):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        _counters[name][key] = _counters[name].get(key, 0) + value
+
+
+def observe_paths(engine, float32, paths, seconds):
+    """Count a simulation of ``paths`` paths that took ``seconds``."""
+    if not settings.INSTRUMENTATION:
+        return
+    labels = _engine_labels(engine, float32)
+    _increment('collar_simulated_paths_total', labels, paths)
+    _increment('collar_simulation_seconds_total', labels, seconds)
+
+
+def server_timing(timings, total):
+    """``Server-Timing`` value: each stage in milliseconds, then the total."""
+    metrics = ['%s;dur=%.1f' % (name, 1000 * seconds) for name, (seconds, _) in timings.stages.items()]
+    metrics.append('total;dur=%.1f' % (1000 * total))
+    return ', '.join(metrics)
+
+
+def record_request(view, method, status, timings, total):
+    """Add a finished request to the histograms and write its log line."""
+    labels = timings.labels
+    _observe('collar_request_seconds', dict(labels, view=view), total)
+    for name, (seconds, _) in timings.stages.items():
+        _observe('collar_stage_seconds', dict(labels, stage=name), seconds)
+    logger.info(json.dumps({
+        'view': view,
+        'method': method,
+        'status': status,
+        'engine': labels['engine'],
+        'dtype': labels['dtype'],
+        'total_ms': round(1000 * total, 1),
+        'stages': {name: {'ms': round(1000 * seconds, 1), 'rss_growth_kb': rss // 1024}
+                   for name, (seconds, rss) in timings.stages.items()},
+    }))
+
+
+def _escape(value):
+    # Label values escape backslashes, double quotes and line feeds
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, **extra):
+    labels = list(key) + sorted(extra.items())
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in labels)
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {name: {key: list(row) for key, row in rows.items()} for name, rows in _histograms.items()}
+        counters = {name: dict(rows) for name, rows in _counters.items()}
+
+    lines = []
+    for name, help_text in HISTOGRAMS.items():
+        lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s histogram' % name]
+        for key, row in sorted(histograms[name].items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, row):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (name, _format_labels(key, le=repr(bound)), cumulative))
+            lines.append('%s_bucket%s %d' % (name, _format_labels(key, le='+Inf'), row[-1]))
+            lines.append('%s_sum%s %r' % (name, _format_labels(key), row[-2]))
+            lines.append('%s_count%s %d' % (name, _format_labels(key), row[-1]))
+
+    for name, help_text in COUNTERS.items():
+        lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s counter' % name]
+        for key, value in sorted(counters[name].items()):
+            lines.append('%s%s %r' % (name, _format_labels(key), value))
+
+    lines += ['# HELP %s Simulated paths per second of simulation by engine mode' % THROUGHPUT,
+              '# TYPE %s gauge' % THROUGHPUT]
+    seconds = counters['collar_simulation_seconds_total']
+    for key, paths in sorted(counters['collar_simulated_paths_total'].items()):
+        if seconds.get(key):
+            lines.append('%s%s %r' % (THROUGHPUT, _format_labels(key), paths / seconds[key]))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+
+from .metrics import finish_request, record_request, server_timing, start_request
+
+
+class ServerTimingMiddleware:
+    """Times each request's stages (see ``collar_app.metrics``).
+
+    Adds a ``Server-Timing`` header, logs the stages and updates the
+    ``/metrics`` histograms. Does nothing with ``settings.INSTRUMENTATION``
+    off. For streamed responses only the time to the first byte is covered.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.INSTRUMENTATION:
+            return self.get_response(request)
+
+        timings = start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request()
+        total = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        response['Server-Timing'] = server_timing(timings, total)
+        record_request(view, request.method, response.status_code, timings, total)
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 3.0.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValuationJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=8)),
+                ('bidder_name', models.CharField(blank=True, max_length=200)),
+                ('target_name', models.CharField(blank=True, max_length=200)),
+                ('collar_type', models.CharField(max_length=3)),
+                ('inputs', models.TextField()),
+                ('simulations', models.PositiveIntegerField()),
+                ('seed', models.BigIntegerField(blank=True, null=True)),
+                ('engine', models.CharField(default='path', max_length=8)),
+                ('paths_done', models.PositiveIntegerField(default=0)),
+                ('estimates', models.TextField(blank=True)),
+                ('stats', models.TextField(blank=True)),
+                ('script_grid', models.TextField(blank=True)),
+                ('div_grid', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+    ]
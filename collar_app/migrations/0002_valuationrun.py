@@ -0,0 +1,65 @@
+# Generated by Django 3.0.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collar_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValuationRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('bidder_name', models.CharField(max_length=200)),
+                ('target_name', models.CharField(max_length=200)),
+                ('collar_type', models.CharField(max_length=3)),
+                ('NB0', models.BigIntegerField()),
+                ('SB0', models.FloatField()),
+                ('RetB', models.FloatField()),
+                ('StdB', models.FloatField()),
+                ('RP', models.FloatField()),
+                ('NT0', models.BigIntegerField()),
+                ('ST0', models.FloatField()),
+                ('DP', models.FloatField()),
+                ('T', models.IntegerField()),
+                ('avgper', models.IntegerField()),
+                ('BaseER', models.FloatField()),
+                ('FexLB', models.FloatField()),
+                ('FexUB', models.FloatField()),
+                ('BaseP', models.FloatField()),
+                ('LR', models.FloatField()),
+                ('UR', models.FloatField()),
+                ('simulations', models.PositiveIntegerField()),
+                ('seed', models.BigIntegerField(blank=True, null=True)),
+                ('engine', models.CharField(max_length=8)),
+                ('simulate_seconds', models.FloatField(default=0.0)),
+                ('total_seconds', models.FloatField(default=0.0)),
+                ('SBTeff_mean', models.FloatField()),
+                ('SBTeff_std', models.FloatField()),
+                ('NocPTTmean', models.FloatField()),
+                ('CVTT', models.FloatField()),
+                ('WVTT', models.FloatField()),
+                ('WVBT', models.FloatField()),
+                ('NetWV', models.FloatField()),
+                ('Psuc', models.FloatField()),
+                ('stats', models.TextField()),
+                ('distribution', models.BinaryField()),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='valuationrun',
+            index=models.Index(fields=['bidder_name', '-created'], name='run_bidder_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='valuationrun',
+            index=models.Index(fields=['target_name', '-created'], name='run_target_created_idx'),
+        ),
+    ]
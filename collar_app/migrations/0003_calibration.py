@@ -0,0 +1,39 @@
+# Generated by Django 3.0.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collar_app', '0002_valuationrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Calibration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('ticker', models.CharField(max_length=32)),
+                ('until', models.DateField()),
+                ('since', models.DateField(blank=True, null=True)),
+                ('estimator', models.CharField(choices=[('sample', 'Sample'), ('ewma', 'EWMA'), ('rolling', 'Rolling window')], default='sample', max_length=8)),
+                ('decay', models.FloatField(default=0.0)),
+                ('window', models.PositiveIntegerField(default=0)),
+                ('as_of', models.DateField()),
+                ('observations', models.PositiveIntegerField()),
+                ('RetB', models.FloatField()),
+                ('StdB', models.FloatField()),
+                ('last_close', models.FloatField()),
+                ('source', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='calibration',
+            index=models.Index(fields=['ticker', 'until'], name='calibration_ticker_until_idx'),
+        ),
+    ]
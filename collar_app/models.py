@@ -1,3 +1,141 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class ValuationJob(models.Model):
+    """A dashboard valuation queued for a background worker (see jobs.py)."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=8, choices=STATUSES, default=QUEUED, db_index=True)
+    bidder_name = models.CharField(max_length=200, blank=True)
+    target_name = models.CharField(max_length=200, blank=True)
+    collar_type = models.CharField(max_length=3)
+    inputs = models.TextField() # JSON of the parsed deal inputs
+    simulations = models.PositiveIntegerField()
+    seed = models.BigIntegerField(null=True, blank=True)
+    engine = models.CharField(max_length=8, default='path')
+    paths_done = models.PositiveIntegerField(default=0)
+    estimates = models.TextField(blank=True) # JSON of the running estimates
+    stats = models.TextField(blank=True) # JSON of the final statistics
+    script_grid = models.TextField(blank=True)
+    div_grid = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created']
+
+    @property
+    def progress(self):
+        """Percent of the paths simulated."""
+        return 100.0 * self.paths_done / self.simulations if self.simulations else 0.0
+
+
+class ValuationRun(models.Model):
+    """A finished dashboard valuation, kept for audit and comparison (see runs.py).
+
+    Deal inputs and headline statistics are plain columns, so runs can be
+    filtered and sorted in SQL. The effective-price distribution is stored as
+    a compressed float32 array, enough to re-render the charts without
+    re-simulating.
+    """
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    bidder_name = models.CharField(max_length=200)
+    target_name = models.CharField(max_length=200)
+    collar_type = models.CharField(max_length=3)
+
+    # Inputs, named as in the views
+    NB0 = models.BigIntegerField()
+    SB0 = models.FloatField()
+    RetB = models.FloatField()
+    StdB = models.FloatField()
+    RP = models.FloatField()
+    NT0 = models.BigIntegerField()
+    ST0 = models.FloatField()
+    DP = models.FloatField()
+    T = models.IntegerField()
+    avgper = models.IntegerField()
+    BaseER = models.FloatField()
+    FexLB = models.FloatField()
+    FexUB = models.FloatField()
+    BaseP = models.FloatField()
+    LR = models.FloatField()
+    UR = models.FloatField()
+
+    simulations = models.PositiveIntegerField()
+    seed = models.BigIntegerField(null=True, blank=True)
+    engine = models.CharField(max_length=8)
+
+    # Timings, in seconds
+    simulate_seconds = models.FloatField(default=0.0)
+    total_seconds = models.FloatField(default=0.0)
+
+    # Headline statistics of the run's collar type
+    SBTeff_mean = models.FloatField()
+    SBTeff_std = models.FloatField()
+    NocPTTmean = models.FloatField()
+    CVTT = models.FloatField()
+    WVTT = models.FloatField()
+    WVBT = models.FloatField()
+    NetWV = models.FloatField()
+    Psuc = models.FloatField()
+
+    stats = models.TextField() # JSON of every statistic
+    distribution = models.BinaryField() # np.savez_compressed of the sorted effective prices, float32
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['bidder_name', '-created'], name='run_bidder_created_idx'),
+            models.Index(fields=['target_name', '-created'], name='run_target_created_idx'),
+        ]
+
+
+class Calibration(models.Model):
+    """Bidder return parameters estimated from a price history (see calibration.py)."""
+
+    SAMPLE = 'sample'
+    EWMA = 'ewma'
+    ROLLING = 'rolling'
+    ESTIMATORS = (
+        (SAMPLE, 'Sample'),
+        (EWMA, 'EWMA'),
+        (ROLLING, 'Rolling window'),
+    )
+
+    created = models.DateTimeField(auto_now_add=True)
+    ticker = models.CharField(max_length=32)
+    until = models.DateField() # Requested end of the window
+    since = models.DateField(null=True, blank=True) # Requested start, None for the whole history
+    estimator = models.CharField(max_length=8, choices=ESTIMATORS, default=SAMPLE)
+    decay = models.FloatField(default=0.0) # EWMA decay, 0 for the other estimators
+    window = models.PositiveIntegerField(default=0) # Days of the rolling window, 0 for the others
+
+    as_of = models.DateField() # Last day of the history used
+    observations = models.PositiveIntegerField() # Daily returns used
+    RetB = models.FloatField()
+    StdB = models.FloatField()
+    last_close = models.FloatField()
+    source = models.CharField(max_length=255, blank=True) # File the history was read from
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['ticker', 'until'], name='calibration_ticker_until_idx'),
+        ]
@@ -0,0 +1,102 @@
+"""Multi-core effective-price simulation with reproducible streams.
+
+The simulation is cut into blocks of a fixed size, and block ``i`` always
+draws from the ``i``-th child of ``SeedSequence(seed).spawn(...)``. Since
+neither the block layout nor the streams depend on how many processes run the
+blocks, a given seed yields bit-identical results for any worker count.
+
+Workers write their blocks straight into a memory-mapped output file (placed
+in ``/dev/shm`` where available), so results come back through shared memory
+instead of being pickled. ``numpy.memmap`` is used rather than
+``multiprocessing.shared_memory`` because the app still runs on Python 3.6.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from .engine import DEFAULT_CHUNK_SIZE, simulate_effective_prices
+
+BLOCK_SIZE = 50000 # Simulations per independent stream
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+_pool = None # One long-lived pool per process
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _executor(workers):
+    # The pool only grows: a larger worker count replaces it, smaller ones share it
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or workers > _pool_size:
+            if _pool is not None:
+                _pool.shutdown(wait=False) # Blocks already submitted still finish
+            _pool, _pool_size = ProcessPoolExecutor(max_workers=workers), workers
+        return _pool
+
+
+def _run_block(task):
+    path, simulations, lo, n, seed_seq, market, method, chunk_size, sample_paths, scheme = task
+    out = np.memmap(path, dtype=np.float64, mode='r+', shape=(simulations,))
+    rng = np.random.default_rng(seed_seq)
+    result = simulate_effective_prices(*market, n, rng=rng, chunk_size=chunk_size,
+                                       method=method, sample_paths=sample_paths, scheme=scheme)
+    paths = None
+    if sample_paths:
+        result, paths = result
+    out[lo:lo + n] = result
+    out.flush()
+    del out
+    return paths
+
+
+def simulate_parallel(SB0, RetB, StdB, T, avgper, simulations, seed=None, workers=1,
+                      method='path', block_size=BLOCK_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+                      sample_paths=0, progress=None, scheme='plain'):
+    """Effective prices from independent seed-spawned streams.
+
+    ``workers=1`` runs the blocks in this process; the output is the same as
+    with any other worker count. ``sample_paths=k`` also returns the first
+    ``k`` simulated paths, as ``simulate_effective_prices`` does.
+    ``progress(paths_done, prices)`` is called in order with the effective
+    prices of each engine chunk when the blocks run in this process, and of
+    each block with several workers. Each block draws under the
+    variance-reduction ``scheme`` on its own.
+    """
+    market = (SB0, RetB, StdB, T, avgper)
+    n_blocks = max(1, -(-simulations // block_size))
+    streams = np.random.SeedSequence(seed).spawn(n_blocks)
+    blocks = [(i * block_size, min(block_size, simulations - i * block_size), stream)
+              for i, stream in enumerate(streams)]
+
+    if workers <= 1 or n_blocks == 1:
+        SBTeff_array = np.empty(simulations)
+        paths = None
+        for lo, n, stream in blocks:
+            rng = np.random.default_rng(stream)
+            keep = sample_paths if lo == 0 else 0 # Paths come from the first block
+            chunk_progress = None if progress is None else (lambda done, chunk, lo=lo: progress(lo + done, chunk))
+            result = simulate_effective_prices(*market, n, rng=rng, chunk_size=chunk_size, method=method,
+                                               sample_paths=keep, scheme=scheme, progress=chunk_progress)
+            if keep:
+                result, paths = result
+            SBTeff_array[lo:lo + n] = result
+        return (SBTeff_array, paths) if sample_paths else SBTeff_array
+
+    with tempfile.NamedTemporaryFile(dir=SHM_DIR, prefix='collar-', suffix='.f8') as handle:
+        out = np.memmap(handle.name, dtype=np.float64, mode='w+', shape=(simulations,))
+        tasks = [(handle.name, simulations, lo, n, stream, market, method, chunk_size,
+                  sample_paths if lo == 0 else 0, scheme) for lo, n, stream in blocks]
+        paths = None
+        for (lo, n, _), block_paths in zip(blocks, _executor(workers).map(_run_block, tasks)):
+            if lo == 0:
+                paths = block_paths
+            if progress is not None:
+                progress(lo + n, np.array(out[lo:lo + n]))
+        SBTeff_array = np.array(out)
+        del out
+
+    return (SBTeff_array, paths) if sample_paths else SBTeff_array
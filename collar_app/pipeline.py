@@ -0,0 +1,200 @@
+"""Staged valuation pipeline with per-stage memoization.
+
+Only the market inputs (``SB0``, ``RetB``, ``StdB``, ``T``, ``avgper``) drive
+the expensive simulation; the deal terms only drive array math on its result.
+The pipeline therefore runs as explicit stages
+
+    simulate -> no collar -> collar payoff -> walkaway -> charts
+
+and memoizes each stage in the ``settings.PIPELINE_CACHE`` Django cache under
+a hash of the inputs that stage actually depends on. Resubmitting a deal with
+different collar bounds reuses the stored effective-price array and goes
+straight to the payoff math.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+import numpy as np
+
+from .cache import cache_get, cache_set, valuation_key
+from .engine import DEFAULT_SIMULATIONS
+from .inputs import COLLAR_TYPES, MARKET_INPUTS
+from .metrics import observe_paths, set_labels, stage_timer
+from .parallel import simulate_parallel
+from .valuation import COLLAR_PREFIXES, collar_payoff, no_collar, walkaway
+
+# Deal inputs each stage depends on, on top of the market inputs
+NO_COLLAR_INPUTS = MARKET_INPUTS + ('BaseER',)
+PAYOFF_INPUTS = {
+    'FEX': NO_COLLAR_INPUTS + ('NB0', 'NT0', 'ST0', 'FexLB', 'FexUB'),
+    'FP': NO_COLLAR_INPUTS + ('NB0', 'NT0', 'ST0', 'BaseP', 'LR', 'UR'),
+}
+WALKAWAY_INPUTS = ('DP', 'RP')
+SAMPLE_PATHS = 11 # Simulated paths kept for chart 1
+
+
+class ValuationPipeline:
+
+    def __init__(self, inputs, collar_type, simulations=DEFAULT_SIMULATIONS, seed=None, engine='path',
+                 workers=None, progress=None, float32=None, scheme='plain'):
+        self.inputs = inputs
+        self.collar_type = collar_type
+        self.simulations = simulations
+        self.seed = None if seed in (None, '') else int(seed)
+        self.engine = engine
+        # Results do not depend on the worker count, so it stays out of the keys
+        self.workers = settings.SIMULATION_WORKERS if workers is None else workers
+        self.progress = progress # Called as chunks are simulated, see parallel.simulate_parallel
+        # Keep the effective prices, and so every payoff array, in float32
+        self.float32 = settings.VALUATION_FLOAT32 if float32 is None else float32
+        self.scheme = scheme # Variance-reduction scheme of the simulation, see engine.SCHEMES
+        self.reused = [] # Stages served from the cache, for diagnostics
+        self._results = {} # Stage results of this request, by key
+        self.timings = {} # Seconds spent computing each stage
+        self.shared = True # Whether stages go through the pipeline cache
+        set_labels(self.engine, self.float32) # Engine mode of the request's metrics
+
+    def _key(self, stage, names):
+        payload = {
+            'stage': stage,
+            'inputs': {name: self.inputs[name] for name in names},
+            'collar_type': self.collar_type if stage in ('payoff', 'walkaway') else None,
+            'simulations': self.simulations,
+            'seed': self.seed,
+            'engine': self.engine,
+            'float32': self.float32,
+            'scheme': self.scheme,
+        }
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        return 'pipeline:' + hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _stage(self, stage, names, compute):
+        key = self._key(stage, names)
+        if key in self._results:
+            return self._results[key]
+        cache = caches[settings.PIPELINE_CACHE]
+        value = cache.get(key) if self.shared else None
+        if value is None:
+            started = time.perf_counter()
+            with stage_timer(stage):
+                value = compute()
+            self.timings[stage] = time.perf_counter() - started
+            if self.shared:
+                cache.set(key, value)
+        else:
+            self.reused.append(stage)
+        self._results[key] = value
+        return value
+
+    @classmethod
+    def from_prices(cls, inputs, collar_type, SBTeff_array, seed=None, engine='path'):
+        """A pipeline over stored effective prices, which are never re-simulated."""
+        pipeline = cls(inputs, collar_type, len(SBTeff_array), seed, engine)
+        pipeline.shared = False # Stored prices may differ from a fresh run with the same key
+        key = pipeline._key('simulate', MARKET_INPUTS)
+        pipeline._results[key] = (np.sort(SBTeff_array), None)
+        return pipeline
+
+    def _simulate(self):
+        def compute():
+            market = [self.inputs[name] for name in MARKET_INPUTS]
+            started = time.perf_counter()
+            SBTeff_array, paths = simulate_parallel(*market, self.simulations, seed=self.seed,
+                                                    workers=self.workers, method=self.engine,
+                                                    sample_paths=SAMPLE_PATHS, progress=self.progress,
+                                                    scheme=self.scheme)
+            observe_paths(self.engine, self.float32, self.simulations, time.perf_counter() - started)
+            SBTeff_array.sort()
+            if self.float32:
+                SBTeff_array = SBTeff_array.astype(np.float32)
+            return SBTeff_array, paths
+        return self._stage('simulate', MARKET_INPUTS, compute)
+
+    def effective_prices(self):
+        """Sorted array of simulated effective prices."""
+        return self._simulate()[0]
+
+    def sample_paths(self):
+        """A few of the simulated price paths, or ``None`` for the exact engine."""
+        return self._simulate()[1]
+
+    def no_collar(self):
+        return self._stage('no_collar', NO_COLLAR_INPUTS,
+                           lambda: no_collar(self.effective_prices(), self.inputs['BaseER']))
+
+    def payoff(self):
+        def compute():
+            stats, _ = self.no_collar()
+            return collar_payoff(self.collar_type, self.effective_prices(), self.inputs, stats['NocPTTmean'])
+        return self._stage('payoff', PAYOFF_INPUTS[self.collar_type], compute)
+
+    def walkaway(self):
+        def compute():
+            _, arrays = self.payoff()
+            return walkaway(arrays['PTT'], arrays['OUT'], self.inputs['NT0'], self.inputs['ST0'],
+                            self.inputs['DP'], self.inputs['RP'])
+        return self._stage('walkaway', PAYOFF_INPUTS[self.collar_type] + WALKAWAY_INPUTS, compute)
+
+    def value(self):
+        """Statistics and chart arrays, shaped like ``valuation.value_deal``."""
+        stats, NocPTT = self.no_collar()
+        payoff_stats, payoff_arrays = self.payoff()
+        walkaway_stats, walkaway_arrays = self.walkaway()
+
+        stats = dict(stats)
+        prefix = COLLAR_PREFIXES[self.collar_type]
+        for key, value in dict(payoff_stats, **walkaway_stats).items():
+            stats[prefix + key] = value
+        arrays = {
+            'NOC': {'PTT': NocPTT},
+            self.collar_type: dict(payoff_arrays, **walkaway_arrays),
+        }
+        return stats, arrays
+
+    def for_collar(self, collar_type):
+        """A pipeline for another collar type sharing this one's stage results."""
+        pipeline = ValuationPipeline(self.inputs, collar_type, self.simulations, self.seed, self.engine,
+                                     self.workers, self.progress, self.float32, self.scheme)
+        pipeline.reused = self.reused
+        pipeline.timings = self.timings
+        pipeline.shared = self.shared
+        pipeline._results = self._results
+        return pipeline
+
+    def value_deal(self, collar_types=COLLAR_TYPES):
+        """Statistics and chart arrays of every collar type from one simulation."""
+        stats, arrays = {}, {}
+        for collar_type in collar_types:
+            collar_stats, collar_arrays = self.for_collar(collar_type).value()
+            stats.update(collar_stats)
+            arrays.update(collar_arrays)
+        return stats, arrays
+
+    def charts(self, render):
+        """``(script_grid, div_grid)`` for the dashboard.
+
+        ``render(pipeline)`` builds the Bokeh components. The result lives in
+        the valuation cache together with the statistics.
+        """
+        extra = {'float32': True} if self.float32 else {} # Float64 keys stay as they were
+        if self.scheme != 'plain': # And so do plain ones
+            extra['scheme'] = self.scheme
+        key = valuation_key(self.inputs, self.collar_type, self.simulations, self.seed, self.engine, **extra)
+        cached = cache_get(key, 'script_grid') # Entries stored without charts are misses
+        if cached is not None:
+            self.reused.append('charts')
+            return cached['script_grid'], cached['div_grid']
+
+        stats, _ = self.value()
+        with stage_timer('charts'):
+            script_grid, div_grid = render(self)
+
+        result = {'stats': stats}
+        if settings.VALUATION_CACHE_CHARTS:
+            result['script_grid'] = script_grid
+            result['div_grid'] = div_grid
+        cache_set(key, result)
+        return script_grid, div_grid
@@ -0,0 +1,103 @@
+"""Store finished valuations and re-render them from storage.
+
+Each stored run keeps the sorted effective prices as a compressed float32
+array: about 4 bytes per simulation before compression, and ample precision
+for the charts. With ``RUN_DISTRIBUTION = 'sketch'`` it keeps a fixed-size
+``PriceSketch`` instead, whatever the number of simulations. Reloading a
+run builds a ``ValuationPipeline`` over those prices (or the sketch's
+quantiles), so its charts are drawn without re-simulating.
+"""
+from datetime import datetime, timedelta
+import io
+import json
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+import numpy as np
+
+from .inputs import FIELDS, MARKET_INPUTS
+from .models import ValuationRun
+from .pipeline import ValuationPipeline
+from .sketch import PriceSketch
+from .valuation import COLLAR_PREFIXES
+
+HEADLINE_STATS = ('CVTT', 'WVTT', 'WVBT', 'NetWV', 'Psuc')
+RUNS_PER_PAGE = 50
+
+
+def pack_prices(SBTeff_array, inputs=None):
+    """Compressed prices, or their ``PriceSketch`` when ``settings.RUN_DISTRIBUTION`` is ``'sketch'``."""
+    if inputs is not None and settings.RUN_DISTRIBUTION == 'sketch':
+        sketch = PriceSketch.for_market(*[inputs[name] for name in MARKET_INPUTS])
+        sketch.update(SBTeff_array)
+        return sketch.to_bytes()
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, prices=np.asarray(SBTeff_array, dtype=np.float32))
+    return buffer.getvalue()
+
+
+def unpack_prices(blob):
+    """Stored prices; a stored sketch gives its evenly spaced quantiles."""
+    with np.load(io.BytesIO(bytes(blob))) as data:
+        if 'prices' in data.files:
+            return data['prices'].astype(np.float64)
+    return PriceSketch.from_bytes(blob).sample()
+
+
+def record_run(pipeline, names, total_seconds=0.0):
+    """Save the pipeline's valuation as a ``ValuationRun``."""
+    stats, _ = pipeline.value()
+    prefix = COLLAR_PREFIXES[pipeline.collar_type]
+    columns = {name: pipeline.inputs[name] for name, _, _ in FIELDS}
+    columns.update({name: stats[prefix + name] for name in HEADLINE_STATS})
+    return ValuationRun.objects.create(
+        bidder_name=names['bidder_name'],
+        target_name=names['target_name'],
+        collar_type=pipeline.collar_type,
+        simulations=pipeline.simulations,
+        seed=pipeline.seed,
+        engine=pipeline.engine,
+        simulate_seconds=pipeline.timings.get('simulate', 0.0),
+        total_seconds=total_seconds,
+        SBTeff_mean=stats['SBTeff_mean'],
+        SBTeff_std=stats['SBTeff_std'],
+        NocPTTmean=stats['NocPTTmean'],
+        stats=json.dumps(stats, default=float),
+        distribution=pack_prices(pipeline.effective_prices(), pipeline.inputs),
+        **columns
+    )
+
+
+def run_inputs(run):
+    return {name: getattr(run, name) for name, _, _ in FIELDS}
+
+
+def run_pipeline(run):
+    """A pipeline over the run's stored effective prices."""
+    return ValuationPipeline.from_prices(run_inputs(run), run.collar_type, unpack_prices(run.distribution),
+                                         run.seed, run.engine)
+
+
+def _day_start(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError("Invalid date: %s" % value)
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def filter_runs(runs, data):
+    """Filter runs by exact ``bidder``/``target`` names and ``since``/``until`` dates.
+
+    Dates are compared as ranges of ``created`` rather than through a date
+    function, so the name and date indexes stay usable.
+    """
+    if data.get('bidder'):
+        runs = runs.filter(bidder_name=data['bidder'])
+    if data.get('target'):
+        runs = runs.filter(target_name=data['target'])
+    if data.get('since'):
+        runs = runs.filter(created__gte=_day_start(data['since']))
+    if data.get('until'):
+        runs = runs.filter(created__lt=_day_start(data['until']) + timedelta(days=1))
+    return runs
@@ -0,0 +1,187 @@
+"""Sensitivities of collar and walkaway values to the market inputs.
+
+All scenarios are valued on common random numbers. One set of standard
+normals is drawn, long enough for the longest bumped horizon, and every
+bumped market (``SB0``, ``RetB``, ``StdB``, ``T``, ``avgper``) reuses it.
+The first ``T`` steps and the ones past it come from separate streams of
+the seed, so the base values of a seed do not depend on the parameters or
+bumps asked for:
+
+    SBTeff = SB0 * (1 + RetB * mean(t[-avgper:]) + StdB * mean(cumsum(N)[-avgper:]))
+
+with the window taken over the first ``T`` steps by ``averaging_window``,
+as in the path engine (so an ``avgper`` of 0 or past ``T`` averages the
+whole path there too).
+Only the window averages depend on ``T`` and ``avgper``, so each scenario
+costs one window average per path plus the payoff math, not a simulation.
+The differences between scenarios then carry little noise, and the
+per-path differences give standard errors for the sensitivities.
+
+First- and second-order sensitivities use central differences with small
+bumps (one day for ``T`` and ``avgper``); the tornado summary revalues each
+input at a larger bump down and up and ranks the inputs by swing.
+"""
+import numpy as np
+
+from .adaptive import RunningMoments
+from .engine import DEFAULT_CHUNK_SIZE, DEFAULT_SIMULATIONS, averaging_window
+from .inputs import COLLAR_TYPES, MARKET_INPUTS
+from .valuation import COLLAR_PREFIXES
+from .variance import metric_samples
+
+PARAMETERS = MARKET_INPUTS
+INTEGER_PARAMETERS = ('T', 'avgper')
+METRICS = ('CVTT', 'NetWV')
+DERIVATIVE_BUMP = 0.01 # Relative bump of the real inputs for the differences
+TORNADO_BUMP = 0.1 # Relative bump of every input for the tornado
+
+
+def _step(name, value, relative):
+    if name in INTEGER_PARAMETERS:
+        return max(1, int(round(abs(value) * relative)))
+    return abs(value) * relative if value else relative
+
+
+def _bumped(market, name, step):
+    """Inputs one step down and one step up, kept inside the valid range."""
+    value = market[name]
+    low, high = value - step, value + step
+    if name == 'T':
+        low = max(low, market['avgper'])
+    if name == 'avgper':
+        low, high = max(low, 1), min(high, market['T'])
+    if name == 'StdB':
+        low = max(low, 0.0)
+    return low, high
+
+
+def _scenarios(market, parameters, bump, tornado_bump):
+    # Keyed by (parameter, 'down'/'up', 'delta'/'tornado'); the base scenario is None
+    scenarios = {None: dict(market)}
+    for name in parameters:
+        for kind, relative in (('delta', bump), ('tornado', tornado_bump)):
+            low, high = _bumped(market, name, _step(name, market[name], relative))
+            scenarios[(name, 'down', kind)] = dict(market, **{name: low})
+            scenarios[(name, 'up', kind)] = dict(market, **{name: high})
+    return scenarios
+
+
+def _window_mean_time(T, avgper):
+    t = np.linspace(0, T, T)
+    return t[averaging_window(T, avgper)].mean()
+
+
+def _chunk_samples(scenarios, inputs, collar_types, cumulative):
+    # Per-path metric values of every scenario for one chunk of normals
+    windows = {}
+    samples = {}
+    for key, market in scenarios.items():
+        T, avgper = market['T'], market['avgper']
+        if (T, avgper) not in windows:
+            windows[(T, avgper)] = (_window_mean_time(T, avgper), cumulative[:, averaging_window(T, avgper)].mean(axis=1))
+        tbar, Z = windows[(T, avgper)]
+        SBTeff_array = market['SB0'] * (1 + market['RetB'] * tbar + market['StdB'] * Z)
+        values = {}
+        for collar_type in collar_types:
+            prefix = COLLAR_PREFIXES[collar_type]
+            metric, _ = metric_samples(SBTeff_array, dict(inputs, **market), collar_type)
+            values[prefix + 'CVTT'] = metric['CVTT']
+            values[prefix + 'NetWV'] = metric['WVTT'] - metric['WVBT']
+        samples[key] = values
+    return samples
+
+
+def sensitivities(inputs, parameters=PARAMETERS, collar_types=COLLAR_TYPES, simulations=DEFAULT_SIMULATIONS,
+                  seed=None, bump=DERIVATIVE_BUMP, tornado_bump=TORNADO_BUMP, chunk_size=DEFAULT_CHUNK_SIZE):
+    """First- and second-order sensitivities and a tornado summary.
+
+    Returns ``base`` (the metric values), ``base_stderr`` (their standard
+    errors), ``sensitivities`` (per parameter:
+    the bump used and, per metric, ``delta``, ``gamma`` and their standard
+    errors) and ``tornado`` (per metric, the parameters sorted by swing).
+    Metrics are named as in the dashboard statistics, e.g. ``FexCVTT``.
+    """
+    for name in parameters:
+        if name not in PARAMETERS:
+            raise ValueError("Unknown sensitivity parameter: %s" % name)
+    if not bump > 0 or not tornado_bump > 0:
+        raise ValueError("Bumps must be positive")
+    market = {name: inputs[name] for name in MARKET_INPUTS}
+    # An avgper of 0 or past T averages the whole path; bump the window length it stands for
+    market['avgper'] = len(averaging_window(market['T'], market['avgper']))
+    scenarios = _scenarios(market, parameters, bump, tornado_bump)
+    T_max = max(scenario['T'] for scenario in scenarios.values())
+    metrics = [COLLAR_PREFIXES[collar_type] + metric for collar_type in collar_types for metric in METRICS]
+
+    levels = {(key, metric): RunningMoments() for key in scenarios for metric in metrics}
+    deltas = {(name, metric): RunningMoments() for name in parameters for metric in metrics}
+    gammas = {(name, metric): RunningMoments() for name in parameters for metric in metrics}
+    steps = {}
+    for name in parameters:
+        low = scenarios[(name, 'down', 'delta')][name]
+        high = scenarios[(name, 'up', 'delta')][name]
+        steps[name] = (market[name] - low, high - market[name])
+
+    base_stream, extra_stream = np.random.SeedSequence(seed).spawn(2)
+    rng, extra_rng = np.random.default_rng(base_stream), np.random.default_rng(extra_stream)
+    T = market['T']
+    done = 0
+    while done < simulations:
+        rows = min(chunk_size, simulations - done)
+        normals = np.empty((rows, T_max))
+        normals[:, :T] = rng.standard_normal((rows, T))
+        normals[:, T:] = extra_rng.standard_normal((rows, T_max - T)) # Steps of the longer bumped horizons
+        cumulative = np.cumsum(normals, axis=1, out=normals)
+        cumulative[:, 0] = 0 # The path starts at SB0
+        samples = _chunk_samples(scenarios, inputs, collar_types, cumulative)
+        del cumulative
+
+        for (key, metric), moments in levels.items():
+            moments.update(samples[key][metric])
+        for name in parameters:
+            h_down, h_up = steps[name]
+            for metric in metrics:
+                down = samples[(name, 'down', 'delta')][metric]
+                up = samples[(name, 'up', 'delta')][metric]
+                base = samples[None][metric]
+                # Central differences on an uneven grid when a bump was clipped
+                deltas[(name, metric)].update((up - down) / (h_up + h_down))
+                if h_down > 0 and h_up > 0:
+                    gammas[(name, metric)].update(2 * ((up - base) / h_up - (base - down) / h_down) / (h_up + h_down))
+        done += rows
+
+    result = {
+        'paths': simulations,
+        'scenarios': len(scenarios),
+        'base': {metric: levels[(None, metric)].mean for metric in metrics},
+        'base_stderr': {metric: levels[(None, metric)].stderr for metric in metrics},
+        'sensitivities': {},
+        'tornado': {},
+    }
+    for name in parameters:
+        entry = {'bump': steps[name][1]}
+        for metric in metrics:
+            delta, gamma = deltas[(name, metric)], gammas[(name, metric)]
+            entry[metric] = {
+                'delta': delta.mean,
+                'delta_stderr': delta.stderr,
+                'gamma': gamma.mean if gamma.n else None,
+                'gamma_stderr': gamma.stderr if gamma.n else None,
+            }
+        result['sensitivities'][name] = entry
+
+    for metric in metrics:
+        bars = []
+        for name in parameters:
+            low = levels[((name, 'down', 'tornado'), metric)].mean
+            high = levels[((name, 'up', 'tornado'), metric)].mean
+            bars.append({
+                'parameter': name,
+                'low_input': scenarios[(name, 'down', 'tornado')][name],
+                'high_input': scenarios[(name, 'up', 'tornado')][name],
+                'low': low,
+                'high': high,
+                'swing': abs(high - low),
+            })
+        result['tornado'][metric] = sorted(bars, key=lambda bar: bar['swing'], reverse=True)
+    return result
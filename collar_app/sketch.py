@@ -0,0 +1,269 @@
+"""Fixed-size sketch of the effective-price distribution.
+
+``PriceSketch`` keeps the count, sum and sum of squares of the simulated
+prices in ``bins`` equal-width bins over ``mean +- SKETCH_STDS * std`` of the
+closed-form effective-price distribution, plus one bin for each tail. It is
+filled block by block while simulating, so memory and storage are
+``3 * (bins + 2)`` floats whatever the number of simulations, and sketches
+of independent blocks merge by addition.
+
+Queries follow ``DistributionIndex``: ``prob``, ``partial_mean``,
+``partial_square`` and ``linear_stats`` on half-open intervals, so
+``collars.value_segments`` and ``distribution.collar_statistics`` price
+collars and walkaway options straight from a sketch. Intervals made of
+whole bins are exact; inside the bins cut by an interval's ends the prices
+are taken as uniform. The error of ``prob(lo, hi)`` is therefore at most
+the mass of those two bins (``interval_error``), and in practice far less,
+since the density is smooth on the scale of one bin. Chart data comes from
+``histogram`` and from ``sample``, a deterministic set of quantiles that
+stands in for the price array.
+"""
+import io
+
+import numpy as np
+
+from .collars import INF, fex_segments, fp_segments, scalar
+from .distribution import collar_statistics
+from .engine import DEFAULT_CHUNK_SIZE, effective_price_moments, simulate_effective_prices
+from .inputs import MARKET_INPUTS
+from .parallel import BLOCK_SIZE
+from .valuation import COLLAR_PREFIXES
+
+SKETCH_BINS = 4096
+SKETCH_STDS = 8
+SAMPLE_SIZE = 10000 # Quantiles standing in for the prices in charts
+
+
+class PriceSketch:
+
+    def __init__(self, low, high, bins=SKETCH_BINS):
+        self.inner = np.linspace(low, high, bins + 1) # Edges of the equal-width bins
+        self.count = np.zeros(bins + 2) # Tails first and last
+        self.sum1 = np.zeros(bins + 2)
+        self.sum2 = np.zeros(bins + 2)
+        self.minimum = INF
+        self.maximum = -INF
+        self._cumulative = None
+
+    @classmethod
+    def for_market(cls, SB0, RetB, StdB, T, avgper, bins=SKETCH_BINS):
+        """An empty sketch spanning the closed-form distribution of the market."""
+        mean, std = effective_price_moments(SB0, RetB, StdB, T, avgper)
+        width = SKETCH_STDS * max(std, 1e-12 * max(abs(mean), 1.0))
+        return cls(mean - width, mean + width, bins)
+
+    def update(self, SBTeff_array):
+        x = np.asarray(SBTeff_array, dtype=float)
+        if not len(x):
+            return
+        ids = np.searchsorted(self.inner, x, side='right') # 0 below the grid, bins + 1 above it
+        size = len(self.count)
+        self.count += np.bincount(ids, minlength=size)
+        self.sum1 += np.bincount(ids, weights=x, minlength=size)
+        self.sum2 += np.bincount(ids, weights=x * x, minlength=size)
+        self.minimum = min(self.minimum, x.min())
+        self.maximum = max(self.maximum, x.max())
+        self._cumulative = None
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum1 += other.sum1
+        self.sum2 += other.sum2
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self._cumulative = None
+
+    @property
+    def n(self):
+        return int(self.count.sum())
+
+    @property
+    def mean(self):
+        return self.sum1.sum() / self.n
+
+    @property
+    def std(self):
+        return np.sqrt(max(self.sum2.sum() / self.n - self.mean**2, 0.0))
+
+    @property
+    def edges(self):
+        # The tail bins reach out to the extreme prices seen
+        low = min(self.minimum, self.inner[0])
+        high = max(self.maximum, self.inner[-1])
+        return np.concatenate(([low], self.inner, [high]))
+
+    def _prefix(self):
+        if self._cumulative is None:
+            self._cumulative = tuple(np.concatenate(([0.0], np.cumsum(values)))
+                                     for values in (self.count, self.sum1, self.sum2))
+        return self._cumulative
+
+    def _below(self, v):
+        """Count, sum and sum of squares of the prices below ``v``."""
+        v = np.asarray(v, dtype=float)
+        edges = self.edges
+        v = np.clip(v, edges[0], edges[-1])
+        k = np.clip(np.searchsorted(edges, v, side='right') - 1, 0, len(self.count) - 1)
+        lo = edges[k]
+        width = edges[k + 1] - lo
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f = np.where(width > 0, (v - lo) / width, 1.0)
+        f = np.where(v >= edges[-1], 1.0, f)
+
+        c = self.count[k]
+        cum0, cum1, cum2 = self._prefix()
+
+        def uniform(g):
+            # Sum and sum of squares of c prices spread uniformly over the first g of the bin
+            a = g * width
+            return c * g * (2 * lo + a) / 2, c * g * (3 * lo * lo + 3 * lo * a + a * a) / 3
+
+        # Uniform prices inside the cut bin, corrected to match its exact moments when whole
+        part1, part2 = uniform(f)
+        whole1, whole2 = uniform(1.0)
+        count = cum0[k] + c * f
+        sum1 = cum1[k] + self.sum1[k] * f + part1 - f * whole1
+        sum2 = cum2[k] + self.sum2[k] * f + part2 - f * whole2
+        return count, sum1, sum2
+
+    def _interval(self, lo, hi):
+        lo = np.asarray(lo, dtype=float)
+        hi = np.maximum(lo, hi)
+        below_lo = self._below(lo)
+        below_hi = self._below(hi)
+        return [(b - a) / self.n for a, b in zip(below_lo, below_hi)]
+
+    def prob(self, lo, hi):
+        return self._interval(lo, hi)[0]
+
+    def partial_mean(self, lo, hi):
+        return self._interval(lo, hi)[1]
+
+    def partial_square(self, lo, hi):
+        return self._interval(lo, hi)[2]
+
+    def interval_error(self, lo, hi):
+        """Upper bound on the error of ``prob(lo, hi)``: the mass of the bins cut by ``lo`` and ``hi``."""
+        edges = self.edges
+        size = len(self.count)
+        error = 0.0
+        for v in (lo, hi):
+            v = np.asarray(v, dtype=float)
+            k = np.clip(np.searchsorted(edges, v, side='right') - 1, 0, size - 1)
+            on_edge = np.isin(v, edges) | (v <= edges[0]) | (v >= edges[-1])
+            error = error + np.where(on_edge, 0.0, self.count[k] / self.n)
+        return scalar(error)
+
+    def linear_stats(self, pieces):
+        """Mean, std, min and max of a payoff ``c + d * SBTeff``, as in ``DistributionIndex``."""
+        mean = 0.0
+        square = 0.0
+        covered = 0.0
+        low = INF
+        high = -INF
+
+        for lo, hi, c, d in pieces:
+            p, m1, m2 = self._interval(lo, hi)
+            mean = mean + c * p + d * m1
+            square = square + c * c * p + 2 * c * d * m1 + d * d * m2
+            covered = covered + p
+
+            # Extremes at the ends of the covered price range
+            nonempty = p > 0
+            with np.errstate(invalid='ignore'): # Empty pieces past the prices seen, dropped below
+                first = c + d * np.maximum(lo, self.minimum)
+                last = c + d * np.minimum(hi, self.maximum)
+            low = np.where(nonempty, np.minimum(low, np.minimum(first, last)), low)
+            high = np.where(nonempty, np.maximum(high, np.maximum(first, last)), high)
+
+        uncovered = covered < 1 - 1e-12
+        low = np.where(uncovered, np.minimum(low, 0.0), low)
+        high = np.where(uncovered, np.maximum(high, 0.0), high)
+        std = np.sqrt(np.maximum(square - mean * mean, 0.0))
+
+        return scalar(mean), scalar(std), scalar(low), scalar(high)
+
+    def quantile(self, q):
+        """Prices at probabilities ``q``, uniform inside each bin."""
+        q = np.asarray(q, dtype=float)
+        edges = self.edges
+        cum0 = self._prefix()[0] / self.n
+        k = np.clip(np.searchsorted(cum0, q, side='right') - 1, 0, len(self.count) - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f = np.where(self.count[k] > 0, (q - cum0[k]) * self.n / self.count[k], 0.0)
+        return edges[k] + np.clip(f, 0.0, 1.0) * (edges[k + 1] - edges[k])
+
+    def sample(self, size=SAMPLE_SIZE):
+        """``size`` evenly spaced quantiles, sorted: a stand-in for the price array."""
+        return self.quantile((np.arange(size) + 0.5) / size)
+
+    def histogram(self, bins):
+        """Density histogram like ``np.histogram(..., density=True)``."""
+        edges = np.linspace(self.minimum, self.maximum, bins + 1)
+        counts = np.diff(self._below(edges)[0])
+        counts[0] += self._below(edges[0])[0] # The first bin is closed too
+        counts[-1] += self.n - self._below(edges[-1])[0] # The last bin is closed
+        return counts / self.n / np.diff(edges), edges
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, inner=self.inner, count=self.count, sum1=self.sum1, sum2=self.sum2,
+                            extremes=np.array([self.minimum, self.maximum]))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        with np.load(io.BytesIO(bytes(blob))) as data:
+            sketch = cls(data['inner'][0], data['inner'][-1], len(data['inner']) - 1)
+            sketch.count = data['count']
+            sketch.sum1 = data['sum1']
+            sketch.sum2 = data['sum2']
+            sketch.minimum, sketch.maximum = data['extremes']
+        return sketch
+
+
+def simulate_sketch(SB0, RetB, StdB, T, avgper, simulations, seed=None, method='path',
+                    bins=SKETCH_BINS, block_size=BLOCK_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, scheme='plain'):
+    """Sketch of a simulation, built block by block without keeping the prices.
+
+    Blocks draw from the same seed-spawned streams as
+    ``parallel.simulate_parallel``, so a seed gives the same prices.
+    """
+    market = (SB0, RetB, StdB, T, avgper)
+    sketch = PriceSketch.for_market(*market, bins=bins)
+    n_blocks = max(1, -(-simulations // block_size))
+    streams = np.random.SeedSequence(seed).spawn(n_blocks)
+    for i, stream in enumerate(streams):
+        n = min(block_size, simulations - i * block_size)
+        rng = np.random.default_rng(stream)
+        sketch.update(simulate_effective_prices(*market, n, rng=rng, chunk_size=chunk_size, method=method,
+                                                scheme=scheme))
+    return sketch
+
+
+def sketch_statistics(sketch, inputs, collar_types=('FEX', 'FP')):
+    """No-collar statistics plus each collar's, under its ``Fex``/``Fp`` prefix."""
+    BaseER = inputs['BaseER']
+    stats = {
+        'SBTeff_mean': sketch.mean,
+        'SBTeff_std': sketch.std,
+        'NocPTTmean': sketch.mean * BaseER,
+        'NocPTTstd': sketch.std * abs(BaseER),
+    }
+    for collar_type in collar_types:
+        prefix = COLLAR_PREFIXES[collar_type]
+        if collar_type == 'FEX':
+            segments = fex_segments(inputs['FexLB'], inputs['FexUB'], BaseER)
+        else:
+            segments = fp_segments(inputs['BaseP'], inputs['LR'], inputs['UR'])
+        collar = collar_statistics(sketch, segments, inputs['ST0'], inputs['DP'], inputs['RP'], BaseER)
+        collar['LB'] = segments[0][1]
+        collar['UB'] = segments[2][0]
+        for key, value in collar.items():
+            stats[prefix + key] = value
+    return stats
+
+
+def market_sketch(inputs, simulations, seed=None, method='path', bins=SKETCH_BINS, scheme='plain'):
+    return simulate_sketch(*[inputs[name] for name in MARKET_INPUTS], simulations, seed=seed, method=method,
+                           bins=bins, scheme=scheme)
@@ -0,0 +1,144 @@
+"""Find collar bounds that hit a target collar value or success probability.
+
+The solver works on one effective-price distribution for the whole solve:
+either the closed-form Gaussian or a ``DistributionIndex`` built from a single
+simulation. Each evaluation is then a handful of CDF terms or ``searchsorted``
+lookups, so a solve takes milliseconds.
+
+Bounds are searched in bidder-price space. ``mode`` picks the free variable:
+
+- ``'symmetric'``: the price band ``c - w .. c + w`` around a centre ``c``,
+  by default ``SB0`` for a FEX collar and ``BaseP / BaseER`` for an FP
+  collar, the bidder price at which the fixed price ``BaseP`` is paid at the
+  base exchange ratio (so ``UR = BaseP / (c - w)`` and ``LR = BaseP / (c + w)``);
+- ``'LB'``: keep the lower price bound from the inputs, move the upper one;
+- ``'UB'``: keep the upper price bound from the inputs, move the lower one.
+"""
+import numpy as np
+
+from .analytic import GaussianDistribution
+from .collars import fex_segments, fp_segments, value_segments
+from .distribution import DistributionIndex
+from .engine import DEFAULT_SIMULATIONS, effective_price_moments, simulate_effective_prices
+
+METRICS = ('CVTT', 'NetWV', 'Psuc')
+MODES = ('symmetric', 'LB', 'UB')
+DISTRIBUTIONS = ('analytic', 'exact', 'path')
+
+SEARCH_STDS = 8 # Price bounds are searched within mean +- this many stds
+GRID_SIZE = 201 # Points of the initial bracketing scan
+
+
+class SolverError(ValueError):
+    pass
+
+
+def build_distribution(inputs, method='analytic', simulations=DEFAULT_SIMULATIONS, rng=None):
+    """Effective-price distribution reused across all solver iterations."""
+    market = (inputs['SB0'], inputs['RetB'], inputs['StdB'], inputs['T'], inputs['avgper'])
+    if method == 'analytic':
+        return GaussianDistribution(*effective_price_moments(*market))
+    if method in ('exact', 'path'):
+        return DistributionIndex(simulate_effective_prices(*market, simulations, rng=rng, method=method))
+    raise SolverError("Unknown distribution: %s" % method)
+
+
+def collar_bounds(collar_type, inputs):
+    # Current collar bounds expressed as bidder prices
+    if collar_type == 'FEX':
+        return inputs['FexLB'], inputs['FexUB']
+    return inputs['BaseP'] / inputs['UR'], inputs['BaseP'] / inputs['LR']
+
+
+def collar_terms(collar_type, inputs, LB, UB):
+    # Bidder-price bounds translated back to the terms of the collar
+    if collar_type == 'FEX':
+        return {'FexLB': LB, 'FexUB': UB}
+    return {'LR': inputs['BaseP'] / UB, 'UR': inputs['BaseP'] / LB}
+
+
+def band_center(collar_type, inputs):
+    # Default centre of the symmetric band, in bidder price
+    if collar_type == 'FEX':
+        return inputs['SB0']
+    return inputs['BaseP'] / inputs['BaseER']
+
+
+def _segments(collar_type, inputs, LB, UB):
+    if collar_type == 'FEX':
+        return fex_segments(LB, UB, inputs['BaseER'])
+    return fp_segments(inputs['BaseP'], inputs['BaseP'] / UB, inputs['BaseP'] / LB)
+
+
+def solve_bounds(dist, collar_type, metric, target, inputs, mode='symmetric',
+                 tol=1e-8, max_iter=200, center=None):
+    """Bounds at which ``metric`` of the collar equals ``target``.
+
+    ``center`` is the bidder price the symmetric band is centred on,
+    ``band_center`` by default.
+
+    Scans the free bound on a grid (one vectorized evaluation), takes the
+    first bracket where the metric crosses the target and bisects it. Returns
+    the collar terms, the bidder-price bounds and the full statistics at the
+    solution. Raises ``SolverError`` when the target is out of reach.
+    """
+    if metric not in METRICS:
+        raise SolverError("Unknown metric: %s" % metric)
+    if mode not in MODES:
+        raise SolverError("Unknown mode: %s" % mode)
+    if collar_type not in ('FEX', 'FP'):
+        raise SolverError("Unknown collar type: %s" % collar_type)
+
+    SB0 = inputs['SB0']
+    LB0, UB0 = collar_bounds(collar_type, inputs)
+    price_lo = max(dist.mean - SEARCH_STDS * dist.std, 1e-9 * SB0)
+    price_hi = dist.mean + SEARCH_STDS * dist.std
+    center = band_center(collar_type, inputs) if center is None else center
+    if not center > 0:
+        raise SolverError("The band centre must be a positive price")
+
+    if mode == 'symmetric':
+        w_lo, w_hi = 0.0, min(max(center - price_lo, price_hi - center), center * (1 - 1e-9))
+        bounds = lambda w: (center - w, center + w)
+    elif mode == 'LB':
+        w_lo, w_hi = LB0, max(LB0, price_hi)
+        bounds = lambda w: (LB0, w)
+    else:
+        w_lo, w_hi = min(price_lo, UB0), UB0
+        bounds = lambda w: (w, UB0)
+
+    args = (inputs['ST0'], inputs['DP'], inputs['RP'], inputs['BaseER'])
+
+    def excess(w):
+        return value_segments(dist, _segments(collar_type, inputs, *bounds(w)), *args)[metric] - target
+
+    w = np.linspace(w_lo, w_hi, GRID_SIZE)
+    f = excess(w)
+    crossing = np.nonzero(np.sign(f[:-1]) * np.sign(f[1:]) <= 0)[0]
+    if len(crossing) == 0:
+        raise SolverError("Target %s = %g is not attainable: it ranges from %g to %g"
+                          % (metric, target, np.min(f) + target, np.max(f) + target))
+
+    k = crossing[0]
+    a, b = w[k], w[k + 1]
+    fa = f[k]
+    iterations = 0
+    while b - a > tol * max(1.0, abs(b)) and iterations < max_iter:
+        mid = 0.5 * (a + b)
+        fm = excess(mid)
+        if np.sign(fm) == np.sign(fa):
+            a, fa = mid, fm
+        else:
+            b = mid
+        iterations += 1
+
+    w_star = a if abs(fa) <= abs(excess(b)) else b
+    LB, UB = bounds(w_star)
+    result = collar_terms(collar_type, inputs, LB, UB)
+    result.update({
+        'LB': LB,
+        'UB': UB,
+        'iterations': iterations,
+        'stats': value_segments(dist, _segments(collar_type, inputs, LB, UB), *args),
+    })
+    return result
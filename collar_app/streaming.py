@@ -0,0 +1,171 @@
+"""Server-sent events of estimates that refine while the simulation runs.
+
+``GET /stream`` (or ``POST``) with the dashboard form fields emits an
+``estimate`` event after each simulated batch, holding the estimates of
+``CVTT``, ``WVTT``, ``WVBT`` and ``Psuc`` with their standard errors and
+confidence intervals (see ``adaptive.snapshot``), and a final ``done`` event.
+Analysts can close the stream as soon as the numbers settle.
+
+Under ASGI, ``collar_project.asgi`` routes the path to ``stream_application``,
+which runs each CPU-bound batch in a thread pool (NumPy releases the GIL for
+the heavy work) so the event loop keeps serving other requests. Django 3.0
+has no async views, hence the plain ASGI application. Under WSGI the
+``views.stream`` view streams the same events from a generator.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import math
+import time
+
+from django.conf import settings
+from django.http import QueryDict
+
+from .adaptive import MIN_BATCHES, adaptive_batches
+from .engine import DEFAULT_CHUNK_SIZE, DEFAULT_SIMULATIONS, METHODS
+from .inputs import COLLAR_TYPES, parse_inputs
+from .variance import SCHEMES
+
+STREAM_PATH = '/stream'
+STREAM_THREADS = 4 # Batches simulated at once across all ASGI streams
+HEADERS = (
+    ('Content-Type', 'text/event-stream'),
+    ('Cache-Control', 'no-cache'),
+    ('X-Accel-Buffering', 'no'), # Keep proxies from buffering the stream
+)
+
+_executor = None
+
+
+def stream_options(data):
+    """Deal inputs and ``refine`` options from a form-like mapping."""
+    inputs = parse_inputs(data)
+    collar_type = data.get("collarType")
+    if collar_type and collar_type not in COLLAR_TYPES:
+        raise ValueError("Unknown collar type: %s" % collar_type)
+    tolerance = data.get("tolerance") # Optional: stop once every standard error is below it
+    seed = data.get("seed")
+    options = {
+        'collar_types': (collar_type,) if collar_type else COLLAR_TYPES,
+        'tolerance': float(tolerance) if tolerance else None,
+        'batch_size': int(data.get("batchSize", DEFAULT_CHUNK_SIZE)),
+        'max_paths': int(data.get("maxPaths", min(settings.SIMULATIONS, settings.STREAM_MAX_PATHS))),
+        'seed': int(seed) if seed else None,
+        'method': str(data.get("engine", "path")),
+        'confidence': float(data.get("confidence", 0.95)),
+        'scheme': str(data.get("scheme", "plain")),
+    }
+    if options['method'] not in METHODS:
+        raise ValueError("Unknown engine method: %s" % options['method'])
+    if options['scheme'] not in SCHEMES or (options['scheme'] == 'sobol' and options['method'] != 'exact'):
+        raise ValueError("Unknown variance-reduction scheme for the %s engine: %s"
+                         % (options['method'], options['scheme']))
+    if options['batch_size'] < 2 or options['max_paths'] < 1:
+        raise ValueError("batchSize must be at least 2 and maxPaths at least 1")
+    # Streams run in a shared pool and, under ASGI, outside the middleware: keep each one bounded
+    if options['max_paths'] > settings.STREAM_MAX_PATHS or options['batch_size'] > settings.STREAM_MAX_BATCH_SIZE:
+        raise ValueError("maxPaths may be at most %d and batchSize at most %d"
+                         % (settings.STREAM_MAX_PATHS, settings.STREAM_MAX_BATCH_SIZE))
+    return inputs, options
+
+
+def refine(inputs, collar_types=COLLAR_TYPES, tolerance=None, batch_size=DEFAULT_CHUNK_SIZE,
+           max_paths=DEFAULT_SIMULATIONS, seed=None, method='path', confidence=0.95, scheme='plain'):
+    """Yield ``('estimate', payload)`` after each batch, then ``('done', payload)``."""
+    started = time.perf_counter()
+    payload = {'paths': 0, 'estimates': {}}
+    converged = False
+    batches = adaptive_batches(inputs, collar_types, batch_size, max_paths, seed, method, confidence, scheme)
+    for i, (paths, estimates) in enumerate(batches, 1):
+        payload = {'paths': paths, 'elapsed': time.perf_counter() - started, 'estimates': estimates}
+        yield 'estimate', payload
+        if tolerance is not None and i >= MIN_BATCHES and all(
+                estimate['stderr'] <= tolerance for estimate in estimates.values()):
+            converged = True
+            break
+    yield 'done', dict(payload, converged=converged)
+
+
+def _finite(value):
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, float) and not math.isfinite(value):
+        return None # JSON has no infinity
+    return value
+
+
+def sse_event(event, payload):
+    return 'event: %s\ndata: %s\n\n' % (event, json.dumps(_finite(payload), default=float))
+
+
+def sse_events(inputs, options):
+    for event, payload in refine(inputs, **options):
+        yield sse_event(event, payload)
+
+
+def _thread_pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=STREAM_THREADS)
+    return _executor
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def _respond(send, status, headers, body, more_body=False):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+
+async def stream_application(scope, receive, send):
+    """ASGI application serving ``STREAM_PATH``."""
+    body = await _read_body(receive)
+    if body is None:
+        return
+    data = QueryDict(body if scope['method'] == 'POST' else scope.get('query_string', b''))
+    try:
+        inputs, options = stream_options(data)
+    except ValueError as exc:
+        error = json.dumps({'error': str(exc)}).encode()
+        await _respond(send, 400, [('Content-Type', 'application/json')], error)
+        return
+
+    loop = asyncio.get_event_loop()
+    events = sse_events(inputs, options)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    await _respond(send, 200, HEADERS, b'', more_body=True)
+    try:
+        while not disconnected.done():
+            # The batch runs in a worker thread; the loop serves other requests meanwhile
+            chunk = await loop.run_in_executor(_thread_pool(), next, events, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        disconnected.cancel()
+        try:
+            events.close()
+        except ValueError:
+            pass # A batch is still running in the pool; the generator goes once it returns
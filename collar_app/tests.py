@@ -1,3 +1,897 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+import numpy as np
+
+from .adaptive import RunningMoments, adaptive_valuation
+from .analytic import analytic_valuation
+from .batch import read_deals, stat_columns, value_deals, write_results
+from .benchmark import check_engines, history_entry, load_history, regressions, save_history, time_case
+from .cache import cache_get, cache_set, cache_stats, valuation_key
+from .calibration import calibrate, calibrate_form, estimate, read_closes
+from .chart_data import MAX_BINS, downsample_curve, histogram
+from .collars import fex_segments, fp_segments
+from .comparison import compare_structures, parse_variants
+from .distribution import DistributionIndex, collar_statistics, fex_grid, fp_grid
+from .engine import effective_price_moments, simulate_effective_prices
+from .inputs import DEFAULT_INPUTS, FIELDS, MARKET_INPUTS, InputError, parse_inputs, parse_names
+from .jobs import JobProgress, claim_job, run_job, submit_job
+from .loadtest import _descendants, form_mix, summarize
+from .metrics import NO_TIMER, _format_labels, stage_timer
+from .models import ValuationJob, ValuationRun
+from .parallel import _executor, simulate_parallel
+from .pipeline import ValuationPipeline
+from .runs import filter_runs, record_run, run_pipeline
+from .sensitivity import sensitivities
+from .sketch import PriceSketch, simulate_sketch, sketch_statistics
+from .solver import SolverError, build_distribution, solve_bounds
+from .streaming import stream_application
+from .valuation import fex_payoff, fp_payoff, value_deal, walkaway
+from .variance import METRICS, compare_schemes
+
+# Disney/Fox defaults from index.html
+MARKET = dict(SB0=107.15, RetB=0.0007431, StdB=0.0117901, T=183, avgper=15)
+DEAL = dict(ST0=43.89, DP=0.0823, RP=0.3, BaseER=0.5, FexLB=94.0, FexUB=114.0,
+            BaseP=51.572626, LR=0.4511, UR=0.5514)
+
+
+def reference_effective_prices(SB0, RetB, StdB, T, avgper, simulations, rng):
+    # The original per-simulation loop from views.dashboard
+    dt = 1
+    GBMsteps = round(T/dt)
+    SBTeff_list = []
+    for x in range(simulations):
+        t = np.linspace(0, T, GBMsteps)
+        N = rng.standard_normal(size = GBMsteps)
+        R = (t != 0) * (RetB * dt * t + StdB * np.cumsum(N) * np.sqrt(dt))
+        SB_path = SB0 * (1 + R)
+        SBTeff_list.append(np.mean(SB_path[-avgper:]))
+    return np.array(SBTeff_list)
+
+
+class EngineTests(SimpleTestCase):
+
+    def test_path_engine_matches_reference_loop(self):
+        n = 20000
+        fast = simulate_effective_prices(simulations=n, rng=np.random.default_rng(1), chunk_size=3000, **MARKET)
+        slow = reference_effective_prices(simulations=n, rng=np.random.default_rng(2), **MARKET)
+        se = slow.std() / np.sqrt(n)
+        self.assertLess(abs(fast.mean() - slow.mean()), 4 * np.sqrt(2) * se)
+        self.assertAlmostEqual(fast.std() / slow.std(), 1, delta=0.03)
+
+    def test_path_engine_is_reproducible(self):
+        a = simulate_effective_prices(simulations=1000, rng=np.random.default_rng(7), **MARKET)
+        b = simulate_effective_prices(simulations=1000, rng=np.random.default_rng(7), **MARKET)
+        np.testing.assert_array_equal(a, b)
+
+    def test_window_longer_than_path_keeps_pinned_start(self):
+        prices = simulate_effective_prices(100.0, 0.0, 0.0, 10, 50, 5, rng=np.random.default_rng(0))
+        np.testing.assert_allclose(prices, 100.0)
+
+    def test_exact_engine_agrees_with_path_engine(self):
+        n = 100000
+        path = simulate_effective_prices(simulations=n, rng=np.random.default_rng(3), **MARKET)
+        exact = simulate_effective_prices(simulations=n, rng=np.random.default_rng(4), method='exact', **MARKET)
+        se = path.std() / np.sqrt(n)
+        self.assertLess(abs(path.mean() - exact.mean()), 4 * np.sqrt(2) * se)
+        self.assertAlmostEqual(path.std() / exact.std(), 1, delta=0.02)
+        for q in (0.05, 0.5, 0.95):
+            self.assertAlmostEqual(np.quantile(path, q), np.quantile(exact, q), delta=0.5)
+
+    def test_exact_moments_match_brute_force_covariance(self):
+        SB0, RetB, StdB, T, avgper = 50.0, 0.001, 0.02, 12, 5
+        t = np.linspace(0, T, T)
+        weights = np.zeros(T)
+        weights[-avgper:] = 1 / avgper
+        weights[0] = 0 # Pinned starting point
+        cov = np.minimum.outer(np.arange(T), np.arange(T)) + 1 # Cov of cumsum(N)
+        mean, std = effective_price_moments(SB0, RetB, StdB, T, avgper)
+        self.assertAlmostEqual(mean, SB0 * (1 + RetB * t[-avgper:].mean()))
+        self.assertAlmostEqual(std, SB0 * StdB * np.sqrt(weights @ cov @ weights))
+
+
+def monte_carlo_collar(SBTeff_array, PTT, ST0, DP, RP, BaseER, INS):
+    # Collar statistics as computed in views.dashboard
+    OUT = np.invert(INS)
+    WPTT = OUT * np.maximum(ST0*(1+DP)-PTT,0)
+    WPBT = OUT * np.maximum(PTT-ST0*(1+RP),0)
+    IfDS = np.invert(np.maximum(WPTT > 0, WPBT > 0))
+    return {
+        'CVTT': np.mean(PTT) - np.mean(SBTeff_array * BaseER),
+        'WVTT': np.mean(WPTT),
+        'WVBT': np.mean(WPBT),
+        'Psuc': np.mean(IfDS),
+    }
+
+
+class ParallelTests(SimpleTestCase):
+
+    def test_results_do_not_depend_on_worker_count(self):
+        serial = simulate_parallel(simulations=25000, seed=123, workers=1, block_size=4000, **MARKET)
+        parallel = simulate_parallel(simulations=25000, seed=123, workers=3, block_size=4000, **MARKET)
+        np.testing.assert_array_equal(serial, parallel)
+        self.assertEqual(len(np.unique(serial)), 25000) # Blocks use distinct streams
+        pool = _executor(3)
+        self.assertIs(_executor(2), pool) # Smaller worker counts share the process's pool
+
+
+class AnalyticTests(SimpleTestCase):
+
+    def test_analytic_matches_monte_carlo(self):
+        deal = dict(DEAL, FexLB=100.0, FexUB=108.0, DP=0.2, RP=0.25)
+        result = analytic_valuation(**MARKET, **deal)
+        x = simulate_effective_prices(simulations=400000, rng=np.random.default_rng(5), method='exact', **MARKET)
+        ST0, DP, RP, BaseER = deal['ST0'], deal['DP'], deal['RP'], deal['BaseER']
+
+        LB, UB = deal['FexLB'], deal['FexUB']
+        fex = monte_carlo_collar(x, np.clip(x, LB, UB) * BaseER, ST0, DP, RP, BaseER, (x >= LB) & (x <= UB))
+
+        LB, UB = deal['BaseP'] / deal['UR'], deal['BaseP'] / deal['LR']
+        PTT = np.where(x < LB, x * deal['UR'], np.where(x > UB, x * deal['LR'], deal['BaseP']))
+        fp = monte_carlo_collar(x, PTT, ST0, DP, RP, BaseER, (x >= LB) & (x <= UB))
+
+        for collar, mc in (('FEX', fex), ('FP', fp)):
+            for key, value in mc.items():
+                self.assertAlmostEqual(result[collar][key], value, delta=0.01, msg=(collar, key))
+
+
+class DistributionIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.x = np.sort(simulate_effective_prices(simulations=50000, rng=np.random.default_rng(11), method='exact', **MARKET))
+        self.index = DistributionIndex(self.x, is_sorted=True)
+
+    def test_statistics_match_boolean_masks(self):
+        x = self.x
+        ST0, DP, RP, BaseER = DEAL['ST0'], 0.2, 0.25, DEAL['BaseER']
+        LB, UB = 100.0, 108.0
+        INS = (x >= LB) & (x <= UB)
+        PTT = np.clip(x, LB, UB) * BaseER
+        WPTT = np.invert(INS) * np.maximum(ST0*(1+DP)-PTT,0)
+        WPBT = np.invert(INS) * np.maximum(PTT-ST0*(1+RP),0)
+
+        stats = collar_statistics(self.index, fex_segments(LB, UB, BaseER), ST0, DP, RP, BaseER)
+        expected = monte_carlo_collar(x, PTT, ST0, DP, RP, BaseER, INS)
+        for name, array in (('PTT', PTT), ('WPTT', WPTT), ('WPBT', WPBT)):
+            expected[name + 'mean'] = array.mean()
+            expected[name + 'std'] = array.std()
+            expected[name + 'min'] = array.min()
+            expected[name + 'max'] = array.max()
+        for key, value in expected.items():
+            self.assertAlmostEqual(stats[key], value, places=8, msg=key)
+
+    def test_grid_matches_single_calls(self):
+        ST0, DP, RP, BaseER = DEAL['ST0'], DEAL['DP'], DEAL['RP'], DEAL['BaseER']
+        LBs, UBs = np.linspace(90, 105, 4), np.linspace(100, 120, 5)
+        grid = fex_grid(self.index, LBs, UBs, ST0, DP, RP, BaseER)
+        self.assertEqual(grid['CVTT'].shape, (4, 5))
+        single = collar_statistics(self.index, fex_segments(LBs[2], UBs[3], BaseER), ST0, DP, RP, BaseER)
+        for key, value in single.items():
+            self.assertAlmostEqual(grid[key][2, 3], value, places=10, msg=key)
+        self.assertTrue(np.isnan(grid['CVTT'][3, 0])) # LB > UB
+
+        BaseP = DEAL['BaseP']
+        grid = fp_grid(self.index, [0.42, 0.45], [0.55, 0.58], BaseP, ST0, DP, RP, BaseER)
+        single = collar_statistics(self.index, fp_segments(BaseP, 0.45, 0.58), ST0, DP, RP, BaseER)
+        self.assertAlmostEqual(grid['Psuc'][1, 1], single['Psuc'])
+
+
+class SolverTests(SimpleTestCase):
+
+    def setUp(self):
+        self.inputs = dict(MARKET, **DEAL)
+
+    def test_symmetric_fex_hits_target_collar_value(self):
+        dist = build_distribution(self.inputs, 'analytic')
+        result = solve_bounds(dist, 'FEX', 'CVTT', -2.0, self.inputs)
+        self.assertAlmostEqual(result['stats']['CVTT'], -2.0, places=6)
+        self.assertAlmostEqual(result['FexLB'] + result['FexUB'], 2 * MARKET['SB0'])
+
+    def test_fp_solve_on_simulated_distribution(self):
+        dist = build_distribution(self.inputs, 'exact', 20000, np.random.default_rng(0))
+        result = solve_bounds(dist, 'FP', 'Psuc', 0.8, self.inputs, mode='LB')
+        self.assertAlmostEqual(result['stats']['Psuc'], 0.8, delta=1e-3)
+        self.assertAlmostEqual(result['UR'], DEAL['UR'])
+
+    def test_symmetric_band_centre(self):
+        dist = build_distribution(self.inputs, 'analytic')
+        result = solve_bounds(dist, 'FP', 'Psuc', 0.8, self.inputs)
+        self.assertAlmostEqual(result['stats']['Psuc'], 0.8, places=6)
+        self.assertAlmostEqual(result['LB'] + result['UB'], 2 * DEAL['BaseP'] / DEAL['BaseER'])
+        result = solve_bounds(dist, 'FEX', 'CVTT', -2.0, self.inputs, center=104.0)
+        self.assertAlmostEqual(result['FexLB'] + result['FexUB'], 208.0)
+        with self.assertRaises(SolverError):
+            solve_bounds(dist, 'FEX', 'CVTT', -2.0, self.inputs, center=0)
+
+    def test_unattainable_target_raises(self):
+        dist = build_distribution(self.inputs, 'analytic')
+        with self.assertRaises(SolverError):
+            solve_bounds(dist, 'FEX', 'Psuc', 1.5, self.inputs)
+
+
+class CacheTests(SimpleTestCase):
+
+    def test_key_is_canonical(self):
+        inputs = dict(MARKET, **DEAL)
+        reordered = dict(reversed(list(inputs.items())))
+        key = valuation_key(inputs, 'FEX', 1000, '7', 'path')
+        self.assertEqual(key, valuation_key(reordered, 'FEX', 1000, 7, 'path'))
+        self.assertNotEqual(key, valuation_key(inputs, 'FEX', 1000, 8, 'path'))
+        self.assertNotEqual(key, valuation_key(dict(inputs, FexLB=95.0), 'FEX', 1000, 7, 'path'))
+
+    def test_hits_and_misses_are_counted(self):
+        before = cache_stats()
+        key = valuation_key(dict(MARKET, **DEAL), 'FP', 10, 1, 'exact', test='counters')
+        self.assertIsNone(cache_get(key))
+        cache_set(key, {'stats': {'FpCVTT': 1.0}})
+        self.assertEqual(cache_get(key)['stats']['FpCVTT'], 1.0)
+        after = cache_stats()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+    @override_settings(VALUATION_CACHE_CHARTS=False)
+    def test_entries_without_charts_are_not_hits(self):
+        pipeline = ValuationPipeline(DEFAULT_INPUTS, 'FEX', 2000, seed=26, engine='exact')
+        render = lambda pipeline: ('script', 'div')
+        before = cache_stats()
+        for _ in range(2):
+            self.assertEqual(pipeline.charts(render), ('script', 'div'))
+        after = cache_stats()
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (0, 2))
+
+
+class PipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        self.inputs = dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590)
+
+    def test_changing_collar_terms_reuses_simulation(self):
+        first = ValuationPipeline(self.inputs, 'FEX', 2000, seed=21)
+        first.value()
+        self.assertEqual(first.reused, [])
+
+        bounds = ValuationPipeline(dict(self.inputs, FexLB=96.0), 'FEX', 2000, seed=21)
+        bounds.value()
+        self.assertEqual(bounds.reused, ['no_collar', 'simulate'])
+
+        premiums = ValuationPipeline(dict(self.inputs, DP=0.1), 'FEX', 2000, seed=21)
+        premiums.value()
+        self.assertEqual(premiums.reused, ['no_collar', 'payoff'])
+
+    def test_staged_statistics_match_single_pass(self):
+        pipeline = ValuationPipeline(self.inputs, 'FP', 2000, seed=22, engine='exact')
+        stats, _ = pipeline.value()
+        expected, _ = value_deal(pipeline.effective_prices(), self.inputs, collar_types=('FP',))
+        self.assertEqual(stats, expected)
+
+    def test_value_deal_shares_one_simulation(self):
+        pipeline = ValuationPipeline(self.inputs, 'FEX', 2000, engine='exact')
+        stats, _ = pipeline.value_deal()
+        expected, _ = value_deal(pipeline.effective_prices(), self.inputs)
+        self.assertEqual(stats, expected)
+
+
+class ApiTests(SimpleTestCase):
+
+    def test_valuation_returns_every_statistic(self):
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        response = self.client.post('/api/valuation', dict(form, seed=5, engine='exact'))
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['stats']
+        for name in ('NocPTTmean', 'FexCVTTTotal', 'FexWVBTRel', 'FpNetWV', 'FpPsuc'):
+            self.assertIn(name, stats)
+
+    def test_sketch_distribution_matches_array(self):
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        responses = [self.client.post('/api/valuation', dict(form, seed=5, engine='exact', distribution=distribution))
+                     for distribution in ('array', 'sketch')]
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        array, sketch = (response.json()['stats'] for response in responses)
+        for name in ('FexCVTT', 'FpPsuc'):
+            self.assertAlmostEqual(sketch[name], array[name], places=2)
+
+    @override_settings(SIMULATIONS=3000)
+    def test_views_share_the_simulations_setting(self):
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        for url in ('/api/valuation', '/compare'):
+            self.assertEqual(self.client.post(url, dict(form, seed=5)).json()['simulations'], 3000, msg=url)
+
+    def test_missing_field_is_rejected(self):
+        response = self.client.post('/api/valuation', {'bidderPriceBefore': 107.15})
+        self.assertEqual(response.status_code, 400)
+
+
+class InstrumentationTests(SimpleTestCase):
+
+    def setUp(self):
+        self.form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+
+    def test_stages_reach_header_and_metrics(self):
+        response = self.client.post('/api/valuation', dict(self.form, seed=22, engine='exact'))
+        timing = response['Server-Timing']
+        for stage in ('simulate', 'payoff', 'walkaway', 'total'):
+            self.assertIn(stage + ';dur=', timing)
+
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('collar_request_seconds_count{dtype="float64",engine="exact",view="api_valuation"}', text)
+        self.assertIn('collar_stage_seconds_bucket{dtype="float64",engine="exact",stage="simulate",le="+Inf"}', text)
+        self.assertIn('collar_paths_per_second{dtype="float64",engine="exact"}', text)
+
+    def test_labels_are_bounded_and_escaped(self):
+        self.client.post('/api/valuation', dict(self.form, seed=24, engine='bad"\nengine'))
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('collar_request_seconds_count{dtype="float64",engine="invalid",view="api_valuation"}', text)
+        self.assertNotIn('bad', text)
+        self.assertEqual(_format_labels((('view', 'a\\b"c\nd'),)), '{view="a\\\\b\\"c\\nd"}')
+
+    @override_settings(INSTRUMENTATION=False)
+    def test_off_adds_nothing(self):
+        response = self.client.post('/api/valuation', dict(self.form, seed=23, engine='exact'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertIs(stage_timer('simulate'), NO_TIMER)
+
+
+class LoadTestTests(SimpleTestCase):
+
+    def test_form_mix_is_reproducible_and_valid(self):
+        forms = form_mix(40, random_fraction=0.5, seed=3)
+        self.assertEqual(forms, form_mix(40, random_fraction=0.5, seed=3))
+        parsed = [QueryDict(body) for body in forms]
+        inputs = [parse_inputs(data) for data in parsed]
+        self.assertEqual({parse_names(data)['collar_type'] for data in parsed}, {'FEX', 'FP'})
+        defaults = sum(item == DEFAULT_INPUTS for item in inputs)
+        self.assertTrue(0 < defaults < 40)
+        self.assertTrue(all(item['avgper'] <= item['T'] and item['FexLB'] < item['FexUB'] for item in inputs))
+
+    def test_worker_memory_includes_descendants(self):
+        children = {1: [10, 20], 10: [11, 12], 12: [13]}
+        self.assertEqual(sorted(_descendants(10, children)), [11, 12, 13])
+        self.assertEqual(_descendants(20, children), [])
+
+    def test_summary_counts_errors_apart(self):
+        samples = [(i / 1000, 200, 5000) for i in range(1, 101)] + [(0.5, 500, 100), (1.0, None, 0)]
+        row = summarize(samples, 10.0)
+        self.assertEqual((row['requests'], row['errors']), (102, 2))
+        self.assertAlmostEqual(row['throughput'], 10.0)
+        self.assertAlmostEqual(row['p50_ms'], 50.5)
+        self.assertAlmostEqual(row['p99_ms'], 99.01)
+        self.assertEqual(row['mean_bytes'], 5000)
+
+
+class BatchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+
+    def test_deals_sharing_a_market_share_a_simulation(self):
+        deals = [self.form, dict(self.form, fexLB=96), {'bidderPriceBefore': 1}, dict(self.form, bidderPriceBefore=90)]
+        results = list(value_deals(deals, 2000, seed=4, engine='exact', window=3))
+        self.assertEqual([r['row'] for r in results], [1, 2, 3, 4])
+        self.assertTrue(results[2]['error'])
+        self.assertEqual(results[0]['SBTeff_mean'], results[1]['SBTeff_mean'])
+        self.assertNotEqual(results[0]['FexCVTT'], results[1]['FexCVTT'])
+        self.assertNotEqual(results[0]['SBTeff_mean'], results[3]['SBTeff_mean'])
+
+    def test_bad_rows_become_errors(self):
+        lines = [json.dumps(self.form) + '\n', '{"bidderPriceBefore": \n', '[1, 2]\n', json.dumps(self.form) + '\n']
+        results = list(value_deals(read_deals(lines, 'jsonl'), 2000, seed=4, engine='exact'))
+        self.assertEqual([bool(r['error']) for r in results], [False, True, True, False])
+
+        response = self.client.post('/batch?engine=fast', ''.join(lines), content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/batch?seed=x', ''.join(lines), content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/batch?seed=4&engine=exact', ''.join(lines), content_type='application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['row'] for row in rows], [1, 2, 3, 4])
+
+    def test_csv_round_trip(self):
+        header = ",".join(self.form)
+        lines = [header + "\n", ",".join(str(v) for v in self.form.values()) + "\n"]
+        output = list(write_results(value_deals(read_deals(lines, 'csv'), 2000, seed=4), 'csv'))
+        self.assertEqual(len(output), 2)
+        self.assertEqual(output[0].strip().split(",")[4:], stat_columns())
+
+
+class StreamingTests(SimpleTestCase):
+
+    def setUp(self):
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        self.query = dict(form, collarType='FEX', batchSize=2000, maxPaths=6000, seed=3, engine='exact')
+
+    def events(self, text):
+        return [block.split("\n") for block in text.strip().split("\n\n")]
+
+    def test_wsgi_stream_emits_one_event_per_batch(self):
+        response = self.client.get('/stream', self.query)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = self.events(b''.join(response.streaming_content).decode())
+        self.assertEqual([e[0] for e in events], ['event: estimate'] * 3 + ['event: done'])
+        done = json.loads(events[-1][1][len('data: '):])
+        self.assertEqual(done['paths'], 6000)
+        self.assertIn('ci_low', done['estimates']['FexCVTT'])
+
+    @override_settings(STREAM_MAX_PATHS=10000, STREAM_MAX_BATCH_SIZE=5000)
+    def test_oversized_stream_is_rejected(self):
+        for oversized in ({'maxPaths': 10001}, {'batchSize': 5001}):
+            self.assertEqual(self.client.get('/stream', dict(self.query, **oversized)).status_code, 400)
+        self.assertEqual(self.client.get('/stream', self.query).status_code, 200)
+
+    def test_asgi_stream_matches_wsgi_stream(self):
+        scope = {'type': 'http', 'method': 'GET', 'path': '/stream',
+                 'query_string': urlencode(self.query).encode()}
+        sent, received = [], []
+
+        async def receive():
+            if not received:
+                received.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.sleep(3600) # The client stays connected
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.get_event_loop().run_until_complete(stream_application(scope, receive, send))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertFalse(sent[-1]['more_body'])
+        body = b''.join(m.get('body', b'') for m in sent[1:]).decode()
+        wsgi = b''.join(self.client.get('/stream', self.query).streaming_content).decode()
+        strip = lambda text: [json.loads(e[1][6:])['estimates'] for e in self.events(text)]
+        self.assertEqual(strip(body), strip(wsgi))
+
+
+class CalibrationTests(TestCase):
+
+    def setUp(self):
+        # Four trades a day over 30 days; each day closes at 100 * 1.01**day
+        self.days = np.arange('2019-01-01', '2019-01-31', dtype='datetime64[D]')
+        self.closes = 100 * 1.01 ** np.arange(len(self.days)) * (1 + 0.02 * (np.arange(len(self.days)) % 2))
+        times = (self.days[:, None] + np.array([10, 12, 14, 16], dtype='timedelta64[h]')).ravel()
+        prices = np.column_stack([self.closes * 0.99, self.closes * 1.01, self.closes * 1.005, self.closes]).ravel()
+        self.history = np.zeros(len(times), dtype=[('time', 'datetime64[s]'), ('price', 'f8')])
+        self.history['time'] = times
+        self.history['price'] = prices
+        lines = ['Timestamp,Volume,Close'] + ['%s,100,%r' % (t, p) for t, p in zip(times.astype(str), prices)]
+        self.csv = ('\n'.join(lines) + '\n').encode()
+
+    def test_chunked_readers_keep_daily_closes(self):
+        with mock.patch('collar_app.calibration.CSV_CHUNK_BYTES', 100):
+            days, closes = read_closes(io.BytesIO(self.csv), 'trades.csv')
+        np.testing.assert_array_equal(days, self.days)
+        np.testing.assert_allclose(closes, self.closes)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trades.npy')
+            np.save(path, self.history)
+            with mock.patch('collar_app.calibration.NPY_CHUNK_ROWS', 7):
+                days, closes = read_closes(path)
+        np.testing.assert_array_equal(days, self.days)
+        np.testing.assert_allclose(closes, self.closes)
+
+    def test_estimators(self):
+        returns = self.closes[1:] / self.closes[:-1] - 1
+        RetB, StdB, n = estimate(self.closes)
+        self.assertAlmostEqual(RetB, returns.mean())
+        self.assertAlmostEqual(StdB, returns.std(ddof=1))
+        self.assertEqual(estimate(self.closes, 'rolling', window=10)[2], 10)
+        # A decay close to 1 weighs the returns almost equally
+        RetB, StdB, _ = estimate(self.closes, 'ewma', decay=0.999999)
+        self.assertAlmostEqual(RetB, returns.mean(), places=6)
+        self.assertAlmostEqual(StdB, returns.std(), places=6)
+
+    def test_stored_calibration_skips_the_history(self):
+        first = calibrate('dis', io.BytesIO(self.csv), 'trades.csv', since='2019-01-05', until='2019-01-20')
+        self.assertEqual((first.ticker, str(first.as_of), first.observations), ('DIS', '2019-01-20', 15))
+        again = calibrate('DIS', since='2019-01-05', until='2019-01-20')
+        self.assertEqual(again.pk, first.pk)
+        other = calibrate('DIS', io.BytesIO(self.csv), 'trades.csv', until='2019-01-20', estimator='ewma')
+        self.assertNotEqual(other.pk, first.pk)
+
+    def test_form_upload_replaces_the_stored_calibration(self):
+        form = {'calibrationTicker': 'DIS', 'calibrationUntil': '2019-01-20'}
+        first = calibrate_form(form, SimpleUploadedFile('trades.csv', self.csv))
+        flat = b'Date,Close\n' + b''.join(b'2019-01-%02d,%d\n' % (day, 100 + day % 2) for day in range(1, 21))
+        second = calibrate_form(form, SimpleUploadedFile('flat.csv', flat))
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertNotAlmostEqual(second.StdB, first.StdB)
+        self.assertEqual(calibrate_form(form).pk, second.pk) # Without an upload, the latest is reused
+
+    def test_malformed_uploads_are_bad_requests(self):
+        form = dict({field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}, bidderName='Disney',
+                    targetName='Fox', collarType='FEX', calibrationTicker='DIS')
+        uploads = [('trades.npy', b'\x93NUMPY not really'), ('trades.npy', b''), ('trades.csv', b'\xff\xfeDate,Close\n')]
+        for name, content in uploads:
+            response = self.client.post('/dashboard', dict(form, priceHistory=SimpleUploadedFile(name, content)))
+            self.assertEqual(response.status_code, 400, msg=name)
+            self.assertContains(response, 'Calibration failed', status_code=400)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage') # Nothing collected
+class JobTests(TestCase):
+
+    def test_submit_returns_before_valuing(self):
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        response = self.client.post('/jobs', dict(form, bidderName='Disney', targetName='Fox', collarType='FEX'))
+        self.assertEqual(response.status_code, 202)
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual((status['status'], status['progress']), ('queued', 0.0))
+
+    def test_worker_stores_results(self):
+        names = {'bidder_name': 'Disney', 'target_name': 'Fox', 'collar_type': 'FP'}
+        job = submit_job(DEFAULT_INPUTS, names, simulations=2000, seed=8, engine='exact')
+        claimed = claim_job('test')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(claim_job('test'))
+        run_job(claimed)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (ValuationJob.DONE, 100.0))
+        status = self.client.get('/jobs/%s' % job.pk).json()
+        self.assertIn('FpNetWV', status['stats'])
+        self.assertIn('FpCVTT', status['estimates'])
+        self.assertContains(self.client.get('/jobs/%s/result' % job.pk), 'Disney')
+
+    def test_progress_is_reported_per_chunk_and_on_cache_hits(self):
+        names = {'bidder_name': 'Disney', 'target_name': 'Fox', 'collar_type': 'FEX'}
+        job = submit_job(DEFAULT_INPUTS, names, simulations=30000, seed=9)
+        reported = []
+        progress = JobProgress(job, DEFAULT_INPUTS)
+        with mock.patch('collar_app.jobs.PROGRESS_INTERVAL', 0):
+            simulate_parallel(*[DEFAULT_INPUTS[name] for name in MARKET_INPUTS], 30000, seed=9,
+                              progress=lambda paths, block: reported.append(paths) or progress(paths, block))
+        self.assertEqual(reported, [10000, 20000, 30000])
+        self.assertEqual(ValuationJob.objects.get(pk=job.pk).paths_done, 30000)
+        job.delete()
+
+        first = submit_job(DEFAULT_INPUTS, names, simulations=2000, seed=10, engine='exact')
+        run_job(claim_job('test'))
+        again = submit_job(DEFAULT_INPUTS, names, simulations=2000, seed=10, engine='exact')
+        run_job(claim_job('test')) # Charts and statistics come from the caches
+        first.refresh_from_db()
+        again.refresh_from_db()
+        self.assertEqual(again.paths_done, 2000)
+        estimates, expected = json.loads(again.estimates)['FexCVTT'], json.loads(first.estimates)['FexCVTT']
+        self.assertAlmostEqual(estimates['estimate'], expected['estimate'])
+        self.assertAlmostEqual(estimates['stderr'], expected['stderr'])
+
+
+    @override_settings(SIMULATIONS=2000)
+    def test_deal_that_never_closes(self):
+        # A FEX collar above every bidder price: target walks away on every path, Psuc = 0
+        form = dict({field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}, fexLB=200, fexUB=210)
+        response = self.client.post('/api/valuation', dict(form, seed=25, engine='exact'))
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['stats']
+        self.assertEqual(stats['FexPsuc'], 0)
+        self.assertTrue(np.isnan(stats['FexWPPTT_Suc_min']) and np.isnan(stats['FexWPPTT_Suc_max']))
+        self.assertEqual(self.client.post('/compare', dict(form, seed=25)).status_code, 200)
+        self.assertFalse(next(value_deals([form], 2000, seed=25, engine='exact'))['error'])
+        names = dict(bidderName='Disney', targetName='Fox', collarType='FEX')
+        self.assertEqual(self.client.post('/dashboard', dict(form, seed=25, **names)).status_code, 200)
+
+        inputs = dict(DEFAULT_INPUTS, FexLB=200, FexUB=210)
+        job = submit_job(inputs, {'bidder_name': 'Disney', 'target_name': 'Fox', 'collar_type': 'FEX'},
+                         simulations=2000, seed=25, engine='exact')
+        run_job(claim_job('test'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ValuationJob.DONE)
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage') # Nothing collected
+class RunTests(TestCase):
+
+    def setUp(self):
+        self.pipeline = ValuationPipeline(DEFAULT_INPUTS, 'FEX', 3000, seed=12, engine='exact')
+        self.run = record_run(self.pipeline, {'bidder_name': 'Disney', 'target_name': 'Fox'}, 0.5)
+
+    def test_stored_run_revalues_without_simulating(self):
+        stored = run_pipeline(ValuationRun.objects.get(pk=self.run.pk))
+        stats, _ = stored.value()
+        self.assertNotIn('simulate', stored.timings)
+        self.assertAlmostEqual(stats['FexCVTT'], self.run.CVTT, places=4)
+        self.assertAlmostEqual(stats['FexPsuc'], self.run.Psuc, places=3)
+
+    def test_filters_and_views(self):
+        today = self.run.created.date().isoformat()
+        runs = ValuationRun.objects.all()
+        self.assertEqual(filter_runs(runs, {'bidder': 'Disney', 'since': today, 'until': today}).count(), 1)
+        self.assertEqual(filter_runs(runs, {'target': 'Pixar'}).count(), 0)
+        self.assertContains(self.client.get('/runs', {'bidder': 'Disney'}), '/runs/%d' % self.run.pk)
+        self.assertContains(self.client.get('/runs/%d' % self.run.pk), 'Disney')
+
+
+class PayoffKernelTests(SimpleTestCase):
+
+    def setUp(self):
+        self.inputs = dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590)
+        self.prices = np.sort(simulate_effective_prices(simulations=20000, rng=np.random.default_rng(30),
+                                                        method='exact', **MARKET))
+
+    def test_kernels_match_original_formulas(self):
+        S, d = self.prices, self.inputs
+        # FEX and FP payoffs as written in the original dashboard
+        LL, MU = S < d['FexLB'], S > d['FexUB']
+        INS = np.logical_and(S >= d['FexLB'], S <= d['FexUB'])
+        PTT = LL * (d['FexLB'] * d['BaseER']) + INS * (S * d['BaseER']) + MU * (d['FexUB'] * d['BaseER'])
+        ER = np.invert(INS) * (PTT / S) + INS * d['BaseER']
+        _, arrays = fex_payoff(S, d['NB0'], d['NT0'], d['ST0'], d['BaseER'], d['FexLB'], d['FexUB'], 0.0)
+        np.testing.assert_array_equal(arrays['PTT'], PTT)
+        np.testing.assert_array_equal(arrays['ER'], ER)
+        np.testing.assert_array_equal(arrays['Emission'], np.round(d['NT0'] * ER))
+
+        LB, UB = d['BaseP'] / d['UR'], d['BaseP'] / d['LR']
+        LL, MU = S < LB, S > UB
+        INS = np.logical_and(S >= LB, S <= UB)
+        PTT = LL * (S * d['UR']) + INS * d['BaseP'] + MU * (S * d['LR'])
+        _, arrays = fp_payoff(S, d['NB0'], d['NT0'], d['ST0'], d['BaseP'], d['LR'], d['UR'], 0.0)
+        np.testing.assert_array_equal(arrays['PTT'], PTT)
+        np.testing.assert_array_equal(arrays['OUT'], np.invert(INS))
+
+        WPTT = np.invert(INS) * np.maximum(d['ST0'] * (1 + d['DP']) - PTT, 0)
+        WPBT = np.invert(INS) * np.maximum(PTT - d['ST0'] * (1 + d['RP']), 0)
+        IfDS = np.invert(np.maximum(WPTT > 0, WPBT > 0))
+        stats, arrays = walkaway(PTT, np.invert(INS), d['NT0'], d['ST0'], d['DP'], d['RP'])
+        self.assertEqual(stats['SuccessfulDealsNumber'], len(IfDS[IfDS == 1]))
+        self.assertAlmostEqual(stats['WVTT'], np.mean(WPTT))
+        WPPTT = PTT * IfDS
+        np.testing.assert_array_equal(arrays['WPPTT_Suc'], WPPTT[WPPTT > 0])
+
+    def test_float32_mode_is_close_and_smaller(self):
+        stats64, _ = value_deal(self.prices, self.inputs)
+        tracemalloc.start()
+        stats32, _ = value_deal(self.prices.astype(np.float32), self.inputs)
+        peak32 = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        for name in ('FexCVTT', 'FexWVTT', 'FpNetWV', 'FpPsuc'):
+            self.assertAlmostEqual(stats32[name], stats64[name], places=3)
+        # Both collars, about 45 bytes per simulation each in float32
+        self.assertLess(peak32, 100 * len(self.prices))
+
+
+class SensitivityTests(SimpleTestCase):
+
+    def setUp(self):
+        self.inputs = dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590)
+
+    def test_deltas_match_analytic_differences(self):
+        result = sensitivities(self.inputs, ('SB0', 'StdB', 'T'), ('FEX',), simulations=40000, seed=17)
+        exact = analytic_valuation(**MARKET, **DEAL)['FEX']
+        base = result['base']['FexCVTT']
+        self.assertLess(abs(base - exact['CVTT']), 4 * result['base_stderr']['FexCVTT'])
+        other = sensitivities(self.inputs, ('RetB',), ('FEX',), simulations=40000, seed=17, tornado_bump=0.3)
+        self.assertEqual(other['base']['FexCVTT'], base) # The same seed gives the same base
+        for name in ('SB0', 'StdB'):
+            h = result['sensitivities'][name]['bump']
+            up = analytic_valuation(**dict(MARKET, **{name: MARKET[name] + h}), **DEAL)['FEX']['CVTT']
+            down = analytic_valuation(**dict(MARKET, **{name: MARKET[name] - h}), **DEAL)['FEX']['CVTT']
+            estimate = result['sensitivities'][name]['FexCVTT']
+            self.assertLess(abs(estimate['delta'] - (up - down) / (2 * h)), 4 * estimate['delta_stderr'] + 1e-3)
+
+    def test_bumps_must_be_positive(self):
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        for bump in ({'bump': 0}, {'tornadoBump': -0.1}, {'bump': 'nan'}):
+            self.assertEqual(self.client.post('/sensitivity', dict(form, **bump)).status_code, 400)
+
+    def test_out_of_range_window_averages_the_whole_path(self):
+        whole = sensitivities(dict(self.inputs, avgper=MARKET['T']), ('SB0',), ('FEX',), simulations=2000, seed=19)
+        for avgper in (0, MARKET['T'] + 10):
+            result = sensitivities(dict(self.inputs, avgper=avgper), ('SB0',), ('FEX',), simulations=2000, seed=19)
+            self.assertEqual(result['base'], whole['base'])
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        with override_settings(SIMULATIONS=2000):
+            response = self.client.post('/sensitivity', dict(form, avgPer=0))
+        self.assertEqual(response.status_code, 200)
+        json.loads(response.content.decode(), parse_constant=self.fail) # No NaN in the body
+
+    def test_tornado_is_sorted_by_swing(self):
+        result = sensitivities(self.inputs, simulations=5000, seed=18)
+        for metric in ('FexCVTT', 'FexNetWV', 'FpCVTT', 'FpNetWV'):
+            swings = [bar['swing'] for bar in result['tornado'][metric]]
+            self.assertEqual(swings, sorted(swings, reverse=True))
+            self.assertEqual(len(swings), 5)
+
+
+class ComparisonTests(SimpleTestCase):
+
+    def setUp(self):
+        self.inputs = dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590)
+        self.prices = simulate_effective_prices(simulations=5000, rng=np.random.default_rng(40), **MARKET)
+
+    def test_structures_share_one_array(self):
+        variants = parse_variants('[{"name": "Wide FEX", "collarType": "FEX", "fexLB": "90", "fexUB": "118"}]')
+        rows = compare_structures(self.prices, self.inputs, variants)
+        self.assertEqual([row['name'] for row in rows], ['No collar', 'FEX', 'FP', 'Wide FEX'])
+        stats, _ = value_deal(self.prices, self.inputs)
+        self.assertEqual(rows[1]['CVTT'], stats['FexCVTT'])
+        self.assertEqual(rows[2]['Psuc'], stats['FpPsuc'])
+        self.assertEqual(rows[3]['LB'], 90.0)
+        self.assertEqual(rows[0]['StakeOfTarget_min'], rows[0]['StakeOfTarget_max'])
+
+    def test_variants_cannot_change_market_inputs(self):
+        with self.assertRaises(InputError):
+            parse_variants('[{"collarType": "FEX", "bidderDailyStd": "0.02"}]')
+
+    def test_malformed_variants_are_rejected(self):
+        for raw in ('[1]', '[{"collarType": "FEX", "fexLB": "120"}]', '[{"collarType": "FP", "LR": "0"}]',
+                    '[{"collarType": "FP", "LR": "0.9", "UR": "0.8"}]'):
+            with self.assertRaises(InputError, msg=raw):
+                parse_variants(raw, self.inputs)
+
+
+class PriceSketchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.inputs = dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590)
+
+    def test_sketch_statistics_match_full_sample(self):
+        sketch = simulate_sketch(simulations=60000, seed=50, method='exact', **MARKET)
+        prices = simulate_parallel(simulations=60000, seed=50, method='exact', **MARKET)
+        self.assertEqual(sketch.n, 60000)
+        self.assertAlmostEqual(sketch.mean, prices.mean())
+
+        index = DistributionIndex(prices)
+        for lo, hi in ((94.0, 114.0), (-np.inf, 100.0), (101.3, 101.4)):
+            self.assertLessEqual(abs(sketch.prob(lo, hi) - index.prob(lo, hi)), sketch.interval_error(lo, hi) + 1e-12)
+
+        stats = sketch_statistics(sketch, self.inputs)
+        expected, _ = value_deal(prices, self.inputs)
+        for name in ('FexCVTT', 'FexWVTT', 'FpNetWV', 'FpPsuc', 'FexPTTstd'):
+            self.assertAlmostEqual(stats[name], expected[name], places=3)
+
+    def test_storage_is_constant_and_round_trips(self):
+        small = PriceSketch.for_market(**MARKET)
+        small.update(simulate_effective_prices(simulations=1000, rng=np.random.default_rng(1), **MARKET))
+        large = PriceSketch.for_market(**MARKET)
+        large.update(simulate_effective_prices(simulations=100000, rng=np.random.default_rng(1), **MARKET))
+        self.assertEqual(len(small.count), len(large.count))
+
+        restored = PriceSketch.from_bytes(large.to_bytes())
+        self.assertEqual(restored.n, large.n)
+        np.testing.assert_array_equal(restored.sample(500), large.sample(500))
+        hist, edges = restored.histogram(50)
+        self.assertAlmostEqual(np.sum(hist * np.diff(edges)), 1.0)
+
+
+class VarianceReductionTests(SimpleTestCase):
+
+    def test_schemes_are_unbiased_and_reduce_error(self):
+        inputs = dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590)
+        exact = analytic_valuation(**MARKET, **DEAL)['FEX']
+        results = compare_schemes(inputs, 'FEX', simulations=40000, seed=5, method='exact')
+        self.assertEqual(set(results), {'plain', 'antithetic', 'control', 'sobol'})
+        for scheme, result in results.items():
+            for metric in METRICS:
+                error = abs(result[metric]['estimate'] - exact[metric])
+                self.assertLess(error, 5 * result[metric]['stderr'] + 1e-9, msg=(scheme, metric))
+        self.assertGreater(results['control']['CVTT']['efficiency'], 1)
+        self.assertGreater(results['sobol']['CVTT']['efficiency'], 10)
+
+    def test_engine_schemes_reach_the_pipeline_and_views(self):
+        mean, _ = effective_price_moments(**MARKET)
+        for method in ('path', 'exact'):
+            prices = simulate_effective_prices(simulations=3000, rng=np.random.default_rng(6), method=method,
+                                               scheme='moment', **MARKET)
+            self.assertAlmostEqual(prices.mean(), mean)
+        with self.assertRaises(ValueError): # The regression estimator has no engine draws of its own
+            simulate_effective_prices(simulations=10, method='exact', scheme='control', **MARKET)
+        with self.assertRaises(ValueError):
+            simulate_effective_prices(simulations=10, method='path', scheme='sobol', **MARKET)
+
+        inputs = dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590)
+        plain = ValuationPipeline(inputs, 'FEX', 2000, seed=7, engine='exact')
+        sobol = ValuationPipeline(inputs, 'FEX', 2000, seed=7, engine='exact', scheme='sobol')
+        self.assertNotEqual(plain._key('simulate', MARKET_INPUTS), sobol._key('simulate', MARKET_INPUTS))
+
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        response = self.client.post('/api/valuation', dict(form, seed=8, engine='exact', scheme='sobol'))
+        self.assertEqual(response.json()['scheme'], 'sobol')
+        response = self.client.post('/adaptive', dict(form, seed=8, scheme='antithetic', maxPaths=20000))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/stream', dict(form, scheme='sobol'))
+        self.assertEqual(response.status_code, 400) # Sobol' points need the exact engine
+        response = self.client.post('/adaptive', dict(form, seed=8, scheme='moment', maxPaths=20000))
+        self.assertEqual(response.status_code, 400) # Shifted draws give no valid standard errors
+
+
+class AdaptiveTests(SimpleTestCase):
+
+    def setUp(self):
+        self.inputs = dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590)
+
+    def test_running_moments_match_batch_statistics(self):
+        values = np.random.default_rng(0).normal(size=1003)
+        moments = RunningMoments()
+        for batch in np.array_split(values, 7):
+            moments.update(batch)
+        self.assertAlmostEqual(moments.mean, values.mean())
+        self.assertAlmostEqual(moments.stderr, values.std(ddof=1) / np.sqrt(len(values)))
+
+    def test_stops_at_tolerance(self):
+        result = adaptive_valuation(self.inputs, ('FexCVTT', 'FexPsuc'), tolerance=0.05,
+                                    batch_size=5000, seed=3, method='exact')
+        self.assertEqual(result['stopped_by'], 'tolerance')
+        self.assertLessEqual(result['estimates']['FexCVTT']['stderr'], 0.05)
+        self.assertLess(result['paths'], 50000)
+        exact = analytic_valuation(**MARKET, **DEAL)['FEX']
+        estimate = result['estimates']['FexCVTT']
+        self.assertLess(abs(estimate['estimate'] - exact['CVTT']), 3 * estimate['stderr'])
+
+    @override_settings(ADAPTIVE_MAX_PATHS=6000, ADAPTIVE_MAX_SECONDS=30)
+    def test_view_caps_budgets(self):
+        form = {field: DEFAULT_INPUTS[name] for name, field, _ in FIELDS}
+        response = self.client.post('/adaptive', dict(form, tolerance=1e-9, maxPaths=10**9, seed=3, engine='exact'))
+        self.assertEqual((response.json()['stopped_by'], response.json()['paths']), ('paths', 6000))
+        self.assertEqual(self.client.post('/adaptive', dict(form, maxSeconds=0)).status_code, 400)
+
+    def test_path_budget_is_respected(self):
+        result = adaptive_valuation(self.inputs, ('FpCVTT',), tolerance=1e-9, batch_size=3000,
+                                    max_paths=7000, seed=3, method='exact')
+        self.assertEqual((result['stopped_by'], result['paths']), ('paths', 7000))
+
+
+class BenchmarkTests(SimpleTestCase):
+
+    def test_time_case_times_requested_stages(self):
+        timings = time_case(2000, 30, 5, stages=('paths', 'fex_payoff', 'walkaway'), repeat=1)
+        self.assertEqual(set(timings), {'paths', 'fex_payoff', 'walkaway'})
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+    def test_regressions_against_history(self):
+        history = [{'host': 'a', 'results': {'1000/30/5': {'paths': seconds, 'walkaway': 0.001}}}
+                   for seconds in (0.10, 0.11, 0.09)]
+        history.append({'host': 'b', 'results': {'1000/30/5': {'paths': 1.0}}})
+        results = {'1000/30/5': {'paths': 0.2, 'walkaway': 0.002}, '2000/30/5': {'paths': 0.5}}
+        found = regressions(results, history, host='a', threshold=0.25)
+        # walkaway doubled but by less than MIN_REGRESSION; the new case has no baseline
+        self.assertEqual([(item['case'], item['stage']) for item in found], [('1000/30/5', 'paths')])
+        self.assertAlmostEqual(found[0]['baseline'], 0.10)
+        self.assertEqual(regressions(results, history, host='b'), [])
+
+    def test_regressed_run_is_not_recorded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.json')
+            baseline = history_entry({'20000/183/5': {'paths': 1e-6}}) # Far faster than any real run
+            save_history(path, [baseline])
+            options = dict(simulations=[20000], days=[183], avgper=[5], stages=['paths'], repeat=1,
+                           history=path, stdout=io.StringIO(), stderr=io.StringIO())
+            with self.assertRaises(CommandError):
+                call_command('benchmark', **options)
+            self.assertEqual(len(load_history(path)), 1)
+            with self.assertRaises(CommandError):
+                call_command('benchmark', record=True, **options)
+            self.assertEqual(len(load_history(path)), 2)
+
+    def test_faster_engines_match_reference(self):
+        rows = check_engines(dict(MARKET, **DEAL, NB0=1490776763, NT0=1383004590), simulations=20000, seed=4,
+                             engines=('exact', 'workers', 'float32', 'sketch', 'analytic'))
+        self.assertEqual(len(rows), 5 * 8)
+        self.assertTrue(all(row['ok'] for row in rows), [row for row in rows if not row['ok']])
+
+
+class ChartDataTests(SimpleTestCase):
+
+    def test_downsampled_curve_keeps_kinks(self):
+        x = np.sort(np.random.default_rng(5).normal(104, 9, 100000))
+        y = np.clip(x, 94, 114) * 0.5
+        xs, ys = downsample_curve(x, y, (94, 114), n_out=300)
+        self.assertLess(len(xs), 310)
+        self.assertEqual((xs[0], xs[-1]), (x[0], x[-1]))
+        i = np.searchsorted(x, 114)
+        self.assertIn(x[i - 1], xs)
+        self.assertIn(x[i], xs)
+        self.assertTrue(np.all(np.diff(xs) >= 0))
+        np.testing.assert_allclose(np.interp(x, xs, ys), y, atol=0.01)
+
+    def test_histogram_bins_are_capped(self):
+        hist, edges = histogram(np.arange(100000.0), 100000)
+        self.assertEqual(len(hist), MAX_BINS)
@@ -3,5 +3,19 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
-    path('dashboard', views.dashboard, name='dashboard')
+    path('dashboard', views.dashboard, name='dashboard'),
+    path('solve', views.solve, name='solve'),
+    path('adaptive', views.adaptive, name='adaptive'),
+    path('api/valuation', views.api_valuation, name='api_valuation'),
+    path('batch', views.batch, name='batch'),
+    path('compare', views.compare, name='compare'),
+    path('sensitivity', views.sensitivity, name='sensitivity'),
+    path('stream', views.stream, name='stream'),
+    path('jobs', views.jobs, name='jobs'),
+    path('jobs/<uuid:job_id>', views.job_detail, name='job_status'),
+    path('jobs/<uuid:job_id>/result', views.job_result, name='job_result'),
+    path('runs', views.runs, name='runs'),
+    path('runs/<int:run_id>', views.run_detail, name='run_detail'),
+    path('cache/stats', views.cache_status, name='cache_status'),
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
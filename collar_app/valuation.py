@@ -0,0 +1,220 @@
+"""Monte Carlo statistics of a deal, computed from the effective-price array.
+
+These are the back-end calculations of the dashboard (sections 2 to 6), split
+by section so callers can compute only what they need. Statistics are
+returned as dicts of scalars keyed by the names used in the dashboard; arrays
+needed for charts are returned separately.
+
+The payoff kernels fill preallocated buffers in place (``np.clip``,
+``np.copyto`` and ufuncs with ``out=``/``where=``) instead of building each
+formula from temporary arrays. Buffers take the dtype of the effective
+prices, so passing a float32 array halves the memory (see the pipeline's
+``VALUATION_FLOAT32`` setting); means and deviations are still accumulated in
+float64. Peak memory for ``n`` simulations and one collar type, in bytes per
+simulation (float64 / float32 prices):
+
+- no collar: ``NocPTT``, 8 / 4;
+- collar payoff: ``PTT``, ``ER``, ``Emission`` and ``StakeOfTarget`` plus the
+  ``OUT`` flags, 33 / 17, and 3 bytes of masks while they are built;
+- walkaway: ``WPTT``, ``WPBT`` and three flag arrays while it runs, 19 / 11,
+  then ``WPPTT_Suc``, at most 8 / 4;
+- one float64 temporary inside ``np.std``, 8.
+
+That is about 80 bytes per simulation in float64 and 45 in float32, on top
+of the effective prices. The collar sections of the original dashboard held
+over a dozen temporaries at once.
+"""
+import numpy as np
+
+COLLAR_PREFIXES = {'FEX': 'Fex', 'FP': 'Fp'}
+
+
+def _mean(x):
+    return np.mean(x, dtype=np.float64)
+
+
+def _std(x):
+    return np.std(x, dtype=np.float64)
+
+
+def no_collar(SBTeff_array, BaseER):
+
+    # SECTION 2. A DEAL WITHOUT A COLLAR
+    NocPTT = np.multiply(SBTeff_array, BaseER) # Array of payoffs per target share
+
+    # Statistics of the payoff follow from those of the price, without more passes over NocPTT
+    SBTeff_mean = _mean(SBTeff_array)
+    SBTeff_std = _std(SBTeff_array)
+    bounds = sorted((np.min(SBTeff_array) * BaseER, np.max(SBTeff_array) * BaseER))
+
+    stats = {
+        'SBTeff_mean': SBTeff_mean,
+        'SBTeff_std': SBTeff_std,
+        'NocPTTmean': SBTeff_mean * BaseER,
+        'NocPTTstd': SBTeff_std * abs(BaseER),
+        'NocPTTmin': bounds[0],
+        'NocPTTmax': bounds[1],
+    }
+    return stats, NocPTT
+
+
+def _interval_masks(SBTeff_array, LB, UB):
+    # Bool arrays: below the interval, above it, and outside it
+    LL = np.less(SBTeff_array, LB)
+    MU = np.greater(SBTeff_array, UB)
+    OUT = np.logical_or(LL, MU)
+    return LL, MU, OUT
+
+
+def fex_payoff(SBTeff_array, NB0, NT0, ST0, BaseER, FexLB, FexUB, NocPTTmean):
+
+    # SECTION 3. DEAL WITH FEX COLLAR
+    _, _, FexOUT = _interval_masks(SBTeff_array, FexLB, FexUB)
+
+    FexPTT = np.clip(SBTeff_array, FexLB, FexUB) # Bidder price held inside the interval...
+    FexPTT *= BaseER # ...times the base ratio: array of payoffs per target share
+
+    FexER = np.empty_like(FexPTT) # Array of exchange ratios
+    FexER.fill(BaseER) # Base ratio inside the interval
+    np.divide(FexPTT, SBTeff_array, out=FexER, where=FexOUT) # Adjusted ratio outside it
+
+    return _payoff_stats(FexLB, FexUB, FexPTT, FexOUT, FexER, NB0, NT0, ST0, NocPTTmean)
+
+
+def fp_payoff(SBTeff_array, NB0, NT0, ST0, BaseP, LR, UR, NocPTTmean):
+
+    # SECTION 5. DEAL WITH FP COLLAR
+    FpLB = BaseP / UR
+    FpUB = BaseP / LR
+
+    FpLL, FpMU, FpOUT = _interval_masks(SBTeff_array, FpLB, FpUB)
+
+    FpPTT = np.empty_like(SBTeff_array) # Array of payoffs per target share
+    FpPTT.fill(BaseP) # Fixed price inside the interval
+    np.multiply(SBTeff_array, UR, out=FpPTT, where=FpLL) # Upper ratio below it
+    np.multiply(SBTeff_array, LR, out=FpPTT, where=FpMU) # Lower ratio above it
+    del FpLL, FpMU
+
+    FpER = np.divide(FpPTT, SBTeff_array) # Array of exchange ratios
+
+    return _payoff_stats(FpLB, FpUB, FpPTT, FpOUT, FpER, NB0, NT0, ST0, NocPTTmean)
+
+
+def _payoff_stats(LB, UB, PTT, OUT, ER, NB0, NT0, ST0, NocPTTmean):
+    # Statistics shared by both collar types
+    Emission = np.multiply(ER, NT0)
+    np.round(Emission, out=Emission) # Array of emission volumes
+    StakeOfTarget = np.add(Emission, NB0)
+    np.divide(Emission, StakeOfTarget, out=StakeOfTarget) # Array of target stakes
+
+    PTTmean = _mean(PTT)
+    CVTT = PTTmean - NocPTTmean # Value of collar agreement to target
+
+    stats = {
+        'LB': LB,
+        'UB': UB,
+        'PTTmean': PTTmean,
+        'PTTstd': _std(PTT),
+        'PTTmin': np.min(PTT),
+        'PTTmax': np.max(PTT),
+        'CVTT': CVTT,
+        'CVTTTotal': CVTT * NT0, # Value to whole equity
+        'CVTTRel': CVTT / ST0, # Value as % of pre-announcement price
+    }
+    arrays = {
+        'PTT': PTT,
+        'OUT': OUT,
+        'ER': ER,
+        'Emission': Emission,
+        'StakeOfTarget': StakeOfTarget,
+    }
+    return stats, arrays
+
+
+def walkaway_payoffs(PTT, OUT, ST0, DP, RP):
+
+    # SECTIONS 4 AND 6. COLLAR + WALKAWAY PROVISION
+    WPTT = np.subtract(ST0*(1+DP), PTT)
+    np.maximum(WPTT, 0, out=WPTT)
+    np.multiply(WPTT, OUT, out=WPTT) # Array of option payoffs to target
+    IfTC = np.greater(WPTT, 0) # Bool array: 1 if target cancelled, 0 if not
+
+    WPBT = np.subtract(PTT, ST0*(1+RP))
+    np.maximum(WPBT, 0, out=WPBT)
+    np.multiply(WPBT, OUT, out=WPBT) # Array of option payoffs to bidder
+
+    IfDS = np.greater(WPBT, 0) # 1 if bidder cancelled...
+    np.logical_or(IfDS, IfTC, out=IfDS) # ...or target did: the deal stops
+    np.logical_not(IfDS, out=IfDS) # Bool array: 1 if the deal succeeds
+
+    return WPTT, WPBT, IfDS
+
+
+def walkaway(PTT, OUT, NT0, ST0, DP, RP):
+
+    WPTT, WPBT, IfDS = walkaway_payoffs(PTT, OUT, ST0, DP, RP)
+
+    SuccessfulDealsNumber = int(np.count_nonzero(IfDS))
+    Psuc = SuccessfulDealsNumber / len(PTT)
+
+    WVTT = _mean(WPTT) # Average option payoff among simulations
+    WVBT = _mean(WPBT) # Average option payoff among simulations
+    del WPTT, WPBT
+
+    Closed = np.greater(PTT, 0) # Positive payoff...
+    np.logical_and(Closed, IfDS, out=Closed) # ...in a deal that was not cancelled
+    WPPTT_Suc = PTT[Closed] # Payoff ONLY in closed deals
+    del Closed
+
+    stats = {
+        'SuccessfulDealsNumber': SuccessfulDealsNumber,
+        'Psuc': Psuc,
+        # Undefined (NaN) when no deal closes, as in the closed-form engine
+        'WPPTT_Suc_mean': _mean(WPPTT_Suc) if len(WPPTT_Suc) else np.nan,
+        'WPPTT_Suc_std': _std(WPPTT_Suc) if len(WPPTT_Suc) else np.nan,
+        'WPPTT_Suc_min': np.min(WPPTT_Suc) if len(WPPTT_Suc) else np.nan,
+        'WPPTT_Suc_max': np.max(WPPTT_Suc) if len(WPPTT_Suc) else np.nan,
+        'WVTT': WVTT,
+        'WVTTTotal': WVTT * NT0, # For the whole equity
+        'WVTTRel': WVTT / ST0, # As % of pre-announcement price
+        'WVBT': WVBT,
+        'WVBTTotal': WVBT * NT0, # For the whole equity
+        'WVBTRel': WVBT / (ST0 * (1+RP)), # As % of investment value
+        'NetWV': WVTT - WVBT, # Net walkaway value to target
+    }
+    arrays = {
+        'WPPTT_Suc': WPPTT_Suc,
+    }
+    return stats, arrays
+
+
+def collar_payoff(collar_type, SBTeff_array, inputs, NocPTTmean):
+    if collar_type == 'FEX':
+        return fex_payoff(SBTeff_array, inputs['NB0'], inputs['NT0'], inputs['ST0'],
+                          inputs['BaseER'], inputs['FexLB'], inputs['FexUB'], NocPTTmean)
+    return fp_payoff(SBTeff_array, inputs['NB0'], inputs['NT0'], inputs['ST0'],
+                     inputs['BaseP'], inputs['LR'], inputs['UR'], NocPTTmean)
+
+
+def value_deal(SBTeff_array, inputs, collar_types=('FEX', 'FP')):
+    """All statistics of the deal for the given collar types.
+
+    Returns ``(stats, arrays)``: ``stats`` holds the no-collar statistics
+    plus each collar's statistics under its ``Fex``/``Fp`` prefix (``FexCVTT``,
+    ``FpNetWV``, ...); ``arrays`` maps each collar type to its chart arrays and
+    ``'NOC'`` to the no-collar payoffs.
+    """
+    stats, NocPTT = no_collar(SBTeff_array, inputs['BaseER'])
+    arrays = {'NOC': {'PTT': NocPTT}}
+
+    for collar_type in collar_types:
+        prefix = COLLAR_PREFIXES[collar_type]
+        payoff_stats, collar_arrays = collar_payoff(collar_type, SBTeff_array, inputs, stats['NocPTTmean'])
+        walkaway_stats, walkaway_arrays = walkaway(collar_arrays['PTT'], collar_arrays['OUT'],
+                                                   inputs['NT0'], inputs['ST0'], inputs['DP'], inputs['RP'])
+        collar_arrays.update(walkaway_arrays)
+        arrays[collar_type] = collar_arrays
+        for key, value in dict(payoff_stats, **walkaway_stats).items():
+            stats[prefix + key] = value
+
+    return stats, arrays
@@ -0,0 +1,132 @@
+"""Variance-reduced Monte Carlo estimates of collar and walkaway values.
+
+Schemes, drawn by the engine's ``scheme`` option except ``'control'``:
+
+- ``'plain'``: independent draws, as in the dashboard;
+- ``'antithetic'``: every normal draw is reused negated and the estimate
+  averages over pairs;
+- ``'control'``: the no-collar payoff ``NocPTT`` is a control variate, since
+  its expectation ``BaseER * E[SBTeff]`` is known in closed form. Estimates
+  here fit its coefficient per metric by regression on plain draws. The
+  engine's ``'moment'`` scheme fixes that coefficient at one for every
+  metric; its shifted draws are not independent, so it has no estimator
+  here;
+- ``'sobol'``: randomized quasi-Monte Carlo. Only the exact engine is
+  supported: it needs a single normal per simulation, and a one-dimensional
+  Sobol' sequence is the van der Corput sequence, which is randomized here by
+  a random digital shift. Standard errors come from independent replicates.
+
+Every scheme reports the estimate and its standard error for ``CVTT``,
+``WVTT``, ``WVBT`` and ``Psuc``.
+"""
+import numpy as np
+
+from .engine import effective_price_moments, simulate_effective_prices
+from .inputs import MARKET_INPUTS
+from .valuation import collar_payoff, walkaway_payoffs
+
+SCHEMES = ('plain', 'antithetic', 'control', 'sobol')
+METRICS = ('CVTT', 'WVTT', 'WVBT', 'Psuc')
+SOBOL_REPLICATES = 16
+
+
+def metric_samples(SBTeff_array, inputs, collar_type):
+    """Per-simulation contributions to each metric, plus ``NocPTT``."""
+    NocPTT = SBTeff_array * inputs['BaseER']
+    _, arrays = collar_payoff(collar_type, SBTeff_array, inputs, 0.0)
+    PTT = arrays['PTT']
+    WPTT, WPBT, IfDS = walkaway_payoffs(PTT, arrays['OUT'], inputs['ST0'], inputs['DP'], inputs['RP'])
+    samples = {
+        'CVTT': PTT - NocPTT,
+        'WVTT': WPTT,
+        'WVBT': WPBT,
+        'Psuc': IfDS.astype(float),
+    }
+    return samples, NocPTT
+
+
+def sampling_scheme(scheme):
+    """Engine scheme drawing the prices of ``scheme``: control draws plain prices and regresses."""
+    return 'plain' if scheme == 'control' else scheme
+
+
+def unit_samples(SBTeff_array, inputs, collar_type, scheme='plain'):
+    """Independent contributions to each metric of prices drawn under ``scheme``.
+
+    Units are simulations, except antithetic pairs, which are averaged.
+    Under ``'control'`` each metric is adjusted by its regression on the
+    no-collar payoff. Sobol' points are stratified, so the standard error
+    of their mean taken as independent overstates the actual one.
+    """
+    samples, NocPTT = metric_samples(SBTeff_array, inputs, collar_type)
+    if scheme == 'antithetic':
+        k = len(SBTeff_array) // 2
+        return {metric: 0.5 * (y[0:2 * k:2] + y[1:2 * k:2]) for metric, y in samples.items()}
+    if scheme == 'control':
+        market = [inputs[name] for name in MARKET_INPUTS]
+        C = NocPTT - inputs['BaseER'] * effective_price_moments(*market)[0]
+        varC = np.var(C, ddof=1)
+        adjusted = {}
+        for metric, y in samples.items():
+            beta = np.cov(y, C)[0, 1] / varC if varC > 0 else 0.0
+            adjusted[metric] = y - beta * C
+        return adjusted
+    return samples
+
+
+def _summary(estimate, stderr):
+    return {'estimate': estimate, 'stderr': stderr}
+
+
+def estimate(inputs, collar_type, scheme='plain', simulations=100000, rng=None, method='path'):
+    """Estimates and standard errors of ``METRICS`` under ``scheme``."""
+    if scheme not in SCHEMES:
+        raise ValueError("Unknown variance-reduction scheme: %s" % scheme)
+    if rng is None:
+        rng = np.random.default_rng()
+    market = [inputs[name] for name in MARKET_INPUTS]
+    result = {'scheme': scheme, 'paths': simulations}
+
+    if scheme == 'sobol':
+        n = max(1, simulations // SOBOL_REPLICATES)
+        replicates = {metric: [] for metric in METRICS}
+        for r in range(SOBOL_REPLICATES):
+            SBTeff_array = simulate_effective_prices(*market, n, rng=rng, method=method, scheme='sobol')
+            samples, _ = metric_samples(SBTeff_array, inputs, collar_type)
+            for metric in METRICS:
+                replicates[metric].append(samples[metric].mean())
+        for metric in METRICS:
+            values = np.array(replicates[metric])
+            result[metric] = _summary(values.mean(), values.std(ddof=1) / np.sqrt(len(values)))
+        result['paths'] = n * SOBOL_REPLICATES
+        return result
+
+    SBTeff_array = simulate_effective_prices(*market, simulations, rng=rng, method=method,
+                                             scheme=sampling_scheme(scheme))
+    samples = unit_samples(SBTeff_array, inputs, collar_type, scheme)
+    for metric in METRICS:
+        y = samples[metric]
+        result[metric] = _summary(y.mean(), y.std(ddof=1) / np.sqrt(len(y)))
+    return result
+
+
+def compare_schemes(inputs, collar_type, simulations=100000, seed=None, method='exact'):
+    """Run every applicable scheme on the same budget.
+
+    Adds ``efficiency`` to each metric: the plain variance divided by the
+    scheme's variance, i.e. how many times fewer paths the scheme needs for
+    the same standard error.
+    """
+    streams = np.random.SeedSequence(seed).spawn(len(SCHEMES))
+    results = {}
+    for scheme, stream in zip(SCHEMES, streams):
+        if scheme == 'sobol' and method != 'exact':
+            continue
+        results[scheme] = estimate(inputs, collar_type, scheme, simulations, np.random.default_rng(stream), method)
+
+    plain = results['plain']
+    for result in results.values():
+        for metric in METRICS:
+            se = result[metric]['stderr']
+            result[metric]['efficiency'] = (plain[metric]['stderr'] / se)**2 if se > 0 else np.inf
+    return results
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'collar_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from collar_app.streaming import STREAM_PATH, stream_application  # noqa: E402 (needs Django set up)
+
+
+async def application(scope, receive, send):
+    # Refining estimates stream from a native ASGI app, everything else goes to Django
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await stream_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 import django_heroku
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'collar_app.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +84,106 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+# Valuation results are cached per worker in a bounded LRU by default. Set
+# VALUATION_CACHE_BACKEND=db to share them between gunicorn workers through a
+# table in the default database (create it with `manage.py createcachetable`),
+# or =file to use VALUATION_CACHE_DIR.
+VALUATION_CACHE = 'valuations'
+VALUATION_CACHE_BACKEND = os.environ.get('VALUATION_CACHE_BACKEND', 'locmem')
+VALUATION_CACHE_CHARTS = os.environ.get('VALUATION_CACHE_CHARTS', '1') == '1' # Also cache rendered Bokeh grids
+
+VALUATION_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'valuations',
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'valuation_cache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('VALUATION_CACHE_DIR', os.path.join(BASE_DIR, '.valuation_cache')),
+    },
+}
+
+# Intermediate results of the valuation pipeline (effective-price arrays,
+# payoff arrays) are memoized per worker; they are too large to share cheaply.
+PIPELINE_CACHE = 'pipeline'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    VALUATION_CACHE: dict(
+        VALUATION_CACHE_BACKENDS[VALUATION_CACHE_BACKEND],
+        TIMEOUT=int(os.environ.get('VALUATION_CACHE_TIMEOUT', 24 * 3600)),
+        OPTIONS={'MAX_ENTRIES': int(os.environ.get('VALUATION_CACHE_ENTRIES', 64))},
+    ),
+    PIPELINE_CACHE: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pipeline',
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('PIPELINE_CACHE_ENTRIES', 32))},
+    },
+}
+
+
+# Simulation
+
+# Simulations of each valuation the views run: dashboard, API, jobs, batch,
+# comparison, sensitivity, solver and the default budget of /stream
+SIMULATIONS = int(os.environ.get('SIMULATIONS', 100000))
+
+# Processes used to simulate effective prices; a form can lower it with a
+# 'workers' field. Results for a given seed do not depend on this number.
+SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', 1))
+
+# Budget of one /adaptive run: requests may ask for less, never for more
+ADAPTIVE_MAX_PATHS = int(os.environ.get('ADAPTIVE_MAX_PATHS', 2000000))
+ADAPTIVE_MAX_SECONDS = float(os.environ.get('ADAPTIVE_MAX_SECONDS', 10))
+
+# Largest budget and batch one /stream request may ask for; larger ones get 400
+STREAM_MAX_PATHS = int(os.environ.get('STREAM_MAX_PATHS', 2000000))
+STREAM_MAX_BATCH_SIZE = int(os.environ.get('STREAM_MAX_BATCH_SIZE', 100000))
+
+# Downsample dashboard curves and cap histogram bins (see collar_app.chart_data)
+CHART_REDUCTION = os.environ.get('CHART_REDUCTION', '1') == '1'
+
+# Hold effective prices and payoff arrays in float32, halving per-request
+# memory (see collar_app.valuation); simulation itself stays in float64
+VALUATION_FLOAT32 = os.environ.get('VALUATION_FLOAT32', '0') == '1'
+
+
+# Stored runs
+
+# Keep every computed dashboard valuation as a ValuationRun (see collar_app.runs)
+RECORD_RUNS = os.environ.get('RECORD_RUNS', '1') == '1'
+
+# How a run's effective prices are stored: 'array' (compressed float32) or
+# 'sketch' (fixed-size collar_app.sketch.PriceSketch)
+RUN_DISTRIBUTION = os.environ.get('RUN_DISTRIBUTION', 'array')
+
+
+# Instrumentation
+
+# Time pipeline stages per request into Server-Timing headers, JSON log lines
+# and the /metrics endpoint (see collar_app.metrics)
+INSTRUMENTATION = os.environ.get('INSTRUMENTATION', '1') == '1'
+
+
+# Benchmarks
+
+# Stage timings of every 'manage.py benchmark' run (see collar_app.benchmark)
+BENCHMARK_HISTORY = os.environ.get('BENCHMARK_HISTORY', os.path.join(BASE_DIR, 'benchmarks', 'history.json'))
+
+# Relative slowdown of a stage that makes the benchmark fail
+BENCHMARK_THRESHOLD = float(os.environ.get('BENCHMARK_THRESHOLD', 0.25))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -127,4 +229,10 @@ STATICFILES_DIRS = [
 ]
 
 # Activate Django-Heroku.
-django_heroku.settings(locals())
\ No newline at end of file
+django_heroku.settings(locals())
+
+# Stage timings of each request as JSON lines on standard output, except under manage.py test
+TESTING = sys.argv[1:2] == ['test']
+LOGGING['handlers']['timing'] = {'level': 'INFO',
+                                 'class': 'logging.NullHandler' if TESTING else 'logging.StreamHandler'}
+LOGGING['loggers']['collar_app.timing'] = {'handlers': ['timing'], 'level': 'INFO', 'propagate': False}